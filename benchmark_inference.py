@@ -0,0 +1,132 @@
+"""
+Benchmark and parity check of the CPU inference backends of the zero-shot classifier (see zero_shot.py).
+
+A held-out sample of stored texts is classified by every (backend, thread count) mode, each in a fresh process, and
+the report gives load time, texts/sec and peak RSS per mode, then how many top labels (and how many
+testimony/experience decisions) differ from fp32 on the same sample.
+
+    python benchmark_inference.py --sample 200 --backends fp32 int8 onnx --threads 1 4
+"""
+import argparse
+import multiprocessing
+import queue
+import resource
+import time
+import traceback
+
+import pandas as pd
+
+from zero_shot import BACKENDS
+
+APPROVED_LABELS = {"personal experience", "testimony"}
+
+
+def held_out_sample(texts_file, size, seed):
+    texts = pd.read_csv(texts_file)["content"].dropna().astype(str)
+    return texts.sample(min(size, len(texts)), random_state=seed).tolist()
+
+
+def run_mode(backend, num_threads, texts, batch_size, results):
+    """
+    Classifies `texts` with one backend in the current (child) process and puts its report on `results`,
+    or {"error": traceback} when the mode fails (e.g. a backend whose dependencies are missing).
+    """
+    try:
+        results.put(_measure(backend, num_threads, texts, batch_size))
+    except BaseException:
+        results.put({"error": traceback.format_exc()})
+        raise
+
+
+def _measure(backend, num_threads, texts, batch_size):
+    from functions_alternative1 import TextClassifier
+
+    text_classifier = TextClassifier(batch_size=batch_size, cache_path=None, backend=backend, num_threads=num_threads)
+    start = time.perf_counter()
+    text_classifier._run_model(texts[:batch_size])  # Loads the model and warms it up
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    top_labels = text_classifier._run_model(texts)
+    seconds = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "threads": num_threads or "all",
+        "load_s": load_seconds,
+        "seconds": seconds,
+        "texts/sec": len(texts) / seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "top_labels": top_labels,
+    }
+
+
+def wait_report(process, results, poll_interval=1.0):
+    """
+    Returns the report of a mode's process, or None if it died without one (killed, out of memory...).
+    The queue is read before the process is joined: the labels can outgrow the queue's pipe buffer.
+    """
+    while True:
+        try:
+            return results.get(timeout=poll_interval)
+        except queue.Empty:
+            if not process.is_alive():
+                # It may have put its report just before exiting
+                try:
+                    return results.get(timeout=poll_interval)
+                except queue.Empty:
+                    return None
+
+
+def parity(reference, labels):
+    """Counts the top labels, and the approve/deny decisions they lead to, that differ from the reference."""
+    labels_differ = sum(a != b for a, b in zip(reference, labels))
+    decisions_differ = sum((a in APPROVED_LABELS) != (b in APPROVED_LABELS) for a, b in zip(reference, labels))
+    return labels_differ, decisions_differ
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", default="incremental_emdr_results.csv", help="CSV with a `content` column")
+    parser.add_argument("--sample", type=int, default=200, help="Texts in the held-out sample")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--threads", type=int, nargs="+", default=[0], help="Thread counts to try (0: every core)")
+    parser.add_argument("--batch-size", type=int, default=8)
+    args = parser.parse_args()
+
+    texts = held_out_sample(args.texts, args.sample, args.seed)
+    backends = ["fp32"] + [backend for backend in args.backends if backend != "fp32"]  # fp32 is the reference
+
+    # A fresh process per mode, so that peak RSS and thread settings are the mode's own
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for backend in backends:
+        for num_threads in args.threads:
+            results = context.Queue()
+            process = context.Process(target=run_mode,
+                                      args=(backend, num_threads or None, texts, args.batch_size, results))
+            process.start()
+            report = wait_report(process, results)
+            process.join()
+            if report is None or "error" in report:
+                error = report["error"] if report else f"exit code {process.exitcode}, no report"
+                if backend == "fp32":
+                    raise RuntimeError(f"fp32 benchmark failed, no parity reference:\n{error}")
+                print(f"⚠️ {backend} ({num_threads or 'all'} threads) skipped, its benchmark failed:\n{error}")
+                continue
+            reports.append(report)
+            print(f"{backend} ({report['threads']} threads): {report['texts/sec']:.1f} texts/sec")
+
+    reference = reports[0]["top_labels"]
+    for report in reports:
+        report["labels_differ"], report["decisions_differ"] = parity(reference, report.pop("top_labels"))
+
+    table = pd.DataFrame(reports)
+    print(f"\nHeld-out sample: {len(texts)} texts from {args.texts}, parity against fp32 "
+          f"({reports[0]['threads']} threads)")
+    print(table.to_string(index=False, float_format=lambda value: f"{value:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark of the RedditScrapper filter rules over a stored corpus.
+
+Compares the per-pattern `re.search` loop functions.py used to run on every text ("before") with the precompiled
+single-pass matchers of rules.py ("after"), checks both reach the same decisions and reports texts/sec.
+The comment short-circuit of TextClassifier is checked against the separate searches it replaced as well.
+
+    python benchmark_rules.py [incremental_emdr_results.csv] [--repeat 20]
+"""
+import argparse
+import re
+import time
+
+import pandas as pd
+
+import rules
+
+
+def legacy_is_personal_experience(text):
+    """The pre-rules.py implementation: one re.search per pattern string, on every call."""
+    return any(re.search(pattern, text, re.IGNORECASE) for _, pattern in rules.PERSONAL_EXPERIENCE)
+
+
+def legacy_is_exclusion(text):
+    """The pre-rules.py implementation of RedditScrapper.is_exclusion."""
+    if text.lstrip().startswith(rules.AUTOMATED_RESPONSE_PREFIX):
+        return False
+    if any(re.search(pattern, text, re.IGNORECASE) for _, pattern in rules.EXCLUSION):
+        if re.search(r"\b(already tried|have done|completed)\s*EMDR", text, re.IGNORECASE):
+            return False
+        return True
+    return False
+
+
+def legacy_evaluate(text):
+    return legacy_is_personal_experience(text) and not legacy_is_exclusion(text)
+
+
+def legacy_comment_short_circuit(text):
+    """The pre-rules.py comment short-circuit of TextClassifier.classify_comment, on the lowercased text."""
+    if rules.UNDECIDED_COMMENT.search(text):
+        return "indirect_reference"
+    if rules.CONGRATULATORY.search(text):
+        return "congratulatory_message"
+    return None
+
+
+def compiled_evaluate(text):
+    return rules.evaluate(text)[0]
+
+
+def texts_per_second(evaluate, texts, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            evaluate(text)
+    elapsed = time.perf_counter() - start
+    return len(texts) * repeat / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("corpus", nargs="?", default="incremental_emdr_results.csv")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    texts = pd.read_csv(args.corpus)["content"].fillna("").astype(str).tolist()
+    print(f"Loaded {len(texts)} texts from {args.corpus}")
+
+    mismatches = [text for text in texts if legacy_evaluate(text) != compiled_evaluate(text)]
+    if mismatches:
+        print(f"⚠️ {len(mismatches)} texts get a different decision, e.g.: {mismatches[0][:200]!r}")
+    else:
+        print("✅ Same decision for every text")
+    lowered = [text.lower() for text in texts]
+    mismatches = [text for text in lowered
+                  if legacy_comment_short_circuit(text) != rules.comment_short_circuit(text)]
+    if mismatches:
+        print(f"⚠️ {len(mismatches)} texts get a different comment short-circuit, e.g.: {mismatches[0][:200]!r}")
+    else:
+        print("✅ Same comment short-circuit for every text")
+
+    before = texts_per_second(legacy_evaluate, texts, args.repeat)
+    after = texts_per_second(compiled_evaluate, texts, args.repeat)
+    print(f"before (per-pattern re.search): {before:,.0f} texts/sec")
+    print(f"after  (compiled rule sets):    {after:,.0f} texts/sec")
+    print(f"speed-up: x{after / before:.2f}")
+
+    fired = pd.Series([rules.evaluate(text)[1] for text in texts]).value_counts(dropna=False)
+    print("Deciding rule per text:")
+    print(fired.to_string())
+
+
+if __name__ == "__main__":
+    main()
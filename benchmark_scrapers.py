@@ -0,0 +1,132 @@
+"""
+End-to-end benchmark of RedditScrapper and RedditExperienceScraper against the offline Reddit backend.
+
+Each (scraper, corpus size) case runs in a fresh process over a synthetic corpus built from
+incremental_emdr_results.csv (or a recorded corpus with --corpus) and reports posts/sec (posts the scraper
+processed, not search results served), comments/sec, the time spent in each stage and the peak RSS of the process.
+
+    python benchmark_scrapers.py --sizes 50 200 1000 --latency 0.01 --error-rate 0.01
+    python benchmark_scrapers.py --scrapers RedditExperienceScraper --model   # real bart-large-mnli
+
+Without --model, RedditExperienceScraper runs with a keyword stand-in for the zero-shot pipeline so the
+numbers measure the scraping machinery rather than BART.
+Stage times are summed over worker threads, so with several workers they can add up to more than the wall time.
+"""
+import argparse
+import contextlib
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+import pandas as pd
+
+from offline_reddit import OfflineReddit, load_corpus, synthetic_corpus
+
+SCRAPERS = ["RedditScrapper", "RedditExperienceScraper"]
+
+
+class KeywordZeroShot:
+    """Stand-in for the zero-shot pipeline: ranks 'testimony' first for texts mentioning a first-person EMDR."""
+
+    def __call__(self, texts, candidate_labels, batch_size=None):
+        single = isinstance(texts, str)
+        results = []
+        for text in [texts] if single else texts:
+            lowered = text.lower()
+            top = "testimony" if " i " in f" {lowered} " and "emdr" in lowered else "opinion"
+            labels = [top] + [label for label in candidate_labels if label != top]
+            results.append({"labels": labels, "scores": [0.6] + [0.4 / (len(labels) - 1)] * (len(labels) - 1)})
+        return results[0] if single else results
+
+
+def run_case(scraper_name, corpus, args, results):
+    """Runs one scraper over the corpus in the current (child) process and puts its report on `results`."""
+    reddit = OfflineReddit(corpus, latency=args.latency, error_rate=args.error_rate)
+    with tempfile.TemporaryDirectory() as tmp, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        os.chdir(tmp)
+        start = time.perf_counter()
+        if scraper_name == "RedditScrapper":
+            from functions import RedditScrapper
+            scrapper = RedditScrapper(None, None, None, reddit=reddit)
+            scrapper.rate_limiter.base_backoff = 0.05
+            scrapper.rate_limiter.rate = scrapper.rate_limiter.capacity = 10_000
+            reddit.rate_limiter = scrapper.rate_limiter
+            scrapper.scrape_and_filter("PTSD", "emdr", limit=10 ** 9, output_file="results.sqlite",
+                                       save_every=10 ** 9, limit_comment=None, expand_workers=args.workers)
+            metrics = scrapper.metrics
+        else:
+            from functions_alternative1 import RedditExperienceScraper, TextClassifier
+            text_classifier = TextClassifier(cache_path=None, classifier=None if args.model else KeywordZeroShot(),
+                                             max_tokens=args.max_tokens)
+            scraper = RedditExperienceScraper(None, None, None, reddit=reddit, text_classifier=text_classifier)
+            scraper.reddit_api.rate_limiter.base_backoff = 0.05
+            scraper.reddit_api.rate_limiter.rate = scraper.reddit_api.rate_limiter.capacity = 10_000
+            reddit.rate_limiter = scraper.reddit_api.rate_limiter
+            scraper.scrape_and_filter_posts(search_term="EMDR", limit=10 ** 9, fetch_workers=args.workers)
+            metrics = scraper.metrics
+        elapsed = time.perf_counter() - start
+
+    # Searches prefetch pages ahead of the pipeline, so throughput counts the posts that made it through it
+    posts = metrics.snapshot()["counters"].get("posts_processed", 0)
+    report = {
+        "scraper": scraper_name,
+        "posts": posts,
+        "posts_served": reddit.served["posts"],
+        "comments": reddit.served["comments"],
+        "seconds": elapsed,
+        "posts/sec": posts / elapsed,
+        "comments/sec": reddit.served["comments"] / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    for kind, seconds in sorted(reddit.request_time.items()):
+        report[f"{kind}_requests_s"] = seconds
+    for stage, values in sorted(metrics.snapshot()["stages"].items()):
+        report[f"{stage}_s"] = values["seconds"]
+    report["429s"] = reddit.rate_limiter.backoffs
+    results.put(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000], help="Posts per synthetic corpus")
+    parser.add_argument("--comments-per-post", type=int, default=20)
+    parser.add_argument("--corpus", help="Recorded corpus (JSON) to use instead of synthetic ones")
+    parser.add_argument("--scrapers", nargs="+", default=SCRAPERS, choices=SCRAPERS)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every simulated request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of a 429 per request")
+    parser.add_argument("--workers", type=int, default=4, help="Comment-expansion workers")
+    parser.add_argument("--model", action="store_true", help="Use the real bart-large-mnli pipeline")
+    parser.add_argument("--max-tokens", type=int, help="Classify long texts in chunks of this many tokens")
+    args = parser.parse_args()
+
+    texts_file = os.path.abspath("incremental_emdr_results.csv")
+    corpora = ([(None, load_corpus(args.corpus))] if args.corpus else
+               [(size, synthetic_corpus(size, args.comments_per_post, texts_file=texts_file)) for size in args.sizes])
+
+    # A fresh process per case, so that peak RSS is the case's own
+    context = multiprocessing.get_context("spawn")
+    reports = []
+    for size, corpus in corpora:
+        for scraper_name in args.scrapers:
+            results = context.Queue()
+            process = context.Process(target=run_case, args=(scraper_name, corpus, args, results))
+            process.start()
+            process.join()  # Reports are small enough to sit in the queue's pipe until read
+            if process.exitcode != 0:
+                raise RuntimeError(f"{scraper_name} benchmark failed (exit code {process.exitcode})")
+            report = results.get()
+            report["corpus_posts"] = size or sum(len(posts) for posts in corpus.values())
+            reports.append(report)
+            print(f"{scraper_name} on {report['corpus_posts']} posts: {report['seconds']:.2f}s")
+
+    columns = ["scraper", "corpus_posts", "posts", "comments", "seconds", "posts/sec", "comments/sec", "peak_rss_mb"]
+    table = pd.DataFrame(reports)
+    table = table[columns + [column for column in table.columns if column not in columns]]
+    print(table.to_string(index=False, float_format=lambda value: f"{value:,.2f}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import rules
+
+
+def normalize_text(text):
+    """Normalizes a text before hashing so that whitespace or unicode-form changes don't miss the cache."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+class ClassificationCache:
+    """
+    On-disk (SQLite) cache of model results, keyed by a hash of the normalized text, the model name,
+    the candidate labels and the rule version.
+    The least recently used entries are evicted once the cache holds more than `max_entries`.
+    """
+
+    def __init__(self, path="classification_cache.sqlite", max_entries=200_000):
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS classifications ("
+            "key TEXT PRIMARY KEY, label TEXT NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON classifications (last_used)")
+        self._conn.commit()
+        self._entries = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+
+    @staticmethod
+    def make_key(text, model_name, labels):
+        """Builds the cache key of a text classified by `model_name` over `labels`."""
+        payload = json.dumps([normalize_text(text), model_name, list(labels), rules.RULE_VERSION])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys):
+        """Returns {key: label} for the keys found in the cache and refreshes their last use."""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._lock:
+            # Stay under SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                found.update(self._conn.execute(
+                    f"SELECT key, label FROM classifications WHERE key IN ({placeholders})", chunk
+                ).fetchall())
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE classifications SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items):
+        """Stores (key, label) pairs, evicting the least recently used entries when over `max_entries`."""
+        items = list(items)
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO classifications (key, label, last_used) VALUES (?, ?, ?)",
+                [(key, label, now) for key, label in items]
+            )
+            self._entries += len(items)
+            if self._entries > self.max_entries:
+                self._entries = self._conn.execute("SELECT COUNT(*) FROM classifications").fetchone()[0]
+                overflow = self._entries - self.max_entries
+                if overflow > 0:
+                    self._conn.execute(
+                        "DELETE FROM classifications WHERE key IN "
+                        "(SELECT key FROM classifications ORDER BY last_used LIMIT ?)", (overflow,)
+                    )
+                    self._entries -= overflow
+            self._conn.commit()
+
+    def stats(self):
+        """Returns hit/miss counters and the current number of entries."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": self._entries,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
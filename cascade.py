@@ -0,0 +1,212 @@
+"""
+Cheap-first classifier cascade in front of the zero-shot model.
+
+A linear model over hashed word n-grams, trained on the zero-shot labels the scraper already recorded, predicts the
+zero-shot model's top label. Only texts the model itself labeled are training data: the rows of the model label
+file (MODEL_LABEL_COLUMNS, which the scraper writes next to its approved and denied CSVs), and the
+false_positive_log.txt entries that aren't in it already, unless a cascade decided them. Texts it is confident about
+(top probability ahead of the runner-up by at least `threshold`) are decided on the spot; only the others are
+escalated to facebook/bart-large-mnli.
+
+    python cascade.py --model-labels model_labels.csv
+    classifier = TextClassifier(cascade_model="cascade_model.npz", cascade_threshold=0.5)
+
+Training holds out part of the data and reports, for a few thresholds, the share of texts the cascade decides
+and how often it agrees with the recorded label on them, to pick the threshold.
+"""
+import argparse
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+import pandas as pd
+
+APPROVED_COLUMNS = ["Title", "Body", "Classification", "Comments", "URL", "Timestamp"]
+DENIED_COLUMNS = ["Type", "Classification", "Text", "URL", "Timestamp"]
+# The zero-shot model's top label of each text it classified, and that text (written with a header row)
+MODEL_LABEL_COLUMNS = ["Model Label", "Model Text", "URL", "Timestamp"]
+MODEL_LABELS = ['personal experience', 'theoretical discussion', 'testimony', 'question', 'opinion']
+
+_TOKEN = re.compile(r"[a-z0-9']+")
+_FALSE_POSITIVE = re.compile(r"Classified as: (.+?) \| Text: (.*?) \| URL: [^\n]*\n", re.DOTALL)
+
+
+class HashedNgramClassifier:
+    """
+    Multinomial logistic regression over hashed word n-grams, trained with plain SGD.
+    Features are hashed with crc32 rather than hash(), which is salted per process, so a saved model stays valid.
+    """
+
+    def __init__(self, n_features=2 ** 18, ngram_range=(1, 2), epochs=5, learning_rate=0.5, l2=1e-6, seed=0):
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.l2 = l2
+        self.seed = seed
+        self.classes = []
+        self.weights = None
+        self.bias = None
+
+    def features(self, text):
+        """Returns the hashed n-gram indices of a text and their (L2-normalized, binary) value."""
+        tokens = _TOKEN.findall(text.lower())
+        ngrams = [" ".join(tokens[i:i + n]) for n in range(self.ngram_range[0], self.ngram_range[1] + 1)
+                  for i in range(len(tokens) - n + 1)]
+        indices = np.unique(np.fromiter((zlib.crc32(ngram.encode("utf-8")) % self.n_features for ngram in ngrams),
+                                        dtype=np.int64, count=len(ngrams)))
+        value = 1.0 / np.sqrt(len(indices)) if len(indices) else 0.0
+        return indices, value
+
+    def fit(self, texts, labels):
+        self.classes = sorted(set(labels))
+        targets = np.array([self.classes.index(label) for label in labels])
+        self.weights = np.zeros((self.n_features, len(self.classes)), dtype=np.float32)
+        self.bias = np.zeros(len(self.classes), dtype=np.float32)
+        rows = [self.features(text) for text in texts]
+
+        rng = np.random.default_rng(self.seed)
+        for epoch in range(self.epochs):
+            learning_rate = self.learning_rate / (1 + epoch)
+            for i in rng.permutation(len(rows)):
+                indices, value = rows[i]
+                gradient = self._softmax(self.weights[indices].sum(axis=0) * value + self.bias)
+                gradient[targets[i]] -= 1.0
+                self.weights[indices] -= learning_rate * (value * gradient + self.l2 * self.weights[indices])
+                self.bias -= learning_rate * gradient
+        return self
+
+    def predict_proba(self, texts):
+        """Returns a (texts × classes) array of label probabilities."""
+        scores = np.empty((len(texts), len(self.classes)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            indices, value = self.features(text)
+            scores[row] = self.weights[indices].sum(axis=0) * value + self.bias
+        return self._softmax(scores)
+
+    @staticmethod
+    def _softmax(scores):
+        exp = np.exp(scores - scores.max(axis=-1, keepdims=True))
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def save(self, path):
+        np.savez_compressed(path, weights=self.weights, bias=self.bias, classes=np.array(self.classes),
+                            n_features=self.n_features, ngram_range=np.array(self.ngram_range))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        model = cls(n_features=int(data["n_features"]), ngram_range=tuple(int(n) for n in data["ngram_range"]))
+        model.weights = data["weights"]
+        model.bias = data["bias"]
+        model.classes = [str(label) for label in data["classes"]]
+        return model
+
+
+class Cascade:
+    """Decides the texts a HashedNgramClassifier is confident about and counts the ones it escalates."""
+
+    def __init__(self, model, threshold=0.5):
+        self.model = model
+        self.threshold = threshold  # Minimum margin between the top two probabilities to decide without escalating
+        self.decided = 0
+        self.escalated = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, threshold=0.5):
+        return cls(HashedNgramClassifier.load(path), threshold)
+
+    def decide(self, texts):
+        """Returns the cheap model's label of each text, or None for the texts to escalate to the zero-shot model."""
+        if not texts:
+            return []
+        probabilities = self.model.predict_proba(texts)
+        top_two = np.sort(probabilities, axis=1)[:, -2:]
+        margins = top_two[:, 1] - top_two[:, 0]
+        labels = [self.model.classes[i] if margin >= self.threshold else None
+                  for i, margin in zip(probabilities.argmax(axis=1), margins)]
+        with self._lock:
+            escalated = labels.count(None)
+            self.escalated += escalated
+            self.decided += len(labels) - escalated
+        return labels
+
+    def stats(self):
+        total = self.decided + self.escalated
+        return {"decided": self.decided, "escalated": self.escalated,
+                "escalation_rate": self.escalated / total if total else 0.0, "threshold": self.threshold}
+
+
+def load_training_data(model_labels_file="model_labels.csv", false_positive_log="false_positive_log.txt"):
+    """Collects (texts, labels) from the scraper's outputs, keeping only the texts the zero-shot model labeled."""
+    texts, labels = [], []
+
+    def add(text, label):
+        if label in MODEL_LABELS and isinstance(text, str) and text.strip():
+            texts.append(text)
+            labels.append(label)
+
+    if model_labels_file and os.path.exists(model_labels_file):
+        for chunk in pd.read_csv(model_labels_file, dtype=str, chunksize=50_000):
+            for text, label in zip(chunk["Model Text"], chunk["Model Label"]):
+                add(text, label)
+    labeled = {text[:200] for text in texts}
+
+    # The log repeats the texts of the model label file, and marks the labels a cascade gave
+    if false_positive_log and os.path.exists(false_positive_log):
+        with open(false_positive_log, encoding="utf-8") as f:
+            for match in _FALSE_POSITIVE.finditer(f.read()):
+                if match.group(2) not in labeled:
+                    add(match.group(2), match.group(1))
+
+    return texts, labels
+
+
+def evaluate(model, texts, labels, thresholds=(0.0, 0.25, 0.5, 0.75, 0.9)):
+    """For each threshold, the share of texts the cascade decides and its accuracy on them."""
+    probabilities = model.predict_proba(texts)
+    predicted = [model.classes[i] for i in probabilities.argmax(axis=1)]
+    top_two = np.sort(probabilities, axis=1)[:, -2:]
+    margins = top_two[:, 1] - top_two[:, 0]
+    report = []
+    for threshold in thresholds:
+        decided = [i for i, margin in enumerate(margins) if margin >= threshold]
+        correct = sum(predicted[i] == labels[i] for i in decided)
+        report.append({"threshold": threshold, "decided": len(decided) / len(texts) if texts else 0.0,
+                       "accuracy": correct / len(decided) if decided else float("nan")})
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-labels", default="model_labels.csv")
+    parser.add_argument("--false-positives", default="false_positive_log.txt")
+    parser.add_argument("--out", default="cascade_model.npz")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Share of the data kept for evaluation")
+    parser.add_argument("--epochs", type=int, default=5)
+    args = parser.parse_args()
+
+    texts, labels = load_training_data(args.model_labels, args.false_positives)
+    if len(set(labels)) < 2:
+        raise SystemExit("❌ Not enough labeled data: the cascade needs texts of at least two labels")
+    print(f"📚 {len(texts)} labeled texts: {pd.Series(labels).value_counts().to_dict()}")
+
+    order = np.random.default_rng(0).permutation(len(texts))
+    n_holdout = int(len(texts) * args.holdout)
+    held_out, train = order[:n_holdout], order[n_holdout:]
+    model = HashedNgramClassifier(epochs=args.epochs).fit([texts[i] for i in train], [labels[i] for i in train])
+    if n_holdout:
+        report = evaluate(model, [texts[i] for i in held_out], [labels[i] for i in held_out])
+        print(pd.DataFrame(report).to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+
+    # The saved model is trained on everything
+    model = HashedNgramClassifier(epochs=args.epochs).fit(texts, labels)
+    model.save(args.out)
+    print(f"✅ Saved the cascade model to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
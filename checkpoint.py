@@ -0,0 +1,183 @@
+import json
+import os
+import re
+import tempfile
+import time
+
+
+def _slug(*parts):
+    return "__".join(re.sub(r"[^A-Za-z0-9_.-]+", "-", str(part)) for part in parts)
+
+
+class CheckpointStore:
+    """
+    Persists the run state of each (subreddit, query, time_filter) search in its own JSON file under `directory`,
+    so a restarted run continues paging from the last committed batch instead of starting from the top.
+
+    The state is a dict with:
+    - `after`: fullname of the last post of the last committed page (the search cursor to resume from)
+    - `fetched_posts`, `retained`: run counters
+    - `last_seen_utc`: newest `created_utc` among the committed posts
+    - `file_sizes`: size of the output files at commit time, to drop rows appended after it (see `rollback`)
+
+    Output files can be shared by several searches, so each save also records the size of every output file at its
+    latest commit, whichever search made it (one ledger file per output file).
+    """
+
+    def __init__(self, directory="checkpoints"):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, subreddit, query, time_filter):
+        return os.path.join(self.directory, _slug(subreddit, query, time_filter) + ".json")
+
+    def load(self, subreddit, query, time_filter):
+        """Returns the saved state of a search, or a fresh one."""
+        state = {"after": None, "fetched_posts": 0, "retained": 0, "last_seen_utc": None, "file_sizes": {}}
+        path = self.path(subreddit, query, time_filter)
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state.update(json.load(f))
+        return state
+
+    def save(self, subreddit, query, time_filter, state):
+        """Atomically replaces the saved state: the file is either the old or the new state, never half-written."""
+        self._write(self.path(subreddit, query, time_filter), state)
+        self.commit_files(state.get("file_sizes", {}))
+
+    def commit_files(self, sizes):
+        """Records the {path: size} of output files in the ledger, e.g. after rows written outside a search."""
+        for file_path, size in sizes.items():
+            self._write(self._ledger_path(file_path), {"path": file_path, "size": size})
+
+    def _ledger_path(self, file_path):
+        return os.path.join(self.directory, _slug("committed", os.path.abspath(file_path)) + ".json")
+
+    def committed_size(self, file_path, default=None):
+        """Size of an output file at its latest commit by any search saved here, or `default` if none recorded it."""
+        path = self._ledger_path(file_path)
+        if not os.path.exists(path):
+            return default
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["size"]
+
+    def rollback(self, sizes):
+        """
+        Drops the rows appended to the output files of a checkpoint's `sizes` after their latest commit.
+        The rows other searches committed since that checkpoint are kept: files are only truncated to the size of
+        their latest commit, whoever made it.
+        """
+        rollback_files({path: self.committed_size(path, size) for path, size in sizes.items()})
+
+    def _write(self, path, state):
+        state = dict(state, saved_at=time.time())
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(state, f, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def clear(self, subreddit, query, time_filter):
+        path = self.path(subreddit, query, time_filter)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def load_watermark(self, subreddit, query):
+        """
+        Returns the incremental-mode state of a search (see Watermark): the newest `created_utc` crawled,
+        when the last complete crawl started and the recently active posts with their comment counts.
+        """
+        state = {"created_utc": None, "checked_utc": None, "active": {}}
+        path = self.path(subreddit, query, "watermark")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state.update(json.load(f))
+        return state
+
+    def save_watermark(self, subreddit, query, state):
+        self._write(self.path(subreddit, query, "watermark"), state)
+
+
+class Watermark:
+    """
+    Incremental crawl of a (subreddit, query) search sorted by new. Posts newer than the watermark (the newest
+    `created_utc` of the last complete crawl) are new; older posts are only revisited while they are less than
+    `recheck_window` seconds older than it, and only when their comment count grew. Paging stops at the first
+    post past that window.
+
+    `status(post)` classifies each listed post, `seen(post)` records it, and `save()` moves the watermark forward
+    once a crawl went all the way down to it. `since` is when the last complete crawl started: the comments to
+    re-check on an active post are the ones created after it.
+    """
+
+    NEW, RECHECK, UNCHANGED, PAST = "new", "recheck", "unchanged", "past"
+
+    def __init__(self, store, subreddit, query, recheck_window=2 * 24 * 3600):
+        self.store = store
+        self.subreddit = subreddit
+        self.query = query
+        self.recheck_window = recheck_window
+        state = store.load_watermark(subreddit, query)
+        self.created_utc = state["created_utc"]
+        self.since = state["checked_utc"]
+        self.active = {post_id: list(seen) for post_id, seen in state["active"].items()}
+        self.newest = self.created_utc
+        self.started = time.time()
+
+    def status(self, post):
+        if self.created_utc is None or post.created_utc > self.created_utc:
+            return self.NEW
+        if post.created_utc < self.created_utc - self.recheck_window:
+            return self.PAST
+        seen = self.active.get(post.id)
+        if seen is not None and post.num_comments > seen[1]:
+            return self.RECHECK
+        return self.UNCHANGED
+
+    def seen(self, post, track=True):
+        """Records a listed post; `track` keeps watching its comment count over the next runs."""
+        self.newest = max(self.newest or 0, post.created_utc)
+        if track:
+            self.track(post)
+
+    def track(self, post):
+        self.active[post.id] = [post.created_utc, post.num_comments]
+
+    def progress(self):
+        """State of the crawl in progress, saved with the cursor of an interrupted crawl to `resume` it later."""
+        return {"newest": self.newest, "active": self.active, "started": self.started}
+
+    def resume(self, progress):
+        """Continues the crawl whose `progress` was saved, so its posts count once the watermark moves."""
+        if progress["newest"] is not None:
+            self.newest = max(self.newest or 0, progress["newest"])
+        self.active.update(progress["active"])
+        self.started = progress["started"]
+
+    def save(self):
+        """Moves the watermark to the newest post crawled and forgets the posts that left the recheck window."""
+        if self.newest is None:
+            return
+        horizon = self.newest - self.recheck_window
+        active = {post_id: seen for post_id, seen in self.active.items() if seen[0] >= horizon}
+        self.store.save_watermark(self.subreddit, self.query,
+                                  {"created_utc": self.newest, "checked_utc": self.started, "active": active})
+
+
+def file_sizes(*paths):
+    """Returns {path: size} of the existing files, to record in a checkpoint."""
+    return {path: os.path.getsize(path) for path in paths if os.path.exists(path)}
+
+
+def rollback_files(sizes):
+    """Truncates files back to the sizes recorded in a checkpoint, dropping rows written after the last commit."""
+    for path, size in sizes.items():
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+            print(f"Rolled {path} back to its last checkpoint")
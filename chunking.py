@@ -0,0 +1,97 @@
+"""
+Token-budget chunking of long texts for the zero-shot model.
+
+A text longer than `max_tokens` is cut into overlapping windows of at most `max_tokens` tokens; each window is
+classified on its own and the per-chunk label scores are averaged (weighted by chunk length) or max-pooled.
+This bounds the attention cost of each forward pass instead of letting long r/PTSD posts be truncated silently.
+Leave room in the budget for the hypothesis ("This example is ...") and the special tokens the model adds.
+"""
+import re
+import threading
+
+_WORD = re.compile(r"\S+")
+TOKENS_PER_WORD = 1.3  # Rough subword tokens per word, when no tokenizer is available
+AGGREGATIONS = ("mean", "max")
+
+
+class TextChunker:
+    """
+    Splits texts into overlapping windows of at most `max_tokens` tokens (`overlap` tokens shared by neighbours).
+    Tokens come from `tokenizer` (a Hugging Face fast tokenizer) when given, otherwise from a word-count estimate.
+    """
+
+    def __init__(self, max_tokens=256, overlap=32, tokenizer=None):
+        if not 0 <= overlap < max_tokens:
+            raise ValueError(f"Chunk overlap must be in [0, max_tokens), got {overlap} for max_tokens={max_tokens}")
+        self.max_tokens = max_tokens
+        self.overlap = overlap
+        self.tokenizer = tokenizer
+
+    def _spans(self, text):
+        """Character spans of the text's tokens, and the window and step sizes counted in those tokens."""
+        if self.tokenizer is not None:
+            offsets = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)["offset_mapping"]
+            return offsets, self.max_tokens, self.max_tokens - self.overlap
+        window = max(1, int(self.max_tokens / TOKENS_PER_WORD))
+        step = max(1, window - int(self.overlap / TOKENS_PER_WORD))
+        return [match.span() for match in _WORD.finditer(text)], window, step
+
+    def split(self, text):
+        """Returns the chunks of a text (the text itself when it fits the budget)."""
+        spans, window, step = self._spans(text)
+        if len(spans) <= window:
+            return [text]
+        chunks = []
+        for start in range(0, len(spans), step):
+            tokens = spans[start:start + window]
+            chunks.append(text[tokens[0][0]:tokens[-1][1]])
+            if start + window >= len(spans):
+                break
+        return chunks
+
+
+def aggregate_scores(chunk_results, labels, weights, how="mean"):
+    """
+    Combines the pipeline results of a text's chunks into one score per label: their `weights`-weighted mean,
+    or their maximum. Returns {label: score}.
+    """
+    per_chunk = [dict(zip(result["labels"], result["scores"])) for result in chunk_results]
+    if how == "max":
+        return {label: max(scores.get(label, 0.0) for scores in per_chunk) for label in labels}
+    total = sum(weights)
+    return {label: sum(weight * scores.get(label, 0.0) for weight, scores in zip(weights, per_chunk)) / total
+            for label in labels}
+
+
+class ChunkStats:
+    """Counts chunked texts and the time spent on them, to tune the token budget."""
+
+    def __init__(self):
+        self.texts = 0
+        self.long_texts = 0  # Texts split into more than one chunk
+        self.chunks = 0
+        self.max_chunks = 0
+        self.seconds = 0.0
+        self.long_seconds = 0.0  # Share of the model time spent on the chunks of long texts
+        self._lock = threading.Lock()
+
+    def record(self, chunk_counts, seconds, long_seconds):
+        with self._lock:
+            self.texts += len(chunk_counts)
+            self.long_texts += sum(count > 1 for count in chunk_counts)
+            self.chunks += sum(chunk_counts)
+            self.max_chunks = max([self.max_chunks] + chunk_counts)
+            self.seconds += seconds
+            self.long_seconds += long_seconds
+
+    def stats(self):
+        return {
+            "texts": self.texts,
+            "long_texts": self.long_texts,
+            "chunks": self.chunks,
+            "chunks_per_long_text": (self.chunks - (self.texts - self.long_texts)) / self.long_texts
+            if self.long_texts else 0.0,
+            "max_chunks": self.max_chunks,
+            "seconds": self.seconds,
+            "long_seconds": self.long_seconds,
+        }
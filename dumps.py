@@ -0,0 +1,289 @@
+"""
+Bulk ingestion of local Reddit dump archives through the scrapers' filters, for backfills the API pager can't reach.
+
+The archives are zstd-compressed NDJSON files of submissions or comments (one JSON object per line, as in the
+RS_*/RC_* monthly dumps); plain .ndjson/.jsonl files are read as well. Each archive is decompressed as a stream
+and cut into chunks of `chunk_size` lines that a process pool filters, with at most two chunks per worker in flight.
+
+- mode "rules": the RedditScrapper rules (rules.py); kept texts go to the result store at `output_file` as
+  {"id", "content"} records (see store.py).
+- mode "classifier": the TextClassifier of RedditExperienceScraper; entries go to `approved_file`, `denied_file`
+  and `model_labels_file` in the scraper's CSV layouts. Each worker process loads its own copy of the model
+  (1.5 GB or more), so the pool defaults to CLASSIFIER_WORKERS processes, unless `inference_socket` is set in
+  `classifier_options`: the workers then share one inference worker (see inference_server.py) and default to one
+  per core.
+
+Only the records of the `subreddits` given (all of them by default) that mention `therapy` are filtered. A comment
+is judged on its own text, since its post is usually in another archive.
+Chunk results are committed in archive order, then the number of lines done in each archive is checkpointed under
+`checkpoint_dir`, so a restarted ingestion skips them (they are decompressed again, but not parsed or filtered).
+All the archives of an ingestion share one checkpoint, and with it one record of the output file sizes; the
+checkpoint is keyed by the therapy, the subreddits and the output files, and counts the lines of each archive path.
+
+    python dumps.py RS_2023-01.zst RC_2023-01.zst --therapy emdr --subreddit PTSD --output dump_results.sqlite
+    python dumps.py RC_2023-01.zst --therapy emdr --mode classifier --inference-socket /tmp/ptsd_inference.sock
+
+Throughput is reported in millions of archive records per hour.
+"""
+import argparse
+import hashlib
+import io
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import rules
+from cascade import APPROVED_COLUMNS, DENIED_COLUMNS, MODEL_LABEL_COLUMNS
+from checkpoint import CheckpointStore, file_sizes
+from metrics import Metrics
+from preprocess import strip_boilerplate
+from sinks import CsvSink
+from store import open_store
+from writer import BackgroundWriter
+
+MODES = ("rules", "classifier")
+CLASSIFIER_WORKERS = 2  # Default pool of classifier mode without an inference worker, each process holding a model
+APPROVED_LABELS = ("personal experience", "testimony")
+
+_text_classifier = None  # TextClassifier of a worker process in classifier mode
+
+
+def read_lines(path):
+    """Yields the lines of an NDJSON archive, decompressing .zst files incrementally."""
+    if not path.endswith(".zst"):
+        with open(path, encoding="utf-8", errors="replace") as f:
+            yield from f
+        return
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("Reading .zst dumps needs zstandard: pip install zstandard") from e
+    with open(path, "rb") as f:
+        # The monthly dumps are compressed with a long window
+        reader = zstandard.ZstdDecompressor(max_window_size=2 ** 31).stream_reader(f)
+        yield from io.TextIOWrapper(reader, encoding="utf-8", errors="replace")
+
+
+def _init_worker(mode, classifier_options):
+    if mode == "classifier":
+        global _text_classifier
+        from functions_alternative1 import TextClassifier
+        _text_classifier = TextClassifier(**classifier_options)
+
+
+def _parse(line, therapy, subreddits):
+    """Returns the archive record of a line if it is one to filter, with its cleaned text under "text"."""
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if subreddits and str(record.get("subreddit", "")).lower() not in subreddits:
+        return None
+    is_comment = "body" in record
+    text = record.get("body") if is_comment else record.get("selftext")
+    title = "" if is_comment else record.get("title") or ""
+    if not isinstance(text, str) or therapy not in f"{title} {text}".lower():
+        return None
+    record["text"] = strip_boilerplate(text)[0]
+    if not record["text"] and is_comment:
+        return None
+    record["is_comment"] = is_comment
+    return record
+
+
+def _url(record):
+    if record.get("url") and not record["is_comment"]:
+        return record["url"]
+    return f"https://www.reddit.com{record.get('permalink', '')}"
+
+
+def filter_chunk(lines, therapy, subreddits=None, mode="rules"):
+    """
+    Worker task: filters a chunk of archive lines. Returns the records to keep ({"id", "content"} in rules mode,
+    approved and denied entries in classifier mode) and the number of records that mentioned the therapy.
+    """
+    candidates = [record for record in (_parse(line, therapy, subreddits) for line in lines) if record is not None]
+    if mode == "rules":
+        return [{"id": record["id"], "content": record["text"]} for record in candidates
+                if record["text"] and rules.is_personal_experience(record["text"]) is not None
+                and rules.exclusion_rule(record["text"]) is None], len(candidates)
+
+    from functions_alternative1 import approved_entry, denied_entry
+    entries = []
+    comments = [record for record in candidates if record["is_comment"]]
+    classifications = _text_classifier.classify_with_model_labels([record["text"] for record in comments],
+                                                                  kind="comment")
+    for record, (classification, model_label) in zip(comments, classifications):
+        if classification in APPROVED_LABELS:
+            entries.append(approved_entry("(From Question)", "(No Post Saved)", "testimony", record["text"],
+                                          _url(record), record.get("created_utc"), model_label, record["text"]))
+        else:
+            entries.append(denied_entry("Comment", classification, record["text"], _url(record),
+                                        record.get("created_utc"), model_label, record["text"]))
+    posts = [record for record in candidates if not record["is_comment"]]
+    texts = [f"{record.get('title') or ''} {record['text']}" for record in posts]
+    classifications = _text_classifier.classify_with_model_labels(texts, kind="post")
+    for record, text, (classification, model_label) in zip(posts, texts, classifications):
+        title = record.get("title") or ""
+        if classification in APPROVED_LABELS:
+            entries.append(approved_entry(title, record["text"], classification, "(No Comments)", _url(record),
+                                          record.get("created_utc"), model_label, text))
+        else:
+            entries.append(denied_entry("Post", classification, title, _url(record), record.get("created_utc"),
+                                        model_label, text))
+    return entries, len(candidates)
+
+
+def ingest(paths, therapy, mode="rules", subreddits=None, output_file="dump_results.sqlite",
+           approved_file="approved_reddit_emdr_experiences.csv", denied_file="denied_reddit_emdr_experiences.csv",
+           model_labels_file="model_labels.csv", workers=None, chunk_size=10_000, checkpoint_dir="checkpoints",
+           classifier_options=None, metrics=None, metrics_file=None):
+    """
+    Filters the archives at `paths` (see the module docstring) and returns the run's totals:
+    {"records": archive records read, "candidates": records mentioning the therapy, "kept": records written}.
+    `classifier_options` are the TextClassifier arguments of classifier mode.
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}, expected one of {MODES}")
+    therapy = therapy.lower()
+    subreddits = {subreddit.lower() for subreddit in subreddits} if subreddits else None
+    classifier_options = classifier_options or {"cache_path": None}
+    inference_socket = classifier_options.get("inference_socket")
+    if mode == "classifier" and inference_socket:
+        from inference_server import ensure_server
+        ensure_server(inference_socket, backend=classifier_options.get("backend", "fp32"))
+    if workers is None:
+        workers = CLASSIFIER_WORKERS if mode == "classifier" and not inference_socket else os.cpu_count()
+    metrics = metrics or Metrics()
+    checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+    totals = {"records": 0, "candidates": 0, "kept": 0}
+
+    store, writer, sinks = None, None, []
+    if mode == "rules":
+        store = open_store(output_file)
+    else:
+        writer = BackgroundWriter(metrics=metrics)
+        sinks = [CsvSink(approved_file, APPROVED_COLUMNS, header=False, writer=writer,
+                         where=lambda entry: entry["approved"], metrics=metrics, counter="approved_written"),
+                 CsvSink(denied_file, DENIED_COLUMNS, header=False, writer=writer,
+                         where=lambda entry: not entry["approved"], metrics=metrics, counter="denied_written")]
+        if model_labels_file:
+            sinks.append(CsvSink(model_labels_file, MODEL_LABEL_COLUMNS, writer=writer,
+                                 where=lambda entry: entry["Model Label"] is not None))
+
+    def write(kept):
+        if store is not None:
+            with metrics.timer("write", items=len(kept)):
+                return store.add_many(kept)
+        for entry in kept:
+            for sink in sinks:
+                if sink.accepts(entry):
+                    sink.write(entry)
+        for sink in sinks:
+            sink.flush()
+        return len(kept)
+
+    # One checkpoint for the whole ingestion: lines done per archive, and the output sizes at the last commit.
+    # An ingestion with other subreddits or outputs is another ingestion, with its own checkpoint.
+    outputs = [output_file] if mode == "rules" else [approved_file, denied_file, model_labels_file]
+    outputs = [path for path in outputs if path]
+    digest = hashlib.sha1("|".join(os.path.abspath(path) for path in outputs).encode("utf-8")).hexdigest()[:12]
+    key = ("dumps", f"{therapy}-{','.join(sorted(subreddits)) if subreddits else 'all'}", f"{mode}-{digest}")
+    state = {"lines": {}, "file_sizes": {}}
+    if checkpoints:
+        saved = checkpoints.load(*key)
+        state.update(lines=saved.get("lines") or {}, file_sizes=saved["file_sizes"])
+        if sinks:
+            checkpoints.rollback(state["file_sizes"])
+
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(mode, classifier_options)) as executor:
+            for path in paths:
+                name = os.path.abspath(path)
+                done = state["lines"].get(name, 0)
+                if done:
+                    print(f"⏩ Resuming {path} after {done:,} lines")
+
+                lines = read_lines(path)
+                for _ in itertools.islice(lines, done):
+                    pass
+                in_flight = deque()
+
+                def commit(future, size):
+                    nonlocal done
+                    kept, candidates = future.result()
+                    totals["kept"] += write(kept)
+                    totals["candidates"] += candidates
+                    totals["records"] += size
+                    done += size
+                    metrics.count("dump_records", size)
+                    metrics.count("records_retained", len(kept))
+                    if checkpoints:
+                        state["lines"][name] = done
+                        state["file_sizes"] = file_sizes(*outputs) if sinks else {}
+                        checkpoints.save(*key, state)
+                    hours = (time.perf_counter() - start) / 3600
+                    print(f"{path}: {done:,} lines, {totals['kept']:,} kept | "
+                          f"{totals['records'] / hours / 1e6:.2f}M records/hour")
+
+                while True:
+                    chunk = list(itertools.islice(lines, chunk_size))
+                    if not chunk:
+                        break
+                    in_flight.append((executor.submit(filter_chunk, chunk, therapy, subreddits, mode), len(chunk)))
+                    if len(in_flight) >= 2 * workers:
+                        commit(*in_flight.popleft())
+                while in_flight:
+                    commit(*in_flight.popleft())
+    finally:
+        for sink in sinks:
+            sink.close()
+        if writer is not None:
+            writer.close()
+        if store is not None:
+            store.close()
+
+    seconds = time.perf_counter() - start
+    totals["records_per_hour"] = totals["records"] / seconds * 3600 if seconds else 0.0
+    print(f"✅ {totals['records']:,} records read, {totals['candidates']:,} mention {therapy}, "
+          f"{totals['kept']:,} kept in {seconds:.0f}s ({totals['records_per_hour'] / 1e6:.2f}M records/hour)")
+    metrics.gauge("dump_records_per_hour", totals["records_per_hour"])
+    metrics.finish(metrics_file)
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", help="Dump archives (.zst, or uncompressed NDJSON)")
+    parser.add_argument("--therapy", default="emdr")
+    parser.add_argument("--subreddit", action="append", dest="subreddits", help="Repeat for several subreddits")
+    parser.add_argument("--mode", choices=MODES, default="rules")
+    parser.add_argument("--output", default="dump_results.sqlite", help="Result store of rules mode")
+    parser.add_argument("--approved-file", default="approved_reddit_emdr_experiences.csv")
+    parser.add_argument("--denied-file", default="denied_reddit_emdr_experiences.csv")
+    parser.add_argument("--model-labels-file", default="model_labels.csv",
+                        help="Model labels of classifier mode, training data of cascade.py")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=10_000)
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    parser.add_argument("--backend", default="fp32", help="CPU inference backend of classifier mode")
+    parser.add_argument("--inference-socket", default=None,
+                        help="Shared inference worker of classifier mode, started if needed")
+    parser.add_argument("--metrics-file", default=None)
+    args = parser.parse_args()
+
+    ingest(args.paths, args.therapy, mode=args.mode, subreddits=args.subreddits, output_file=args.output,
+           approved_file=args.approved_file, denied_file=args.denied_file,
+           model_labels_file=args.model_labels_file, workers=args.workers,
+           chunk_size=args.chunk_size, checkpoint_dir=args.checkpoint_dir,
+           classifier_options={"cache_path": None, "backend": args.backend, "inference_socket": args.inference_socket},
+           metrics_file=args.metrics_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,191 +1,347 @@
-import pandas as pd
-import praw
 import os
 import prawcore
 from dotenv import load_dotenv
-import re
-import time
+
+import rules
+from checkpoint import CheckpointStore, Watermark
+from metrics import Metrics
+from preprocess import Preprocessor
+from pipeline import Marker, Pipeline, Stage
+from ratelimit import AdaptiveRateLimiter, ThreadClients
+from sinks import consume
+from store import open_store
 
 
 class RedditScrapper:
-    def __init__(self, client_id, client_secret, user_agent):
-        self.reddit = praw.Reddit(
-            client_id=client_id,
-            client_secret=client_secret,
-            user_agent=user_agent
-        )
+    def __init__(self, client_id, client_secret, user_agent, requests_per_second=100 / 60, reddit=None,
+                 rate_limiter=None, metrics=None, dedup=True):
+        # Every API request, from any worker thread, draws from this one budget. It starts at Reddit's
+        # 100 requests per minute and then follows the rate-limit headers of the responses.
+        # `rate_limiter` shares a budget created elsewhere, e.g. by jobs.py across processes.
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(rate=requests_per_second)
+        # A PRAW client per thread (see ratelimit.ThreadClients); `reddit` replaces them all, e.g. with an
+        # offline_reddit.OfflineReddit
+        self.clients = ThreadClients(client_id, client_secret, user_agent, self.rate_limiter, reddit=reddit)
+        # Stage timers and counters of the runs (see metrics.py)
+        self.metrics = metrics or Metrics()
+        # Strips bot/boilerplate blocks before the rules run and, with `dedup`, drops texts repeating one this
+        # scrapper has already seen (see preprocess.py)
+        self.preprocessor = Preprocessor(dedup=dedup, metrics=self.metrics)
+
+    @property
+    def reddit(self):
+        """The calling thread's PRAW client."""
+        return self.clients.get()
 
     def is_personal_experience(self, text):
         """
          Checks if a post or comment indicates a personal experience.
         """
-        personal_patterns =  [
-            r"\b(I|me|my|mine|we|our|us)\b",
-            r"\b(felt|tried|experienced|found|helped|worked|changed|improved|saved my life)\b",
-            r"\b(during|while|after|when I did|it was|it felt like)\b",
-            r"\b(life changing|breakthrough|trauma processing|emotional release|triggered|ground myself|unlock memory)\b",
-            r"\b(separate the past from the present|panic attack|PTSD|C-PTSD|reliving moments|healing journey|symptomatic|remission)\b",
-            r"\b(it didn’t help|it helped immensely|it worked for me|it made things worse|it was worth it|recommend it)\b"
-        ]
-        return any(re.search(pattern, text, re.IGNORECASE) for pattern in personal_patterns)
+        return rules.is_personal_experience(text) is not None
 
     def is_exclusion(self, text):
         """
             Checks if a post or comment matches exclusion criteria.
             This method looks both before and after the exclusion term
             to ensure we only exclude posts that are undecided and have no mention of trying EMDR.
+            The patterns live in rules.py, compiled once into a single matcher.
         """
+        return rules.exclusion_rule(text) is not None
 
-        # Check if the comment starts with the exact automated response phrase
-        automated_response_prefix = "r/ptsd has generated this automated response that is appended to every post"
-        if text.lstrip().startswith(automated_response_prefix):
-            print("Skipping automated response")  # Debug print to confirm
-            return False  # Don't exclude this comment
-
-        exclusion_patterns = [
-            # Comments where the author hasn't tried EMDR and is considering it
-            r"\b(debating (on whether|whether|if) (I'?d try|to try)|If I (do|start) EMDR|I'm about to start EMDR|Should I try EMDR|Has (anybody|anyone)( here)? tried EMDR( therapy)?|wanted some advice|haven’t tried it|not sure if I'm ready)\b",
-
-            # Comments where the author is expressing uncertainty or fear about starting EMDR
-            r"\b(I'm (apprehensive|unsure|scared of reliving)|I (can't|could) handle it|I should (hold off|wait) on EMDR|I'm scared (of trying|to try) it|too scared)\b",
-
-            # Extended to catch uncertainty or lack of understanding while still being willing to try EMDR
-            r"\b((want|willing) to try it|I don't understand how eye movement moves a memory|I'm curious about how EMDR works|I might try)\b",
-
-            # Comments about therapy advice without having tried EMDR yet (indicating uncertainty or hesitation)
-            r"\b(not stable enough|I (haven't|have not) tried it yet|I dissociate a lot|I (wasn't|am not) ready for EMDR|I (don't|cannot) know if I want to try|I was supposed to begin EMDR|I'm still considering)\b",
-
-            # Exclude specific concerns about readiness for EMDR, especially involving BPD or dissociation
-            r"\b(I (was supposed to|should have|was going to) (begin|start) EMDR (but|however) I (have BPD|dissociate(a lot| frequently)|(am|was) not stable enough|cannot handle it|don’t feel ready))\b",
-
-            # Comments where someone is asking about EMDR without having tried it yet
-            r"\b(Should clarify that I have not had any trauma therapy yet|How was (online EMDR|it)?|Should I try it|Do you think I should do it|Is EMDR safe for someone like me|I don’t know if I’m in the right place for EMDR|I’m concerned about whether EMDR is right for me|I know addressing trauma would help, but I’m not sure if I should start EMDR)\b",
-
-            # New patterns to exclude comments where the user agreed to try EMDR but backed out or was too scared
-            r"\b(agreed to try (EMDR|it) but (was too scared|didn't follow through|backed out|couldn't handle it|changed my mind))\b",
-            r"\b((I was|I’m) too scared (to start|to follow through with|to try) (EMDR|it)|backed out of (trying|doing) (EMDR|it)|changed my mind about (trying|doing) (EMDR|it))\b",
-
-            # Exclude comments about certification or professional advice from certified therapists
-            r"\b(EMDR certified therapist|board certified psychiatrist|certified EMDR practitioner|certified as an EMDR practitioner|accredited EMDR teacher|clinical psychologist|licensed social worker|ongoing consultation)\b"
-
-            # Exclude specific generic comments that are not personal experiences but just offering general advice or information
-            r"\b(People have all sorts of experiences with EMDR|EMDR is not the only type of neurotherapy)\b",
-
-            # Catch negative or concern-based comments about EMDR's effectiveness or its drawbacks
-            r"\b(concerns around|controversy about|ethical concerns|effectiveness of EMDR|not sure if EMDR is effective|not working for me|considering other forms of therapy)\b",
-
-            # Exclude automated responses from bots or rules-based content
-            r"(Welcome to r/ptsd|We are a supportive & respectful community|Your safety always comes first!|Do NOT exchange DMs or personal info|Please contact your GP/doctor|If you or someone you know is in immediate danger|suicide and support hotlines|Gatekeeping is not allowed here|I am a bot|this action was performed automatically|contact the moderators)"
-        ]
-        # First check if the text matches any exclusion pattern
-        if any(re.search(pattern, text, re.IGNORECASE) for pattern in exclusion_patterns):
-            # If it matches, check if there's any mention of having already tried EMDR
-            if re.search(r"\b(already tried|have done|completed)\s*EMDR", text, re.IGNORECASE):
-                return False  # Include this post because EMDR was already tried
-            return True  # Exclude this post because it's uncertain about trying EMDR or doesn't mention it yet
+    def _with_rate_limit_retry(self, request):
+        """
+        Calls `request` until it is not rejected with a 429.
+        The rate limiter has already started backing off when the 429 comes back, so the retry just waits for it.
+        """
+        while True:
+            try:
+                return request()
+            except prawcore.exceptions.TooManyRequests:
+                self.metrics.count("rate_limited")
+                print(f"Rate limit reached. Retrying in {self.rate_limiter.current_wait:.0f} seconds...")
 
-        # If none of the exclusion patterns match, return False (don't exclude)
-        return False
+    def _expand_post(self, post, limit_comment, since=None):
+        """
+        Pipeline stage (network): decides whether the rules keep the post itself and, if they don't,
+        expands its comment tree. Returns (post, post_content, post_key, comments), post_content being the
+        cleaned text of a kept post and None otherwise, and post_key its Preprocessor key (see `_new_records`).
+        With `since`, only the comments created after it are returned.
+        """
+        with self.metrics.timer("preprocess"):
+            post_content, drop_reason, post_key = self.preprocessor.prepare(post.selftext)
+
+        # Determine if the post content is relevant
+        with self.metrics.timer("regex"):
+            post_content_included = (drop_reason is None and self.is_personal_experience(post_content) and
+                                     not self.is_exclusion(post_content))
+        if post_content_included:
+            return post, post_content, post_key, []
+        return post, None, post_key, self._expand_comments(post, limit_comment, since)
+
+    def _expand_comments(self, post, limit_comment, since=None):
+        submission = self.clients.submission(post)
+
+        def expand():
+            submission.comments.replace_more(limit=limit_comment)
+            return submission.comments.list()
+
+        comments = []
+        with self.metrics.timer("replace_more", items=lambda: len(comments)):
+            comments = self._with_rate_limit_retry(expand)
+        if since is not None:
+            comments = [comment for comment in comments if comment.created_utc > since]
+        return comments
+
+    def _filter_post(self, expanded):
+        """
+        Pipeline stage (CPU): runs the rules on the comments of an expanded post. Returns the expanded post with
+        its comments as (record, key) pairs, record being None for a comment the rules reject. Duplicates are
+        left for `_new_records` to drop.
+        """
+        post, post_content, post_key, comments = expanded
+        with self.metrics.timer("preprocess", items=len(comments)):
+            prepared = [(comment, *self.preprocessor.prepare(comment.body)) for comment in comments]
+        # Keep relevant comments from this post
+        with self.metrics.timer("regex", items=len(prepared)):
+            candidates = [({"id": comment.id, "content": text}
+                           if self.is_personal_experience(text) and not self.is_exclusion(text) else None, key)
+                          for comment, text, drop_reason, key in prepared if drop_reason is None]
+        return post, post_content, post_key, candidates
+
+    def _new_records(self, filtered, limit_comment, since=None):
+        """
+        Returns the records of a filtered post that don't repeat a text seen before. Called in search order, so
+        the copy of a text that is kept doesn't depend on thread timing. A kept post that turns out to repeat an
+        earlier one is dropped and has its comments expanded here instead (a rare case).
+        """
+        post, post_content, post_key, comments = filtered
+        duplicate = self.preprocessor.decide(post_key) is not None
+        if post_content is not None:
+            if not duplicate:
+                return [{"id": post.id, "content": post_content}]
+            comments = self._filter_post((post, None, None, self._expand_comments(post, limit_comment, since)))[3]
+        # Every comment is decided, so that the ones the rules reject still catch their copies
+        return [record for record, key in comments if self.preprocessor.decide(key) is None and record is not None]
+
+    def scrape_and_filter(self, subreddit_name, therapy, limit, output_file, save_every, limit_comment, **options):
+        """
+        Runs `iter_records` to the end (see it for the options) and returns the records of the store at
+        `output_file` as a DataFrame: the first `limit` of them, or every record up to those added by this run
+        with `incremental`.
+        """
+        store = open_store(output_file)
+        target = store.count() + limit if options.get("incremental") else limit
+        store.close()
 
-    def scrape_and_filter(self, subreddit_name, therapy, limit, output_file, save_every, limit_comment):
-        results = []
-        subreddit = self.reddit.subreddit(subreddit_name)
-        fetched_posts = 0
-        after = None
-        processed_ids = set()  # Set to track processed IDs
+        consume(self.iter_records(subreddit_name, therapy, limit, output_file, save_every, limit_comment, **options))
 
-        # Load existing data if the file exists
-        if os.path.exists(output_file):
-            existing_data = pd.read_csv(output_file)
-            processed_ids = set(existing_data["id"])  # Add existing IDs to the set
-            results = existing_data.to_dict("records")
-            print(f"Loaded {len(processed_ids)} existing records from {output_file}")
+        store = open_store(output_file)
+        filtered_data = store.to_dataframe(target)
+        store.close()
+        return filtered_data
 
-        def append_to_csv(file_path, new_data):
-            """Append new data to the CSV without overwriting."""
-            try:
-                if not os.path.exists(file_path):
-                    pd.DataFrame(new_data).to_csv(file_path, index=False)
-                else:
-                    pd.DataFrame(new_data).to_csv(file_path, mode='a', header=False, index=False)
-            except PermissionError as e:
-                print(f"Permission error while writing to {file_path}: {e}")
-                print("Retrying in 5 seconds...")
-                time.sleep(5)
-                append_to_csv(file_path, new_data)
-
-        while len(results) < limit:
-            try:
-                search_results = subreddit.search(
-                    therapy, limit=20, time_filter='year', params={"after": after}
-                )
-                search_results = list(search_results)  # Convert ListingGenerator to list
-                print(f"Fetched {len(search_results)} posts in this batch.")
+    def iter_records(self, subreddit_name, therapy, limit, output_file, save_every=100, limit_comment=0,
+                     expand_workers=None, filter_workers=1, queue_size=20, time_filter='year',
+                     checkpoint_dir="checkpoints", metrics_file=None, metrics_interval=None,
+                     incremental=False, recheck_window=2 * 24 * 3600):
+        """
+        Searches `subreddit_name` for `therapy` and yields the {"id", "content"} records of the posts, or the
+        comments of rejected posts, that describe a personal experience, as they are added to the result store at
+        `output_file` (a `.csv` file, or an SQLite database for any other extension, see store.py).
+        Only the store's id index and the pipeline queues are held in memory, whatever `limit` is; the records
+        can be written anywhere else by the sinks of sinks.py.
+
+        Runs as a pipeline: a search pager feeds `expand_workers` comment-expansion threads, then `filter_workers`
+        rule-filtering threads, and the generator itself adds their records to the store in search order.
+        `queue_size` bounds how many posts can wait between two stages.
+
+        After each committed page the search cursor and counters are saved under `checkpoint_dir`
+        (None disables it), so an interrupted run resumes paging where it stopped.
+
+        Stage timings and counters go to `self.metrics`; their snapshot is written to `metrics_file` (JSON, or
+        Prometheus text for .prom) at the end of the run and every `metrics_interval` seconds if set.
+
+        With `incremental`, the search is sorted by new and stops at the watermark of the last complete run
+        (see checkpoint.Watermark): only newer posts are processed, plus the posts of the last `recheck_window`
+        seconds whose comment count grew, for their new comments. `limit` then caps the records this run adds.
+        Its cursor is checkpointed too, along with the progress of the watermark: an interrupted or limited
+        incremental run is resumed after its last committed page, and the watermark moves once a crawl reaches it.
+        """
+        page_size = 20
+
+        # Resume from the records already in the store (only its id index is consulted)
+        store = open_store(output_file)
+        stored = store.count()
+        if stored:
+            print(f"Found {stored} existing records in {output_file}")
+
+        if incremental and not checkpoint_dir:
+            raise ValueError("Incremental mode keeps its watermark under checkpoint_dir")
+        target = stored + limit if incremental else limit
+        if stored >= target:
+            store.close()
+            return
+
+        # Resume paging after the last committed page of this search. An incremental crawl has its own cursor,
+        # whatever the time filter, and is bounded by the watermark.
+        checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+        checkpoint_key = (subreddit_name, therapy, "incremental" if incremental else time_filter)
+        state = (checkpoints.load(*checkpoint_key) if checkpoints
+                 else {"after": None, "fetched_posts": 0, "last_seen_utc": None})
+        watermark = Watermark(checkpoints, subreddit_name, therapy, recheck_window) if incremental else None
+        if watermark is not None and state["after"] and state.get("watermark"):
+            watermark.resume(state["watermark"])
+        rechecks = {}  # Post id -> time after which its comments are new, for the active posts re-checked
+        crawl = {"complete": False, "limited": False}
+        if state["after"]:
+            print(f"Resuming {subreddit_name}/{therapy} after {state['after']}")
+        progress = {"fetched_posts": state["fetched_posts"], "written_posts": 0}
+
+        def search_pages():
+            """
+            Pipeline source: pages through the search results and yields the posts not processed yet,
+            followed by a Marker at the end of each page.
+            """
+            subreddit = self.reddit.subreddit(subreddit_name)  # The pager thread's own client
+            after = state["after"]
+            while True:
+                search_results = []
+                with self.metrics.timer("search", items=lambda: len(search_results)):
+                    search_results = self._with_rate_limit_retry(lambda: list(subreddit.search(
+                        therapy, sort="new" if incremental else "relevance", limit=page_size,
+                        time_filter=time_filter, params={"after": after}
+                    )))
+                self.metrics.count("posts_fetched", len(search_results))
 
                 if not search_results:
                     print("No more posts found. Stopping.")
-                    break
+                    # Everything was paged through: the next run starts from the top again
+                    crawl["complete"] = True
+                    yield Marker(after=None, fetched_posts=progress["fetched_posts"], last_seen_utc=None)
+                    return
 
-                batch_results = []
+                reached_watermark = False
                 for post in search_results:
-                    fetched_posts += 1
+                    progress["fetched_posts"] += 1
+
+                    if watermark is not None:
+                        status = watermark.status(post)
+                        if status == Watermark.PAST:
+                            reached_watermark = True
+                            break
+                        watermark.seen(post)
+                        if status == Watermark.UNCHANGED:
+                            self.metrics.count("unchanged_posts")
+                            continue
+                        if status == Watermark.RECHECK:
+                            rechecks[post.id] = watermark.since
+                            self.metrics.count("rechecked_posts")
 
                     # Skip duplicates
-                    if post.id in processed_ids:
-                        print(f"Skipping duplicate post ID: {post.id}")
+                    if post.id in store:
+                        self.metrics.count("duplicate_posts")
                         continue
-
-                    # Determine if the post content is relevant
-                    post_content_included = (self.is_personal_experience(post.selftext) and
-                                             not self.is_exclusion(post.selftext))
-
-                    if post_content_included:
-                        batch_results.append({
-                            "id": post.id,
-                            "content": post.selftext
-                        })
-                        processed_ids.add(post.id)
-                    else:
-                        # Scrape relevant comments from this post
-                        post.comments.replace_more(limit=limit_comment)
-                        for comment in post.comments.list():
-                            if (
-                                    comment.id not in processed_ids and  # Check for duplicates
-                                    self.is_personal_experience(comment.body) and not self.is_exclusion(comment.body)
-                            ):
-                                batch_results.append({
-                                    "id": comment.id,
-                                    "content": comment.body
-                                })
-                                processed_ids.add(comment.id)  # Mark as processed
-
-                # Append new results to the CSV and results list
-                results.extend(batch_results)
-                append_to_csv(output_file, batch_results)
+                    yield post
 
                 # Update 'after' for pagination
-                if search_results:
-                    after = search_results[-1].fullname  # Set 'after' to the last post's fullname
-                    print(f"Updated pagination token (after): {after}")
-                else:
-                    print("No new posts in this batch.")
+                after = search_results[-1].fullname  # Set 'after' to the last post's fullname
+                yield Marker(after=after, fetched_posts=progress["fetched_posts"],
+                             last_seen_utc=max(post.created_utc for post in search_results))
+                if reached_watermark:
+                    print(f"Reached the watermark of {subreddit_name}/{therapy}. Stopping.")
+                    crawl["complete"] = True
+                    return
+
+        batch_results = []
+        batch_ids = set()
+
+        def add_to_store():
+            """Adds the pending records to the store and returns them."""
+            nonlocal stored
+            if not batch_results:
+                return []
+            with self.metrics.timer("write", items=len(batch_results)):
+                added = store.add_many(batch_results)
+            stored += added
+            self.metrics.count("records_retained", added)
+            records = batch_results.copy()
+            batch_results.clear()
+            return records
+
+        def commit(page_end):
+            """Adds the page's records to the store, then checkpoints the cursor that follows them."""
+            records = add_to_store()
+            batch_ids.clear()
+            if checkpoints:
+                state.update(after=page_end.after, fetched_posts=page_end.fetched_posts, retained=stored)
+                if page_end.last_seen_utc is not None:
+                    state["last_seen_utc"] = max(state["last_seen_utc"] or 0, page_end.last_seen_utc)
+                if watermark is not None:
+                    state["watermark"] = watermark.progress()
+                checkpoints.save(*checkpoint_key, state)
+            return records
+
+        def write(filtered):
+            """
+            De-duplicates the records of a filtered post and commits them to the store a page at a time.
+            Returns the records committed and whether there are enough of them.
+            """
+            if isinstance(filtered, Marker):
+                return commit(filtered), False
+
+            for record in self._new_records(filtered, limit_comment, since=rechecks.get(filtered[0].id)):
+                if record["id"] not in batch_ids and record["id"] not in store:  # Check for duplicates
+                    batch_results.append(record)
+                    batch_ids.add(record["id"])  # Mark as processed
+            progress["written_posts"] += 1
+            self.metrics.count("posts_processed")
+
+            # Log progress every `save_every` posts
+            if progress["written_posts"] % save_every == 0:
+                print(f"Processed {progress['fetched_posts']} posts, retained {stored + len(batch_results)} results...")
+
+            # Stop the pipeline once we have enough results. The page isn't complete, so the checkpoint
+            # keeps pointing before it and a resumed run re-reads it (its stored ids are skipped).
+            if stored + len(batch_results) >= target:
+                batch_ids.clear()
+                crawl["limited"] = True
+                return add_to_store(), True
+            return [], False
+
+        self.metrics.gauge_source("rate_limiter", self.rate_limiter.stats)
+        if metrics_file and metrics_interval:
+            self.metrics.start_exporter(metrics_file, metrics_interval)
+
+        results = Pipeline(
+            search_pages(),
+            [Stage("expand", lambda post: self._expand_post(post, limit_comment, since=rechecks.get(post.id)),
+                   workers=expand_workers),
+             Stage("filter", self._filter_post, workers=filter_workers)],
+            queue_size=queue_size
+        ).stream()
+        try:
+            for result in results:
+                records, enough = write(result)
+                yield from records
+                if enough:
                     break
-
-                # Log progress every 10 posts
-                if fetched_posts % save_every == 0:
-                    print(f"Processed {fetched_posts} posts, retained {len(results)} results...")
-
-                # Break the loop if we have enough results
-                if len(results) >= limit:
-                    break
-
-            except prawcore.exceptions.TooManyRequests:
-                print("Rate limit reached. Waiting for 60 seconds...")
-                time.sleep(30)  # Wait and retry
-                continue
-
-        print(f"Final save: {len(results[:limit])} records written to {output_file}")
-        return pd.DataFrame(results[:limit])
+            results.close()  # Stops the pipeline if we had enough
+            yield from add_to_store()
+
+            # The watermark only moves once the crawl went all the way down to it, otherwise the posts left
+            # between the two would be skipped by the next run
+            if watermark is not None and crawl["complete"] and not crawl["limited"]:
+                watermark.save()
+                # The next crawl starts from the newest post again
+                state.update(after=None, watermark=None)
+                checkpoints.save(*checkpoint_key, state)
+            print(f"Final save: {min(stored, target)} records written to {output_file}")
+        finally:
+            # Also reached when the caller stops reading early: the records not committed yet are dropped and
+            # the checkpoint still points before their page
+            results.close()
+            self.metrics.finish(metrics_file)
+            store.close()
 
     def save_to_csv(self, data, filename):
         data.to_csv(filename, index=False)
@@ -1,165 +1,340 @@
-import praw
-from transformers import pipeline
-import pandas as pd
+import prawcore
+import threading
 import time
-import os
-import re
+
+import rules
+from cache import ClassificationCache
+from cascade import APPROVED_COLUMNS, DENIED_COLUMNS, MODEL_LABEL_COLUMNS, Cascade
+from chunking import AGGREGATIONS, ChunkStats, TextChunker, aggregate_scores
+from metrics import Metrics
+from preprocess import Preprocessor, strip_boilerplate
+from checkpoint import CheckpointStore, Watermark, file_sizes
+from pipeline import Marker, Pipeline, Stage
+from ratelimit import AdaptiveRateLimiter, ThreadClients
+from sinks import CsvSink, consume
+from writer import FALSE_POSITIVE_LOG, BackgroundWriter
+
+
+def approved_entry(title, body, classification, comments, url, timestamp, model_label=None, model_text=None):
+    """
+    An approved entry, as yielded by `RedditExperienceScraper.iter_entries`. Besides the APPROVED_COLUMNS, it has
+    the "Model Label" and "Model Text" of MODEL_LABEL_COLUMNS: the zero-shot model's top label (None when regex
+    rules or the cascade decided) and the text it was given.
+    """
+    entry = dict(zip(APPROVED_COLUMNS, [title, body, classification, comments, url, timestamp]), approved=True)
+    entry.update({"Model Label": model_label, "Model Text": model_text})
+    return entry
+
+
+def denied_entry(kind, classification, text, url, timestamp, model_label=None, model_text=None):
+    """A denied entry, as yielded by `RedditExperienceScraper.iter_entries`, see `approved_entry`."""
+    entry = dict(zip(DENIED_COLUMNS, [kind, classification, text, url, timestamp]), approved=False)
+    entry.update({"Model Label": model_label, "Model Text": model_text})
+    return entry
+
+
+def has_model_label(entry):
+    return entry.get("Model Label") is not None
+
+
+def is_approved(entry):
+    return entry["approved"]
+
 
 class RedditAPI:
     """Handles Reddit authentication and data retrieval using PRAW."""
 
-    def __init__(self, client_id, client_secret, user_agent):
-        """Initialize Reddit API connection."""
-        self.reddit = praw.Reddit(client_id=client_id,
-                                  client_secret=client_secret,
-                                  user_agent=user_agent)
-
-    def search_subreddit(self, subreddit_name, search_term, limit=50, time_filter='year', after=None):
+    def __init__(self, client_id, client_secret, user_agent, reddit=None, rate_limiter=None, metrics=None):
+        """
+        Initialize Reddit API connection, paced by an adaptive rate limiter (`rate_limiter` shares an existing one).
+        Each thread gets its own PRAW client (see ratelimit.ThreadClients); `reddit` replaces them all.
+        """
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter()
+        self.clients = ThreadClients(client_id, client_secret, user_agent, self.rate_limiter, reddit=reddit)
+        self.metrics = metrics or Metrics()
+
+    @property
+    def reddit(self):
+        """The calling thread's PRAW client."""
+        return self.clients.get()
+
+    def search_subreddit(self, subreddit_name, search_term, limit=50, time_filter='year', after=None,
+                         sort="relevance"):
         """Search for posts containing a specific term in a subreddit."""
         subreddit = self.reddit.subreddit(subreddit_name)
         search_results = subreddit.search(
-            search_term, limit=limit, time_filter=time_filter, params={"after": after}
+            search_term, sort=sort, limit=limit, time_filter=time_filter, params={"after": after}
         )
         return search_results
 
+    def with_retry(self, request):
+        """Calls `request` until it is not rejected with a 429, waiting for the rate limiter's backoff."""
+        while True:
+            try:
+                return request()
+            except prawcore.exceptions.TooManyRequests:
+                self.metrics.count("rate_limited")
+                print(f"⏳ Rate limit reached. Retrying in {self.rate_limiter.current_wait:.0f} seconds...")
+
 class TextClassifier:
     """Uses Hugging Face's Zero-Shot Classification to identify personal EMDR experiences in posts and comments."""
 
-    def __init__(self):
-        """Initialize the NLP model."""
-        self.classifier = pipeline('zero-shot-classification', model="facebook/bart-large-mnli")
+    def __init__(self, batch_size=8, cache_path="classification_cache.sqlite", classifier=None, inference_socket=None,
+                 backend="fp32", num_threads=None, cascade_model=None, cascade_threshold=0.5, max_tokens=None,
+                 chunk_overlap=32, chunk_aggregation="mean", metrics=None, writer=None):
+        """
+        Initialize the classifier and, unless `cache_path` is None, the on-disk result cache.
+        The NLP model is only loaded the first time a text needs it, on the CPU inference `backend` ("fp32", "int8"
+        or "onnx", see zero_shot.py) with `num_threads` threads. With `inference_socket`, texts are sent to the
+        inference worker listening there (see inference_server.py), which runs its own backend.
+        With `cascade_model` (a model trained by cascade.py), a cheap classifier decides the texts it is confident
+        about (label probability margin >= `cascade_threshold`) and only the others reach the zero-shot model.
+        With `max_tokens`, texts longer than that are classified as overlapping chunks (`chunk_overlap` tokens)
+        whose label scores are combined by `chunk_aggregation` ("mean" or "max"), see chunking.py.
+        `classifier` replaces the zero-shot pipeline with any callable taking the same arguments.
+        Stage timings (regex, cascade, inference) go to `metrics`. False positives are logged through `writer`
+        (a writer.BackgroundWriter) when set.
+        """
+        self.model_name = "facebook/bart-large-mnli"
+        self.backend = backend
+        self.num_threads = num_threads
+        self._classifier = classifier
+        self.inference_socket = inference_socket
+        self._load_lock = threading.Lock()
         self.labels = ['personal experience', 'theoretical discussion', 'testimony', 'question', 'opinion']
+        self.batch_size = batch_size  # Texts sent to the model per forward pass
+        self.cache = ClassificationCache(cache_path) if cache_path else None
+        self.cascade = Cascade.load(cascade_model, cascade_threshold) if cascade_model else None
+        if chunk_aggregation not in AGGREGATIONS:
+            raise ValueError(f"Unknown chunk aggregation {chunk_aggregation!r}, expected one of {AGGREGATIONS}")
+        self.max_tokens = max_tokens
+        self.chunk_overlap = chunk_overlap
+        self.chunk_aggregation = chunk_aggregation
+        self._chunker = None
+        self.chunk_stats = ChunkStats() if max_tokens else None
+        self.metrics = metrics or Metrics()
+        self.writer = writer
+        if writer is not None:
+            writer.register(FALSE_POSITIVE_LOG)
+
+    @property
+    def classifier(self):
+        """The zero-shot pipeline (or inference worker client), created on first use."""
+        if self._classifier is None:
+            with self._load_lock:
+                if self._classifier is None:
+                    if self.inference_socket:
+                        from inference_server import RemoteZeroShot
+                        self._classifier = RemoteZeroShot(self.inference_socket)
+                    else:
+                        from zero_shot import load_zero_shot
+                        print(f"🧠 Loading {self.model_name} ({self.backend})...")
+                        self._classifier = load_zero_shot(self.model_name, self.backend, self.num_threads)
+        return self._classifier
+
+    @property
+    def chunker(self):
+        """Splits long texts by the model's own tokenizer when it has one, created on first use."""
+        if self._chunker is None:
+            self._chunker = TextChunker(self.max_tokens, self.chunk_overlap,
+                                        tokenizer=getattr(self.classifier, "tokenizer", None))
+        return self._chunker
+
+    @property
+    def model_id(self):
+        """
+        Identifies the model, backend and chunking in cache keys, as reduced-precision backends and chunked texts
+        may get other labels.
+        """
+        parts = [self.model_name]
+        if self.backend != "fp32":
+            parts.append(self.backend)
+        if self.max_tokens:
+            parts.append(f"chunks{self.max_tokens}/{self.chunk_overlap}/{self.chunk_aggregation}")
+        return ":".join(parts)
+
+    @property
+    def model_loaded(self):
+        return self._classifier is not None
 
     def classify_post(self, text):
         """Classifies a Reddit post using regex for first-hand EMDR experiences."""
-        result = self.classifier(text, candidate_labels=self.labels)
-        top_label = result['labels'][0]
-
-        first_hand_experience_regex = re.compile(
-            r"\b(I (tried|started|completed|did|went through|had) EMDR|"
-            r"after (\d+ sessions|doing|my) EMDR|"
-            r"during my (EMDR|it) (session|therapy)|"
-            r"my (EMDR )?(therapist|session|experience|treatment)|"
-            r"(EMDR|it) (was (life changing|a waste of time|intense|helpful|too much for me|worth it|tough)|"
-            r"helped|changed|made me feel|worked for) me|"
-            r"EMDR was (amazing|horrible|really hard|so intense|so worth it|difficult at first))\b",
-            re.IGNORECASE
-        )
+        return self.classify_many([text], kind="post")[0]
 
-        #Regex to reject indirect mentions
-        undecided_or_third_party_regex = re.compile(
-            r"\b(thinking about EMDR|considering EMDR|scared to try EMDR|not sure if I will do EMDR|"
-            r"haven’t started EMDR|was recommended EMDR|was supposed to do EMDR but|"
-            r"was told EMDR wouldn’t work for me|my therapist denied me EMDR|"
-            r"never actually started EMDR|my friend did EMDR|someone I know did EMDR|"
-            r"I plan to do EMDR|I'm waiting to try EMDR|I might do EMDR in the future|"
-            r"I'm preparing for EMDR|I decided not to do EMDR)\b"
-            r"\b(too unwell for EMDR|not ready for EMDR|therapist refused EMDR|"
-            r"not stable enough for EMDR|my therapist denied me EMDR)\b"
-            r"\b(denied EMDR|refused EMDR|not allowed to do EMDR|was not approved for EMDR|"
-            r"not stable enough for EMDR|told I can't do EMDR|not a candidate for EMDR)\b"
-            r"\b(planning to do EMDR|thinking about trying EMDR|considering EMDR|scared to try EMDR|"
-            r"haven’t started EMDR yet|waiting to start EMDR|preparing for EMDR)\b"
-            r"couldn't start EMDR|my therapist stopped EMDR before it started|"
-            r"\b(EMDR was not an option for me)\b"
-            r"\b(scared to try EMDR|not sure about EMDR|not everyone is a candidate for EMDR|"
-            r"thinking about doing EMDR|wondering if EMDR is right for me|"
-            r"glad I was refused EMDR|I may try EMDR one day)\b"
-
-            ,
-            re.IGNORECASE
-        )
+    def classify_comment(self, text, parent_post_text=None):
+        """Classifies a Reddit comment based on explicit or implicit mention of the author's EMDR experience."""
+        return self.classify_many([text], kind="comment")[0]
+
+    def classify_many(self, texts, kind="comment"):
+        """
+        Classifies a list of posts or comments (`kind`) and returns their labels in the same order.
+        Texts decided by regex alone never reach the model; the others go through it in length-sorted batches.
+        """
+        return [label for label, _ in self.classify_with_model_labels(texts, kind)]
+
+    def classify_with_model_labels(self, texts, kind="comment"):
+        """
+        Like `classify_many`, but returns (label, model label) pairs: the model label is the zero-shot model's top
+        label, None when regex rules or the cascade decided.
+        """
+        labels = [None] * len(texts)
+        model_labels = [None] * len(texts)
+        to_model = []
+        start = time.perf_counter()
+        for i, text in enumerate(texts):
+            short_circuit = self._post_short_circuit(text) if kind == "post" else rules.comment_short_circuit(text.lower())
+            if short_circuit is not None:
+                labels[i] = short_circuit
+            else:
+                to_model.append(i)
+        regex_seconds = time.perf_counter() - start
+
+        top_labels, from_model = self._top_labels([texts[i] for i in to_model])
+        start = time.perf_counter()
+        for i, top_label, by_model in zip(to_model, top_labels, from_model):
+            if kind == "post":
+                labels[i] = self._label_post(top_label)
+            else:
+                labels[i] = self._label_comment(texts[i], top_label, by_model)
+            if by_model:
+                model_labels[i] = top_label
+        self.metrics.observe("regex", regex_seconds + time.perf_counter() - start, len(texts))
+        return list(zip(labels, model_labels))
+
+    def _top_labels(self, texts):
+        """
+        Returns the top label of each text, in input order, reading and filling the cache if enabled, and whether
+        the zero-shot model gave it. Texts missing from the cache go through the cascade first, when there is one;
+        only the zero-shot model's labels are cached.
+        """
+        if self.cache is None:
+            return self._cascade_then_model(texts)
+
+        keys = [ClassificationCache.make_key(text, self.model_id, self.labels) for text in texts]
+        cached = self.cache.get_many(keys)
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        computed, computed_by_model = self._cascade_then_model([texts[i] for i in missing],
+                                                               cache_keys=[keys[i] for i in missing])
+
+        top_labels = [cached.get(key) for key in keys]
+        from_model = [True] * len(texts)
+        for i, label, by_model in zip(missing, computed, computed_by_model):
+            top_labels[i] = label
+            from_model[i] = by_model
+        return top_labels, from_model
+
+    def _cascade_then_model(self, texts, cache_keys=None):
+        """
+        Returns each text's top label from the cascade when it is confident, from the zero-shot model otherwise,
+        and whether the model gave it. The model's labels are stored in the cache under `cache_keys`.
+        """
+        top_labels = [None] * len(texts)
+        if self.cascade and texts:
+            with self.metrics.timer("cascade", items=len(texts)):
+                top_labels = self.cascade.decide(texts)
+        escalated = [i for i, label in enumerate(top_labels) if label is None]
+        computed = self._run_model([texts[i] for i in escalated])
+        if cache_keys is not None:
+            self.cache.put_many((cache_keys[i], label) for i, label in zip(escalated, computed))
+        from_model = [False] * len(texts)
+        for i, label in zip(escalated, computed):
+            top_labels[i] = label
+            from_model[i] = True
+        return top_labels, from_model
+
+    def _run_model(self, texts):
+        """
+        Runs the zero-shot model over texts and returns each top label, in input order.
+        In chunking mode, long texts are split and all chunks are batched together; a text's top label is then the
+        best of its aggregated chunk scores.
+        """
+        if not texts:
+            return []  # Don't load the model for nothing
+        run_start = time.perf_counter()
+        chunks = [self.chunker.split(text) for text in texts] if self.max_tokens else [[text] for text in texts]
+        pieces = [(i, chunk) for i, text_chunks in enumerate(chunks) for chunk in text_chunks]
+
+        # Batching texts of similar length keeps padding inside each batch small
+        order = sorted(range(len(pieces)), key=lambda p: len(pieces[p][1]))
+        results = [None] * len(pieces)
+        long_seconds = 0.0
+        for start in range(0, len(order), self.batch_size):
+            bucket = order[start:start + self.batch_size]
+            classifier = self.classifier  # Loaded outside the timer
+            batch_start = time.perf_counter()
+            with self.metrics.timer("inference", items=len(bucket)):
+                batch_results = classifier([pieces[p][1] for p in bucket], candidate_labels=self.labels,
+                                           batch_size=self.batch_size)
+            if isinstance(batch_results, dict):
+                batch_results = [batch_results]  # The pipeline unwraps single-text batches
+            long_chunks = sum(len(chunks[pieces[p][0]]) > 1 for p in bucket)
+            long_seconds += (time.perf_counter() - batch_start) * long_chunks / len(bucket)
+            for p, result in zip(bucket, batch_results):
+                results[p] = result
+
+        top_labels = []
+        first = 0
+        for text_chunks in chunks:
+            chunk_results = results[first:first + len(text_chunks)]
+            first += len(text_chunks)
+            if len(chunk_results) == 1:
+                top_labels.append(chunk_results[0]['labels'][0])
+            else:
+                scores = aggregate_scores(chunk_results, self.labels, [len(chunk) for chunk in text_chunks],
+                                          self.chunk_aggregation)
+                top_labels.append(max(scores, key=scores.get))
+
+        if self.chunk_stats is not None:
+            self.chunk_stats.record([len(text_chunks) for text_chunks in chunks], time.perf_counter() - run_start,
+                                    long_seconds)
+        return top_labels
 
+    def _post_short_circuit(self, text):
+        """Returns the label regex alone gives a post, or None when the model is needed."""
         # Reject indirect mentions
-        if undecided_or_third_party_regex.search(text):
+        if rules.UNDECIDED_POST.search(text):
             return "indirect_reference"
 
         # Approve if regex confirms firsthand experience
-        if first_hand_experience_regex.search(text):
+        if rules.FIRST_HAND_POST.search(text):
             return "personal experience"
 
+        return None
+
+    def _label_post(self, top_label):
+        """Turns the model's top label for a post into its classification."""
         # If classified as testimony but regex does NOT match, mark it as uncertain
         if top_label == "testimony":
             return "uncertain testimony"
 
         return top_label
 
-    def log_false_positives(self, text, classification, url=None):
-        """Log false positives for further analysis."""
-        with open("false_positive_log.txt", "a", encoding="utf-8") as f:
-            f.write(f"Classified as: {classification} | Text: {text[:200]} | URL: {url if url else 'No URL'}\n")
-
-    def classify_comment(self, text, parent_post_text=None):
-        """Classifies a Reddit comment based on explicit or implicit mention of the author's EMDR experience."""
+    def _label_comment(self, text, top_label, from_model=True):
+        """Turns the model's (unless `from_model`: the cascade's) top label for a comment into its classification."""
         text_lower = text.lower()
 
-        undecided_or_third_party_regex = re.compile(
-            r"\b(thinking about EMDR|considering EMDR|scared to try EMDR|not sure if I will do EMDR|"
-            r"haven’t started EMDR|was recommended EMDR|was supposed to do EMDR but|"
-            r"was told EMDR wouldn’t work for me|my therapist denied me EMDR|"
-            r"never actually started EMDR|my friend did EMDR|someone I know did EMDR|"
-            r"I plan to do EMDR|I'm waiting to try EMDR|I might do EMDR in the future|"
-            r"I'm preparing for EMDR|I decided not to do EMDR)\b"
-            r"\b(too unwell for EMDR|not ready for EMDR|therapist refused EMDR|"
-            r"not stable enough for EMDR|my therapist denied me EMDR)\b"
-            r"\b(denied EMDR|refused EMDR|not allowed to do EMDR|was not approved for EMDR|"
-            r"not stable enough for EMDR|told I can't do EMDR|not a candidate for EMDR)\b"
-            r"\b(planning to do EMDR|thinking about trying EMDR|considering EMDR|scared to try EMDR|"
-            r"haven’t started EMDR yet|waiting to start EMDR|preparing for EMDR"
-            r"couldn't start EMDR|my therapist stopped EMDR before it started|"
-            r"EMDR was not an option for me)\b"
-            r"\b(scared to try EMDR|not sure about EMDR|not everyone is a candidate for EMDR|"
-            r"thinking about doing EMDR|wondering if EMDR is right for me|"
-            r"glad I was refused EMDR|I may try EMDR one day)\b"
-
-            ,
-            re.IGNORECASE
-        )
-
-        congratulatory_regex = re.compile(
-            r"\b(congratulations|so happy for you|proud of you|great job|you’re amazing|well done|"
-            r"thank you for sharing|that’s inspiring|sending good vibes|wishing you well|"
-            r"happy to hear this|that’s wonderful news|good to know|best of luck)\b"
-            r"best of luck|gives me hope|brilliant! enjoy your freedom|"
-            r"glad to hear this|cheers to your recovery|"
-            r"\b(best wishes on your journey|you're strong)\b"
-            ,
-
-            re.IGNORECASE
-        )
-
-        other_therapy_regex = re.compile(
-            r"\b(DBT|CBT|ART|IFS|somatic therapy|talk therapy|exposure therapy)\b",
-            re.IGNORECASE
-        )
-        if undecided_or_third_party_regex.search(text_lower):
-            return "indirect_reference"
-
-        if congratulatory_regex.search(text_lower):
-            return "congratulatory_message"
-
-
-
-        result = self.classifier(text, candidate_labels=self.labels)
-        top_label = result['labels'][0]
-
-        first_hand_experience_regex = re.compile(
-            r"\b(I|my|me).*?(tried|started|completed|did|went through|had).*?EMDR\b",
-            re.IGNORECASE
-        )
-
-        has_personal_experience = first_hand_experience_regex.search(text_lower) is not None
-        if other_therapy_regex.search(text_lower) and not first_hand_experience_regex.search(text_lower):
+        has_personal_experience = rules.FIRST_HAND_COMMENT.search(text_lower) is not None
+        if not has_personal_experience and rules.OTHER_THERAPY.search(text_lower):
             return "generic_therapy_discussion"
 
         if has_personal_experience:
             return "personal experience"
 
         if top_label in ["testimony", "opinion"] and not has_personal_experience:
-            self.log_false_positives(text, top_label)
+            # Marked so that cascade.py doesn't train on the cascade's own labels
+            self.log_false_positives(text, top_label if from_model else f"{top_label} (cascade)")
 
         return top_label
 
+    def log_false_positives(self, text, classification, url=None):
+        """Log false positives for further analysis."""
+        self.metrics.count("false_positives")
+        line = f"Classified as: {classification} | Text: {text[:200]} | URL: {url if url else 'No URL'}\n"
+        if self.writer is not None:
+            self.writer.write(FALSE_POSITIVE_LOG, line)
+            return
+        with open(FALSE_POSITIVE_LOG, "a", encoding="utf-8") as f:
+            f.write(line)
 
     def is_related_to_emdr(self, text):
         """Checks if the text is related to EMDR even if 'EMDR' is not explicitly mentioned."""
@@ -170,126 +345,380 @@ class TextClassifier:
 class RedditExperienceScraper:
     """Manages scraping, filtering, and saving Reddit posts and comments."""
 
-    def __init__(self, client_id, client_secret, user_agent, save_every=5):
-        """Initialize the scraper with Reddit API and text classifier."""
-        self.reddit_api = RedditAPI(client_id, client_secret, user_agent)
-        self.text_classifier = TextClassifier()
-        self.subreddit = "PTSD"
-        self.data = []
-        self.denied_data = []  # ✅ Store rejected posts/comments
+    def __init__(self, client_id, client_secret, user_agent, save_every=5, batch_size=8,
+                 checkpoint_dir="checkpoints", reddit=None, text_classifier=None, subreddit="PTSD",
+                 approved_file="approved_reddit_emdr_experiences.csv", rate_limiter=None, inference_socket=None,
+                 backend="fp32", cascade_model=None, denied_file="denied_reddit_emdr_experiences.csv", max_tokens=None,
+                 metrics=None, dedup=True, flush_interval=2.0, model_labels_file="model_labels.csv"):
+        """
+        Initialize the scraper with Reddit API and text classifier.
+        `inference_socket` sends model inference to a shared inference worker (see inference_server.py),
+        `backend` selects the CPU inference backend otherwise (see zero_shot.py).
+        `cascade_model` puts a cheap classifier in front of the model (see cascade.py), which can be trained from
+        `model_labels_file`: the model's own top label of each text it classified (None disables it).
+        `max_tokens` classifies long texts in chunks of that many tokens (see chunking.py).
+        Stage timings and counters of the scraper and its classifier go to `metrics`.
+        Boilerplate blocks are stripped from every text before classification and, with `dedup`, texts repeating
+        one this scraper has already seen are dropped (see preprocess.py).
+        The output files and the false positive log are appended to by one background writer thread
+        (see writer.py), writing every `save_every` entries or `flush_interval` seconds.
+        """
+        self.metrics = metrics or getattr(text_classifier, "metrics", None) or Metrics()
+        self.reddit_api = RedditAPI(client_id, client_secret, user_agent, reddit=reddit, rate_limiter=rate_limiter,
+                                    metrics=self.metrics)
+        self.text_classifier = text_classifier or TextClassifier(batch_size=batch_size,
+                                                                 inference_socket=inference_socket, backend=backend,
+                                                                 cascade_model=cascade_model, max_tokens=max_tokens)
+        self.text_classifier.metrics = self.metrics
+        self.writer = BackgroundWriter(batch_size=save_every, flush_interval=flush_interval, metrics=self.metrics)
+        self.text_classifier.writer = self.writer
+        self.writer.register(FALSE_POSITIVE_LOG)
+        self.preprocessor = Preprocessor(dedup=dedup, metrics=self.metrics)
+        self.subreddit = subreddit
         self.save_every = save_every
+        self.approved_file = approved_file
+        self.denied_file = denied_file
+        self.model_labels_file = model_labels_file
+        # Run state of each search, saved after every committed page (None disables it)
+        self.checkpoints = CheckpointStore(checkpoint_dir) if checkpoint_dir else None
+
+    def output_sinks(self):
+        """
+        The sinks writing the approved entries to `approved_file`, the denied ones to `denied_file` and the model
+        labels of both to `model_labels_file`.
+        """
+        sinks = [CsvSink(self.approved_file, APPROVED_COLUMNS, header=False, writer=self.writer,
+                         where=is_approved, metrics=self.metrics, counter="approved_written")]
+        if self.denied_file:
+            sinks.append(CsvSink(self.denied_file, DENIED_COLUMNS, header=False, writer=self.writer,
+                                 where=lambda entry: not is_approved(entry), metrics=self.metrics,
+                                 counter="denied_written"))
+        # Training data for the cascade, see cascade.py
+        if self.model_labels_file:
+            sinks.append(CsvSink(self.model_labels_file, MODEL_LABEL_COLUMNS, writer=self.writer,
+                                 where=has_model_label))
+        return sinks
+
+    def output_files(self):
+        """The files `output_sinks` append to, whose sizes are checkpointed."""
+        return [path for path in (self.approved_file, self.denied_file, self.model_labels_file) if path]
 
     def get_comments(self, post, post_is_emdr_experience, post_is_question):
-        """Extracts and filters relevant comments from a Reddit post."""
-        post_text = f"{post.title} {post.selftext}"  # Parent post content
-
-        post.comments.replace_more(limit=0)
-
-        for comment in post.comments.list():
-            text = comment.body.lower().strip()
-
-            # Exclude deleted/removed comments
-            if "[deleted]" in text or "[removed]" in text:
-                continue
-
-            # Classify the comment, passing parent post text
-            classification = self.text_classifier.classify_comment(comment.body, parent_post_text=post_text)
-
-            # ✅ Store approved comments
+        """Extracts and filters relevant comments from a Reddit post, appending them to the output files."""
+        comments, texts, keys = self._preprocess_comments(self._fetch_comments(post))
+        comments, texts = self._new_comments(comments, texts, keys)
+
+        # Classify the whole thread in one batched call
+        classifications = self.text_classifier.classify_with_model_labels(texts, kind="comment")
+        consume(self._comment_entries(post, comments, classifications, texts), *self.output_sinks())
+        self.writer.close()
+        # Committed like a page, or the next search's rollback would drop these rows
+        if self.checkpoints:
+            self.checkpoints.commit_files(file_sizes(*self.output_files()))
+
+    def _fetch_comments(self, post, since=None):
+        """
+        Expands a post's comment tree and returns its comments, without the deleted/removed ones
+        (and, with `since`, only the ones created after it).
+        """
+        submission = self.reddit_api.clients.submission(post)
+
+        def expand():
+            submission.comments.replace_more(limit=0)
+            return submission.comments.list()
+
+        comments = []
+        with self.metrics.timer("replace_more", items=lambda: len(comments)):
+            comments = self.reddit_api.with_retry(expand)
+        # Exclude deleted/removed comments
+        return [comment for comment in comments
+                if "[deleted]" not in comment.body.lower() and "[removed]" not in comment.body.lower()
+                and (since is None or comment.created_utc > since)]
+
+    def _preprocess_comments(self, comments):
+        """
+        Strips boilerplate from the comments and drops the empty ones. Returns the kept comments, their cleaned
+        texts and their Preprocessor keys, for `_new_comments` to drop the duplicates in order.
+        """
+        with self.metrics.timer("preprocess", items=len(comments)):
+            prepared = [(comment, *self.preprocessor.prepare(comment.body)) for comment in comments]
+        kept = [(comment, text, key) for comment, text, drop_reason, key in prepared if drop_reason is None]
+        return [comment for comment, _, _ in kept], [text for _, text, _ in kept], [key for _, _, key in kept]
+
+    def _new_comments(self, comments, values, keys):
+        """
+        Drops the comments repeating a text seen before, with their `values` (texts or classifications).
+        Called in search order, so the copy that is kept doesn't depend on thread timing.
+        """
+        kept = [i for i, key in enumerate(keys) if self.preprocessor.decide(key) is None]
+        return [comments[i] for i in kept], [values[i] for i in kept]
+
+    def _comment_entries(self, post, comments, classifications, texts=None):
+        """
+        Returns the approved or denied entries of comments, from their (label, model label) `classifications`
+        (as their cleaned `texts` when given).
+        """
+        texts = texts or [comment.body for comment in comments]
+        entries = []
+        for (classification, model_label), text in zip(classifications, texts):
+            # ✅ Approved comments
             if classification in ['personal experience', 'testimony']:
-                entry = ["(From Question)", "(No Post Saved)", "testimony", comment.body, post.url, post.created_utc]
-                while len(entry) < 6:
-                    entry.append("N/A")  # Add missing values
-                self.data.append(entry)
+                entries.append(approved_entry("(From Question)", "(No Post Saved)", "testimony", text, post.url,
+                                              post.created_utc, model_label, text))
 
-            # ❌ Store denied comments
+            # ❌ Denied comments
             else:
-                entry = ["Comment", classification, comment.body, post.url, post.created_utc]
-                self.denied_data.append(entry)
-
-            self.check_and_save()
-
-    def check_and_save(self):
-        """Checks if we have at least `save_every` entries and saves both approved & denied entries."""
-        if len(self.data) >= self.save_every or len(self.denied_data) >= self.save_every:
-            print(f"💾 Saving approved: {len(self.data)} | denied: {len(self.denied_data)}")
-            self.save_to_csv()
-            self.data.clear()
-            self.denied_data.clear()
-
-    def scrape_and_filter_posts(self, search_term="EMDR", limit=50, time_filter='year'):
-        """Searches r/PTSD for EMDR-related posts and filters them based on criteria."""
-        print(f"🔍 Searching r/PTSD for posts containing '{search_term}'...")
-
-        after = None
-
-        while len(self.data) < limit:
-            search_results = self.reddit_api.search_subreddit(self.subreddit, search_term, limit=limit,
-                                                              time_filter=time_filter, after=after)
-
-            for post in search_results:
-                post_text = f"{post.title} {post.selftext}"
-
-                # ✅ Ensure the post is about EMDR
-                if not self.text_classifier.is_related_to_emdr(post_text):
-                    self.denied_data.append(["Post", "Not Related", post.title, post.url, post.created_utc])
+                entries.append(denied_entry("Comment", classification, text, post.url, post.created_utc,
+                                            model_label, text))
+        return entries
+
+    def scrape_and_filter_posts(self, search_term="EMDR", limit=50, time_filter='year', sinks=None, **options):
+        """
+        Runs `iter_entries` to the end (see it for the options), appending the approved entries to `approved_file`
+        and the denied ones to `denied_file`, or writing them to `sinks` instead (see sinks.py).
+        Returns the number of entries written.
+        """
+        sinks = self.output_sinks() if sinks is None else sinks
+        return consume(self.iter_entries(search_term, limit, time_filter, sinks=sinks, **options))
+
+    def iter_entries(self, search_term="EMDR", limit=50, time_filter='year', sinks=(),
+                     fetch_workers=2, classify_workers=1, queue_size=16, metrics_file=None,
+                     metrics_interval=None, incremental=False, recheck_window=2 * 24 * 3600):
+        """
+        Searches the subreddit for EMDR-related posts and filters them based on criteria, yielding the approved
+        and denied entries as they are classified: dicts of the APPROVED_COLUMNS or DENIED_COLUMNS of cascade.py,
+        with `approved` telling which. Nothing is kept once an entry has been yielded and written to the `sinks`
+        accepting it, so memory doesn't grow with `limit`.
+
+        Runs as a pipeline: a search pager feeds `classify_workers` post-classification threads,
+        `fetch_workers` comment-fetching threads for approved posts, `classify_workers` comment-classification
+        threads, and the generator itself yields the entries in search order. `queue_size` bounds every queue
+        between them.
+
+        The sinks are flushed at the end of each search page, then the cursor is checkpointed, so a restarted run
+        continues after the last saved page without writing its rows twice (the rows of `approved_file` and
+        `denied_file` appended after it are rolled back). They are closed when the generator ends.
+
+        Stage timings and counters go to `self.metrics`; their snapshot is written to `metrics_file` (JSON, or
+        Prometheus text for .prom) at the end of the run and every `metrics_interval` seconds if set.
+
+        With `incremental`, the search is sorted by new and stops at the watermark of the last complete run
+        (see checkpoint.Watermark): only newer posts are classified, and the approved posts of the last
+        `recheck_window` seconds whose comment count grew have their new comments classified. Its cursor is
+        checkpointed too, along with the progress of the watermark: an interrupted or limited incremental run is
+        resumed after its last committed post, and the watermark moves once a crawl reaches it.
+        """
+        if incremental and not self.checkpoints:
+            raise ValueError("Incremental mode keeps its watermark under checkpoint_dir")
+        print(f"🔍 Searching r/{self.subreddit} for posts containing '{search_term}'...")
+
+        # Resume after the last committed page, dropping rows a crashed run appended after it.
+        # An incremental crawl has its own cursor, whatever the time filter.
+        state = {"after": None, "fetched_posts": 0, "retained": 0, "last_seen_utc": None}
+        checkpoint_key = (self.subreddit, search_term, "incremental" if incremental else time_filter)
+        if self.checkpoints:
+            state = self.checkpoints.load(*checkpoint_key)
+            self.checkpoints.rollback(state["file_sizes"])
+            if state["after"]:
+                print(f"⏩ Resuming r/{self.subreddit} '{search_term}' after {state['after']}")
+
+        approved = [0]  # Entries approved during this run
+        retained_before = state["retained"]
+        # Only approved posts have their comments classified, so only they are watched for new comments
+        watermark = Watermark(self.checkpoints, self.subreddit, search_term, recheck_window) if incremental else None
+        if watermark is not None and state["after"] and state.get("watermark"):
+            watermark.resume(state["watermark"])
+        rechecks = {}  # Post id -> time after which its comments are new, for the active posts re-checked
+        # Post id -> (Preprocessor key, zero-shot top label, text) of the post, until its entry is made
+        prepared_posts = {}
+        crawl = {"complete": False, "limited": False}
+
+        def search_pages():
+            """Pipeline source: pages through the search results, with a Marker after each page."""
+            after = state["after"]
+            fetched_posts = state["fetched_posts"]
+            while True:
+                search_results = []
+                with self.metrics.timer("search", items=lambda: len(search_results)):
+                    search_results = self.reddit_api.with_retry(lambda: list(self.reddit_api.search_subreddit(
+                        self.subreddit, search_term, limit=limit, time_filter=time_filter, after=after,
+                        sort="new" if incremental else "relevance"
+                    )))
+                self.metrics.count("posts_fetched", len(search_results))
+                if not search_results:
+                    # Everything was paged through: the next run starts from the top again
+                    crawl["complete"] = True
+                    yield Marker(after=None, fetched_posts=fetched_posts, last_seen_utc=None)
+                    return
+
+                reached_watermark = False
+                for post in search_results:
+                    if watermark is not None:
+                        status = watermark.status(post)
+                        if status == Watermark.PAST:
+                            reached_watermark = True
+                            break
+                        watermark.seen(post, track=False)
+                        if status == Watermark.UNCHANGED:
+                            self.metrics.count("unchanged_posts")
+                            continue
+                        if status == Watermark.RECHECK:
+                            rechecks[post.id] = watermark.since
+                            self.metrics.count("rechecked_posts")
+                    yield post
+
+                after = search_results[-1].fullname
+                fetched_posts += len(search_results)
+                yield Marker(after=after, fetched_posts=fetched_posts,
+                             last_seen_utc=max(post.created_utc for post in search_results))
+                if reached_watermark:
+                    print(f"🏁 Reached the watermark of r/{self.subreddit} '{search_term}'. Stopping.")
+                    crawl["complete"] = True
+                    return
+
+        def commit(after, fetched_posts=None, last_seen_utc=None):
+            """Flushes the page's entries, then checkpoints the cursor that follows them."""
+            for sink in sinks:
+                sink.flush()
+            if self.checkpoints:
+                state["after"] = after
+                state["retained"] = retained_before + approved[0]
+                if fetched_posts is not None:
+                    state["fetched_posts"] = fetched_posts
+                if last_seen_utc is not None:
+                    state["last_seen_utc"] = max(state["last_seen_utc"] or 0, last_seen_utc)
+                state["file_sizes"] = file_sizes(*self.output_files())
+                if watermark is not None:
+                    state["watermark"] = watermark.progress()
+                self.checkpoints.save(*checkpoint_key, state)
+
+        def classify_post(post):
+            """
+            Pipeline stage (CPU): classifies the post, or marks it as boilerplate or not related to EMDR (duplicates
+            are only dropped by `entries_of`, in search order).
+            An approved post re-checked for new comments was classified by an earlier run and is marked "recheck".
+            """
+            if post.id in rechecks:
+                return post, "recheck"
+            with self.metrics.timer("preprocess"):
+                post_text, drop_reason, key = self.preprocessor.prepare(f"{post.title} {post.selftext}")
+            if drop_reason:
+                return post, drop_reason
+
+            # ✅ Ensure the post is about EMDR
+            if not self.text_classifier.is_related_to_emdr(post_text):
+                prepared_posts[post.id] = (key, None, None)
+                return post, "Not Related"
+            (classification, model_label), = self.text_classifier.classify_with_model_labels([post_text], kind="post")
+            prepared_posts[post.id] = (key, model_label, post_text)
+            return post, classification
+
+        def fetch_comments(classified):
+            """Pipeline stage (network): fetches the comments of posts that are a personal EMDR experience."""
+            post, classification = classified
+            if classification in ["personal experience", "testimony"]:
+                return post, classification, self._fetch_comments(post)
+            if classification == "recheck":
+                return post, classification, self._fetch_comments(post, since=rechecks[post.id])
+            return post, classification, []
+
+        def classify_comments(fetched):
+            """Pipeline stage (CPU): classifies a post's comments in one batched call."""
+            post, classification, comments = fetched
+            comments, texts, keys = self._preprocess_comments(comments)
+            classifications = self.text_classifier.classify_with_model_labels(texts, kind="comment")
+            return post, classification, comments, list(zip(classifications, texts)), keys
+
+        def entries_of(classified):
+            """Returns the approved and denied entries of a classified post, without the repeated texts."""
+            post, classification, comments, comment_results, keys = classified
+            key, model_label, model_text = prepared_posts.pop(post.id, (None, None, None))
+            duplicate = self.preprocessor.decide(key)
+            if duplicate:
+                classification = duplicate
+            else:
+                comments, comment_results = self._new_comments(comments, comment_results, keys)
+            comment_classifications = [result for result, _ in comment_results]
+            comment_texts = [text for _, text in comment_results]
+
+            # ✅ Post and comments if it's a personal EMDR experience
+            if classification in ["personal experience", "testimony"]:
+                entries = self._comment_entries(post, comments, comment_classifications, comment_texts)
+                body = strip_boilerplate(post.selftext)[0]
+                entries.append(approved_entry(post.title, body, classification, "(No Comments)", post.url,
+                                              post.created_utc, model_label, model_text))
+                if watermark is not None:
+                    watermark.track(post)
+
+            # 🔁 The new comments of a re-checked post, whose own row was written by an earlier run
+            elif classification == "recheck":
+                entries = self._comment_entries(post, comments, comment_classifications, comment_texts)
+                watermark.track(post)
+
+            # ❌ Denied post
+            else:
+                entries = [denied_entry("Post", classification, post.title, post.url, post.created_utc,
+                                        model_label, model_text)]
+            return entries
+
+        # Classifier and rate limiter state go into the same snapshots as the stage timings
+        if self.text_classifier.cache is not None:
+            self.metrics.gauge_source("cache", self.text_classifier.cache.stats)
+        if self.text_classifier.chunk_stats is not None:
+            self.metrics.gauge_source("chunking", self.text_classifier.chunk_stats.stats)
+        if self.text_classifier.cascade is not None:
+            self.metrics.gauge_source("cascade", self.text_classifier.cascade.stats)
+        self.metrics.gauge_source("rate_limiter", self.reddit_api.rate_limiter.stats)
+        if metrics_file and metrics_interval:
+            self.metrics.start_exporter(metrics_file, metrics_interval)
+
+        results = Pipeline(
+            search_pages(),
+            [Stage("classify_post", classify_post, workers=classify_workers),
+             Stage("fetch_comments", fetch_comments, workers=fetch_workers),
+             Stage("classify_comments", classify_comments, workers=classify_workers)],
+            queue_size=queue_size
+        ).stream()
+        denied = 0
+        try:
+            for classified in results:
+                if isinstance(classified, Marker):
+                    commit(classified.after, classified.fetched_posts, classified.last_seen_utc)
                     continue
 
-                classification = self.text_classifier.classify_post(post_text)
-
-                post_is_emdr_experience = classification in ["personal experience", "testimony"]
-                post_is_question = classification == "question"
-
-                # ✅ Store post if it's a personal EMDR experience
-                if post_is_emdr_experience:
-                    self.get_comments(post, post_is_emdr_experience, post_is_question)  # Pass to get_comments
-
-                    entry = [post.title, post.selftext, classification, "(No Comments)", post.url, post.created_utc]
-                    self.data.append(entry)
-
-
-                # ❌ Store denied post
-                else:
-                    self.denied_data.append(["Post", classification, post.title, post.url, post.created_utc])
-
-                self.check_and_save()
+                for entry in entries_of(classified):
+                    if entry["approved"]:
+                        approved[0] += 1
+                    else:
+                        denied += 1
+                    for sink in sinks:
+                        if sink.accepts(entry):
+                            sink.write(entry)
+                    yield entry
+                self.metrics.count("posts_processed")
+
+                if approved[0] >= limit:
+                    # Stopping mid-page: a listing can resume after any post, so checkpoint right after this one
+                    post = classified[0]
+                    print(f"🎉 Final save complete! Approved: {approved[0]}, Denied: {denied}")
+                    commit(post.fullname)
+                    crawl["limited"] = True
+                    break
+            results.close()  # Stops the pipeline if we had enough
+
+            # The watermark only moves once the crawl went all the way down to it, otherwise the posts left
+            # between the two would be skipped by the next run
+            if watermark is not None and crawl["complete"] and not crawl["limited"]:
+                watermark.save()
+                # The next crawl starts from the newest post again
+                state.update(after=None, watermark=None)
+                self.checkpoints.save(*checkpoint_key, state)
+        finally:
+            # Also reached when the caller stops reading early: the entries written since the last checkpoint
+            # are rolled back by the next run
+            results.close()
+            for sink in sinks:
+                sink.close()
+            self.writer.close()  # Syncs the output files to disk
+            self.metrics.finish(metrics_file)
 
-            after = post.fullname if post else None
-            time.sleep(2)
-
-        # ✅ Final save for remaining data
-        if self.data or self.denied_data:
-            print(f"🎉 Final save complete! Approved: {len(self.data)}, Denied: {len(self.denied_data)}")
-            self.save_to_csv()
-
-
-    import os
-
-    def save_to_csv(self):
-        """Save both approved & denied entries to separate CSV files, appending to existing files."""
-
-        print(
-            f"✅ Checking Data Structure: Expected 6 columns, but found {[len(row) for row in self.data]}")  # Debugging step
-
-        # Ensure every row has exactly 6 elements before saving
-        cleaned_data = []
-        for row in self.data:
-            if len(row) < 6:
-                print("⚠️ Fixing Row with Incorrect Length:", row)
-                while len(row) < 6:
-                    row.append("N/A")  # Fill missing fields
-            elif len(row) > 6:
-                print("⚠️ Removing Extra Columns from Row:", row)
-                row = row[:6]  # Trim extra columns
-            cleaned_data.append(row)
-
-        # ✅ Save Approved Entries
-        if cleaned_data:
-            filename_approved = "approved_reddit_emdr_experiences.csv"
-            try:
-                df_approved = pd.DataFrame(cleaned_data,
-                                           columns=["Title", "Body", "Classification", "Comments", "URL", "Timestamp"])
-                df_approved.to_csv(filename_approved, mode='a', header=False, index=False, encoding="utf-8")
-                print(f"✅ Appended {len(df_approved)} approved entries to {filename_approved}")
-            except ValueError as e:
-                print("❌ DataFrame Creation Error:", e)
@@ -0,0 +1,228 @@
+"""
+Long-lived local inference worker: keeps the zero-shot pipeline loaded and serves it over a Unix socket, so several
+scraper processes, or runs started one after the other, share one warm model instead of each loading its own.
+
+    python inference_server.py --socket /tmp/ptsd_inference.sock --backend int8
+    classifier = TextClassifier(inference_socket="/tmp/ptsd_inference.sock")
+
+Messages in both directions are JSON objects prefixed with their length (4 bytes, big-endian):
+a request is {"texts": [...], "candidate_labels": [...], "batch_size": n}, the reply {"results": [...]} with one
+pipeline result per text, or {"error": "..."}.
+"""
+import argparse
+import json
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+from zero_shot import BACKENDS, DEFAULT_MODEL
+
+DEFAULT_SOCKET = "/tmp/ptsd_inference.sock"
+
+_HEADER = struct.Struct(">I")
+
+
+def send_message(sock, message):
+    payload = json.dumps(message).encode("utf-8")
+    sock.sendall(_HEADER.pack(len(payload)) + payload)
+
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Inference socket closed mid-message")
+        data.extend(chunk)
+    return bytes(data)
+
+
+def recv_message(sock):
+    """Returns the next message on `sock`, or None when the other side closed the connection between messages."""
+    header = sock.recv(_HEADER.size, socket.MSG_WAITALL)
+    if not header:
+        return None
+    if len(header) < _HEADER.size:
+        header += _recv_exactly(sock, _HEADER.size - len(header))
+    (size,) = _HEADER.unpack(header)
+    return json.loads(_recv_exactly(sock, size).decode("utf-8"))
+
+
+class RemoteZeroShot:
+    """
+    Client for the inference worker, callable like the zero-shot pipeline: `(texts, candidate_labels, batch_size)`.
+    Each thread gets its own connection, reopened once if the worker restarted in between.
+    """
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=600):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def __call__(self, texts, candidate_labels, batch_size=8):
+        single = isinstance(texts, str)
+        request = {"texts": [texts] if single else list(texts), "candidate_labels": list(candidate_labels),
+                   "batch_size": batch_size}
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                send_message(sock, request)
+                reply = recv_message(sock)
+                if reply is None:
+                    raise ConnectionError("Inference worker closed the connection")
+                break
+            except (ConnectionError, BrokenPipeError):
+                self._disconnect()
+                if attempt:
+                    raise
+        if "error" in reply:
+            raise RuntimeError(f"Inference worker error: {reply['error']}")
+        return reply["results"][0] if single else reply["results"]
+
+    def ping(self):
+        """Returns the worker's status ({"model", "backend", "requests", "texts", "uptime"})."""
+        sock = self._connection()
+        send_message(sock, {"ping": True})
+        return recv_message(sock)
+
+    def close(self):
+        self._disconnect()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                request = recv_message(self.request)
+            except (ConnectionError, ValueError):
+                return
+            if request is None:
+                return
+            send_message(self.request, self.server.answer(request))
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves one zero-shot pipeline to every client connected to `socket_path`.
+    Clients are handled on their own threads; forward passes run one at a time, since torch already uses
+    every core for each of them.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path=DEFAULT_SOCKET, model_name=DEFAULT_MODEL, classifier=None, backend="fp32",
+                 num_threads=None):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)  # Left behind by a worker that didn't shut down cleanly
+        super().__init__(socket_path, _Handler)
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.backend = backend
+        if classifier is None:
+            from zero_shot import load_zero_shot
+            print(f"🧠 Loading {model_name} ({backend})...")
+            classifier = load_zero_shot(model_name, backend, num_threads)
+        self.classifier = classifier
+        self.started = time.time()
+        self.requests = 0
+        self.texts = 0
+        self._model_lock = threading.Lock()
+
+    def answer(self, request):
+        if request.get("ping"):
+            return {"model": self.model_name, "backend": self.backend, "requests": self.requests,
+                    "texts": self.texts, "uptime": time.time() - self.started}
+        try:
+            texts = request["texts"]
+            with self._model_lock:
+                results = self.classifier(texts, candidate_labels=request["candidate_labels"],
+                                          batch_size=request.get("batch_size", 8)) if texts else []
+                self.requests += 1
+                self.texts += len(texts)
+            if isinstance(results, dict):
+                results = [results]
+            return {"results": results}
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def is_running(socket_path=DEFAULT_SOCKET):
+    """Whether an inference worker is accepting connections on `socket_path`."""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+
+
+def ensure_server(socket_path=DEFAULT_SOCKET, model_name=DEFAULT_MODEL, backend="fp32", num_threads=None,
+                  timeout=300):
+    """
+    Starts a detached inference worker on `socket_path` unless one is already running, and waits until it
+    accepts connections. The worker outlives the calling process, so later runs find it warm.
+    """
+    if is_running(socket_path):
+        return
+    print(f"🚀 Starting inference worker on {socket_path}")
+    command = [sys.executable, os.path.abspath(__file__), "--socket", socket_path, "--model", model_name,
+               "--backend", backend]
+    if num_threads:
+        command += ["--threads", str(num_threads)]
+    process = subprocess.Popen(
+        command, stdin=subprocess.DEVNULL, start_new_session=True
+    )
+    deadline = time.monotonic() + timeout
+    while not is_running(socket_path):
+        if process.poll() is not None:
+            raise RuntimeError(f"Inference worker exited with code {process.returncode}")
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Inference worker not ready after {timeout}s")
+        time.sleep(0.5)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the zero-shot classifier over a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--backend", default="fp32", choices=BACKENDS, help="CPU inference backend (see zero_shot.py)")
+    parser.add_argument("--threads", type=int, help="Threads per forward pass (default: every core)")
+    args = parser.parse_args()
+
+    server = InferenceServer(args.socket, args.model, backend=args.backend, num_threads=args.threads)
+    print(f"✅ Inference worker ready on {args.socket}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Parallel (subreddit × therapy) scraping jobs.
+
+Each job runs in its own process and writes to its own output partition, `{output_dir}/{therapy}/{subreddit}...`.
+All processes draw from one AdaptiveRateLimiter hosted by a multiprocessing manager, since Reddit's quota is per
+client id and not per process. The parent prints a combined progress summary as jobs start and finish.
+"""
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import Manager
+from multiprocessing.managers import BaseManager, BaseProxy
+
+from functions import load_api_credentials
+from ratelimit import AdaptiveRateLimiter
+
+SCRAPERS = ("RedditScrapper", "RedditExperienceScraper")
+
+
+class JobSpec:
+    """One search to run: `therapy` in r/`subreddit` with one of the two scrapers."""
+
+    def __init__(self, subreddit, therapy, limit=100, scraper="RedditScrapper", output_dir="output", workers=4,
+                 inference_socket=None, incremental=False):
+        if scraper not in SCRAPERS:
+            raise ValueError(f"Unknown scraper {scraper!r}, expected one of {SCRAPERS}")
+        self.subreddit = subreddit
+        self.therapy = therapy
+        self.limit = limit
+        self.scraper = scraper
+        self.output_dir = output_dir
+        self.workers = workers
+        self.inference_socket = inference_socket  # Shared inference worker for RedditExperienceScraper jobs
+        self.incremental = incremental  # Only crawl what is new since the job's last complete run
+
+    @property
+    def name(self):
+        return f"{self.therapy}@r/{self.subreddit}"
+
+    @property
+    def output_file(self):
+        """The job's output partition."""
+        suffix = ".sqlite" if self.scraper == "RedditScrapper" else "_approved.csv"
+        return os.path.join(self.output_dir, self.therapy.lower(), f"{self.subreddit}{suffix}")
+
+    def __repr__(self):
+        return f"JobSpec({self.name}, limit={self.limit}, scraper={self.scraper})"
+
+
+def sweep(subreddits, therapies, **options):
+    """Returns a JobSpec for every (subreddit, therapy) combination."""
+    return [JobSpec(subreddit, therapy, **options) for therapy in therapies for subreddit in subreddits]
+
+
+class RateLimiterProxy(BaseProxy):
+    """Proxy to the AdaptiveRateLimiter living in the manager process, usable wherever the limiter is."""
+
+    _exposed_ = ("acquire", "update_from_headers", "record_success", "backoff", "stats")
+
+    def acquire(self, tokens=1):
+        return self._callmethod("acquire", (tokens,))
+
+    def update_from_headers(self, headers):
+        # Headers objects don't pickle reliably, a plain dict does
+        return self._callmethod("update_from_headers", ({key.lower(): value for key, value in headers.items()},))
+
+    def record_success(self):
+        return self._callmethod("record_success")
+
+    def backoff(self, retry_after=None):
+        return self._callmethod("backoff", (retry_after,))
+
+    def stats(self):
+        return self._callmethod("stats")
+
+    @property
+    def current_wait(self):
+        return self.stats()["current_wait"]
+
+
+class RateLimiterManager(BaseManager):
+    pass
+
+
+RateLimiterManager.register("AdaptiveRateLimiter", AdaptiveRateLimiter, proxytype=RateLimiterProxy)
+
+
+def run_job(job, rate_limiter, events):
+    """Runs one job in a worker process and returns (job name, records in its partition)."""
+    events.put(("started", job.name, None))
+    start = time.time()
+    os.makedirs(os.path.dirname(job.output_file), exist_ok=True)
+    credentials = load_api_credentials()
+
+    if job.scraper == "RedditScrapper":
+        from functions import RedditScrapper
+        scrapper = RedditScrapper(credentials["client_id"], credentials["client_secret"], credentials["user_agent"],
+                                  rate_limiter=rate_limiter)
+        records = len(scrapper.scrape_and_filter(
+            subreddit_name=job.subreddit, therapy=job.therapy, limit=job.limit, output_file=job.output_file,
+            save_every=50, limit_comment=None, expand_workers=job.workers, incremental=job.incremental
+        ))
+    else:
+        from functions_alternative1 import RedditExperienceScraper
+        scraper = RedditExperienceScraper(credentials["client_id"], credentials["client_secret"],
+                                          credentials["user_agent"], subreddit=job.subreddit,
+                                          approved_file=job.output_file,
+                                          denied_file=job.output_file.replace("_approved.csv", "_denied.csv"),
+                                          model_labels_file=job.output_file.replace("_approved.csv",
+                                                                                    "_model_labels.csv"),
+                                          rate_limiter=rate_limiter,
+                                          inference_socket=job.inference_socket)
+        scraper.scrape_and_filter_posts(search_term=job.therapy, limit=job.limit, fetch_workers=job.workers,
+                                        incremental=job.incremental)
+        records = 0
+        if os.path.exists(job.output_file):
+            with open(job.output_file, encoding="utf-8") as f:
+                records = sum(1 for _ in f)  # The approved CSV has no header row
+
+    events.put(("finished", job.name, {"records": records, "seconds": time.time() - start}))
+    return job.name, records
+
+
+def run_jobs(jobs, processes=4, requests_per_second=100 / 60):
+    """
+    Runs the jobs on `processes` worker processes sharing one rate budget of `requests_per_second`.
+    Returns {job name: records}; failed jobs are reported and left out.
+    RedditExperienceScraper jobs with an `inference_socket` share one inference worker, started here if needed.
+    """
+    for socket_path in {job.inference_socket for job in jobs if job.inference_socket}:
+        from inference_server import ensure_server
+        ensure_server(socket_path)
+
+    results = {}
+    failed = {}
+    running = set()
+    with RateLimiterManager() as limiter_manager, Manager() as manager:
+        rate_limiter = limiter_manager.AdaptiveRateLimiter(rate=requests_per_second)
+        events = manager.Queue()
+
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = {executor.submit(run_job, job, rate_limiter, events): job for job in jobs}
+
+            def summary():
+                limiter = rate_limiter.stats()
+                return (f"📊 {len(results)}/{len(jobs)} done, {len(running)} running, {len(failed)} failed | "
+                        f"{sum(results.values())} records | rate {limiter['rate'] * 60:.0f}/min, "
+                        f"wait {limiter['current_wait']:.1f}s, {limiter['backoffs']} backoffs")
+
+            while any(not future.done() for future in futures) or not events.empty():
+                try:
+                    event, name, details = events.get(timeout=1)
+                except queue.Empty:
+                    for future, job in futures.items():
+                        if future.done() and future.exception() is not None and job.name not in failed:
+                            failed[job.name] = future.exception()
+                            running.discard(job.name)
+                            print(f"❌ {job.name} failed: {failed[job.name]}")
+                            print(summary())
+                    continue
+                if event == "started":
+                    running.add(name)
+                else:
+                    running.discard(name)
+                    results[name] = details["records"]
+                    print(f"✅ {name}: {details['records']} records in {details['seconds']:.0f}s")
+                print(summary())
+
+            for future, job in futures.items():
+                if future.exception() is not None and job.name not in failed:
+                    failed[job.name] = future.exception()
+                    print(f"❌ {job.name} failed: {failed[job.name]}")
+
+        print(summary())
+    return results
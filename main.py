@@ -1,4 +1,7 @@
+import os
+
 from functions import RedditScrapper, load_api_credentials
+from store import SQLiteResultStore
 
 if __name__ == "__main__":
     # Load API credentials
@@ -15,16 +18,28 @@ if __name__ == "__main__":
     subreddit_name = "PTSD"
 
     output_file = f"incremental_{therapy}_results.csv"
+    store_file = f"incremental_{therapy}_results.sqlite"
+
+    # Results are kept in an indexed SQLite store, seeded once from the CSV of earlier runs
+    if not os.path.exists(store_file) and os.path.exists(output_file):
+        store = SQLiteResultStore(store_file)
+        store.import_csv(output_file)
+        store.close()
 
     # Scrape and filter data:
     filtered_data = scrapper.scrape_and_filter(
         subreddit_name=subreddit_name,
         therapy=therapy,
         limit=100,  # Specify the number of rows you want in the final CSV
-        output_file = output_file,
+        output_file = store_file,
         save_every=50,
-        limit_comment=None
+        limit_comment=None,
+        expand_workers=4,  # Threads expanding comment trees while earlier posts are being filtered
+        filter_workers=1,
+        metrics_file=f"metrics_{therapy}.json"  # Stage timings and counters of the run
     )
 
-
-
+    # CSV stays the export format
+    store = SQLiteResultStore(store_file)
+    store.export_csv(output_file)
+    store.close()
@@ -13,7 +13,8 @@ if __name__ == "__main__":
     # Define the subreddits to scrape
     subreddits = ["PTSD", ]
 
-    # Initialize and run the scraper
-    scraper = RedditExperienceScraper(client_id, client_secret, user_agent)
-    scraper.scrape_and_filter_posts(search_term="EMDR", limit=200, time_filter='year')
-    scraper.save_to_csv()
\ No newline at end of file
+    # Initialize and run the scraper on each subreddit
+    for subreddit in subreddits:
+        scraper = RedditExperienceScraper(client_id, client_secret, user_agent, subreddit=subreddit)
+        scraper.scrape_and_filter_posts(search_term="EMDR", limit=200, time_filter='year',
+                                        metrics_file=f"metrics_{subreddit}.json")
@@ -0,0 +1,11 @@
+from jobs import run_jobs, sweep
+
+if __name__ == "__main__":
+    # Every (subreddit × therapy) combination is one job, with its own output partition under output/
+    subreddits = ["PTSD", "CPTSD", "traumatoolbox"]
+    therapies = ["EMDR", "CPT", "prolonged exposure"]
+
+    jobs = sweep(subreddits, therapies, limit=100, scraper="RedditScrapper", output_dir="output")
+
+    # The processes share one rate budget: Reddit's quota is per client id
+    results = run_jobs(jobs, processes=4, requests_per_second=100 / 60)
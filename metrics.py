@@ -0,0 +1,244 @@
+"""
+Run metrics of the scrapers: per-stage timers, counters and gauges, exported as JSON or Prometheus text.
+
+    metrics = Metrics(profile_stage="inference", profile_file="inference.prof")
+    with metrics.timer("search", items=lambda: len(results)): ...
+    metrics.count("posts_fetched", 20)
+    metrics.export("metrics.json")  # or "metrics.prom"
+
+Stages used by the scrapers: `search` (one search page), `replace_more` (expanding one comment tree),
+`regex` (rule filtering), `inference` (zero-shot model batches), `cascade` and `write` (store or CSV writes).
+Latency percentiles are computed over the last `window` timings of each stage.
+"""
+import contextlib
+import cProfile
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from collections import deque
+
+PROMETHEUS_PREFIX = "ptsd_scraper"
+
+
+class StageTimer:
+    """Calls, items and time of one stage, with a window of recent latencies for percentiles."""
+
+    def __init__(self, window):
+        self.calls = 0
+        self.items = 0
+        self.seconds = 0.0
+        self.latencies = deque(maxlen=window)
+
+    def observe(self, seconds, items):
+        self.calls += 1
+        self.items += items
+        self.seconds += seconds
+        self.latencies.append(seconds)
+
+    def percentile(self, q):
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self):
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "seconds": self.seconds,
+            "items_per_sec": self.items / self.seconds if self.seconds else 0.0,
+            "p50_ms": self.percentile(0.50) * 1000,
+            "p95_ms": self.percentile(0.95) * 1000,
+        }
+
+
+class Metrics:
+    """
+    Thread-safe metrics shared by every stage of a run.
+    `profile_stage` runs that stage under cProfile (one profiler per thread, merged into `profile_file` by
+    `dump_profile`) while the other stages run unprofiled.
+    """
+
+    def __init__(self, window=2048, profile_stage=None, profile_file=None):
+        self.window = window
+        self.started = time.time()
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self._gauge_sources = {}  # Prefix -> callable returning a stats dict, read on every snapshot
+        self.profile_stage = profile_stage
+        self.profile_file = profile_file or (f"{profile_stage}.prof" if profile_stage else None)
+        self._profilers = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._exporter = None
+        self._stop_exporter = threading.Event()
+
+    def observe(self, stage, seconds, items=1):
+        with self._lock:
+            if stage not in self.stages:
+                self.stages[stage] = StageTimer(self.window)
+            self.stages[stage].observe(seconds, items)
+
+    @contextlib.contextmanager
+    def timer(self, stage, items=1):
+        """
+        Times the block as one call of `stage` processing `items` items (or a callable returning the count once
+        the block is done, for counts only known afterwards).
+        """
+        profiler = self._profiler() if stage == self.profile_stage else None
+        if profiler is not None:
+            try:
+                profiler.enable()
+            except ValueError:
+                profiler = None  # Python 3.12+ allows one active profiler at a time: this call goes unprofiled
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            self.observe(stage, seconds, items() if callable(items) else items)
+
+    def timed(self, stage, func, items=None):
+        """Wraps `func` so every call is timed as `stage`; `items(result)` gives the items of a call."""
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            self.observe(stage, time.perf_counter() - start, items(result) if items else 1)
+            return result
+        return wrapper
+
+    def _profiler(self):
+        profiler = getattr(self._local, "profiler", None)
+        if profiler is None:
+            profiler = self._local.profiler = cProfile.Profile()
+            with self._lock:
+                self._profilers.append(profiler)
+        return profiler
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def gauges_from(self, prefix, stats):
+        """Records the numeric values of a stats dict (cache, rate limiter...) as `prefix`_ gauges."""
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.gauge(f"{prefix}_{key}", value)
+
+    def gauge_source(self, prefix, stats):
+        """
+        Records the stats dict `stats()` returns as `prefix`_ gauges on every snapshot, so interval exports see
+        state that changes during the run (rate limiter waits, cache hits...).
+        """
+        with self._lock:
+            self._gauge_sources[prefix] = stats
+
+    def snapshot(self):
+        with self._lock:
+            sources = list(self._gauge_sources.items())
+        for prefix, stats in sources:
+            self.gauges_from(prefix, stats())
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "uptime_s": time.time() - self.started,
+                "stages": {stage: timer.snapshot() for stage, timer in self.stages.items()},
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+            }
+
+    def to_prometheus(self):
+        """The snapshot in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        p = PROMETHEUS_PREFIX
+        lines = [f"# TYPE {p}_stage_seconds_total counter", f"# TYPE {p}_stage_calls_total counter",
+                 f"# TYPE {p}_stage_items_total counter", f"# TYPE {p}_stage_latency_seconds summary"]
+        for stage, values in sorted(snapshot["stages"].items()):
+            lines.append(f'{p}_stage_seconds_total{{stage="{stage}"}} {values["seconds"]}')
+            lines.append(f'{p}_stage_calls_total{{stage="{stage}"}} {values["calls"]}')
+            lines.append(f'{p}_stage_items_total{{stage="{stage}"}} {values["items"]}')
+            lines.append(f'{p}_stage_latency_seconds{{stage="{stage}",quantile="0.5"}} {values["p50_ms"] / 1000}')
+            lines.append(f'{p}_stage_latency_seconds{{stage="{stage}",quantile="0.95"}} {values["p95_ms"] / 1000}')
+        for name, value in sorted(snapshot["counters"].items()):
+            lines += [f"# TYPE {p}_{name}_total counter", f"{p}_{name}_total {value}"]
+        for name, value in sorted(snapshot["gauges"].items()):
+            lines += [f"# TYPE {p}_{name} gauge", f"{p}_{name} {value}"]
+        lines.append(f"{p}_uptime_seconds {snapshot['uptime_s']}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        """Atomically writes the snapshot to `path`: Prometheus text for .prom/.txt files, JSON otherwise."""
+        if path.endswith((".prom", ".txt")):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), indent=2)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def start_exporter(self, path, interval=30.0):
+        """Exports the snapshot to `path` every `interval` seconds from a daemon thread, until `stop_exporter`."""
+        if self._exporter is not None:
+            return
+        self._stop_exporter.clear()
+
+        def run():
+            while not self._stop_exporter.wait(interval):
+                self.export(path)
+
+        self._exporter = threading.Thread(target=run, name="metrics-exporter", daemon=True)
+        self._exporter.start()
+
+    def stop_exporter(self):
+        if self._exporter is not None:
+            self._stop_exporter.set()
+            self._exporter.join()
+            self._exporter = None
+
+    def dump_profile(self):
+        """Merges the profiles of the profiled stage into `profile_file`. Returns its path, or None."""
+        with self._lock:
+            profilers = list(self._profilers)
+        if not profilers:
+            return None
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(self.profile_file)
+        return self.profile_file
+
+    def summary(self):
+        """Human-readable summary: one line per stage, then the counters and gauges."""
+        snapshot = self.snapshot()
+        lines = [f"📊 Run metrics ({snapshot['uptime_s']:.1f}s)"]
+        for stage, values in snapshot["stages"].items():
+            lines.append(f"  {stage:<13} {values['calls']:>7} calls {values['items']:>8} items "
+                         f"{values['seconds']:>8.2f}s  {values['items_per_sec']:>9.1f}/s  "
+                         f"p50 {values['p50_ms']:.1f}ms  p95 {values['p95_ms']:.1f}ms")
+        if snapshot["counters"]:
+            lines.append("  " + ", ".join(f"{name}={value}" for name, value in sorted(snapshot["counters"].items())))
+        if snapshot["gauges"]:
+            lines.append("  " + ", ".join(f"{name}={value:.4g}" for name, value in sorted(snapshot["gauges"].items())))
+        return "\n".join(lines)
+
+    def finish(self, path=None):
+        """Ends a run: stops the interval exporter, exports the final snapshot and profile, prints the summary."""
+        self.stop_exporter()
+        if path:
+            self.export(path)
+        profile = self.dump_profile()
+        print(self.summary())
+        if profile:
+            print(f"🔬 Profile of the {self.profile_stage} stage saved to {profile}")
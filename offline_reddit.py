@@ -0,0 +1,197 @@
+"""
+Offline stand-in for the parts of PRAW the scrapers use, serving recorded or synthetic threads from disk.
+
+    reddit = OfflineReddit(load_corpus("corpus.json"), latency=0.05, error_rate=0.01)
+    scrapper = RedditScrapper(None, None, None, reddit=reddit)
+
+Supported: `reddit.subreddit(name).search(query, limit=, time_filter=, params={"after": ...})`,
+`post.comments.replace_more(limit=)`, `post.comments.list()` and the `id`/`fullname`/`title`/`selftext`/`url`/
+`created_utc`/`num_comments` attributes of posts and comments. Every simulated request can wait `latency`
+seconds and fail with a 429 (`prawcore.exceptions.TooManyRequests`) with probability `error_rate`.
+"""
+import json
+import random
+import threading
+import time
+
+import pandas as pd
+import prawcore
+
+
+class _Response:
+    """Just enough of a requests.Response for prawcore's exceptions."""
+
+    def __init__(self, status_code, headers=None, text=""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.text = text
+
+
+class OfflineComment:
+    def __init__(self, id, body, created_utc=0):
+        self.id = id
+        self.fullname = f"t1_{id}"
+        self.body = body
+        self.created_utc = created_utc
+
+
+class OfflineCommentForest:
+    """Comment tree of a post. Its `more` placeholders cost one simulated request each to expand."""
+
+    def __init__(self, reddit, comments, more):
+        self._reddit = reddit
+        self._comments = comments
+        self._more = more
+
+    def replace_more(self, limit=32):
+        """Expands up to `limit` placeholders (all with None, none with 0) and drops the others, like PRAW."""
+        expand = self._more if limit is None else min(limit, self._more)
+        for _ in range(expand):
+            self._reddit.request("replace_more")
+        self._more = 0
+        return []
+
+    def list(self):
+        self._reddit.count_served("comments", len(self._comments))
+        return list(self._comments)
+
+
+class OfflineSubmission:
+    def __init__(self, reddit, data):
+        self.id = data["id"]
+        self.fullname = f"t3_{self.id}"
+        self.title = data.get("title", "")
+        self.selftext = data.get("selftext", "")
+        self.url = data.get("url", f"https://www.reddit.com/comments/{self.id}/")
+        self.created_utc = data.get("created_utc", 0)
+        self._reddit = reddit
+        self._data = data
+        self._comments = None
+
+    @property
+    def num_comments(self):
+        return len(self._data.get("comments", []))
+
+    @property
+    def comments(self):
+        # Like PRAW, the first access to the comments fetches the thread
+        if self._comments is None:
+            self._reddit.request("comments")
+            comments = [OfflineComment(c["id"], c.get("body", ""), c.get("created_utc", self.created_utc))
+                        for c in self._data.get("comments", [])]
+            self._comments = OfflineCommentForest(self._reddit, comments, self._data.get("more", 0))
+        return self._comments
+
+
+class OfflineSubreddit:
+    def __init__(self, reddit, name):
+        self._reddit = reddit
+        self.display_name = name
+
+    def search(self, query, limit=100, time_filter="all", params=None, sort="relevance"):
+        """Pages through the posts containing `query` in their title or text, newest first with sort="new"."""
+        self._reddit.request("search")
+        posts = [post for post in self._reddit.corpus.get(self.display_name.lower(), [])
+                 if query.lower() in f"{post.get('title', '')} {post.get('selftext', '')}".lower()]
+        if sort == "new":
+            posts = sorted(posts, key=lambda post: post.get("created_utc", 0), reverse=True)
+        after = (params or {}).get("after")
+        start = 0
+        if after:
+            fullnames = [f"t3_{post['id']}" for post in posts]
+            start = fullnames.index(after) + 1 if after in fullnames else len(posts)
+        page = posts[start:start + limit]
+        self._reddit.count_served("posts", len(page))
+        return iter([OfflineSubmission(self._reddit, post) for post in page])
+
+
+class OfflineReddit:
+    """
+    Replaces `praw.Reddit`. `corpus` maps subreddit names to lists of post dicts
+    ({"id", "title", "selftext", "created_utc", "comments": [{"id", "body"}], "more": n}).
+    When `rate_limiter` is set, simulated requests draw from it and 429s make it back off, as through
+    ratelimit.RateLimitedRequestor.
+    """
+
+    def __init__(self, corpus, latency=0.0, error_rate=0.0, rate_limiter=None, seed=0):
+        self.corpus = {name.lower(): posts for name, posts in corpus.items()}
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limiter = rate_limiter
+        self.requests = {}  # Simulated requests per kind
+        self.request_time = {}  # Seconds spent in simulated requests per kind
+        self.served = {"posts": 0, "comments": 0}  # Posts returned by searches, comments returned by list()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def subreddit(self, name):
+        return OfflineSubreddit(self, name)
+
+    def count_served(self, kind, n):
+        with self._lock:
+            self.served[kind] += n
+
+    def request(self, kind):
+        """Simulates one API request: rate budget, latency, then maybe a 429."""
+        start = time.perf_counter()
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+            self.request_time[kind] = self.request_time.get(kind, 0.0) + time.perf_counter() - start
+            too_many = self._random.random() < self.error_rate
+        if too_many:
+            if self.rate_limiter is not None and hasattr(self.rate_limiter, "backoff"):
+                self.rate_limiter.backoff()
+            raise prawcore.exceptions.TooManyRequests(_Response(429))
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_corpus(corpus, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(corpus, f)
+
+
+def synthetic_corpus(n_posts, comments_per_post=20, subreddit="PTSD", texts_file="incremental_emdr_results.csv",
+                     seed=0):
+    """
+    Builds a corpus of `n_posts` EMDR threads whose posts and comments reuse the texts of a stored result file,
+    so the filters see realistic content.
+    """
+    rng = random.Random(seed)
+    texts = pd.read_csv(texts_file)["content"].dropna().astype(str).tolist()
+    posts = []
+    for i in range(n_posts):
+        n_comments = rng.randint(0, 2 * comments_per_post)
+        posts.append({
+            "id": f"p{i:06d}",
+            "title": f"EMDR thread {i}",
+            "selftext": rng.choice(texts),
+            "created_utc": 1_700_000_000 - i * 600,
+            "comments": [{"id": f"c{i:06d}_{j}", "body": rng.choice(texts)} for j in range(n_comments)],
+            "more": n_comments // 10,
+        })
+    return {subreddit: posts}
+
+
+def record_corpus(reddit, subreddit_name, query, limit=100, time_filter="year", limit_comment=0):
+    """Records real threads through a praw.Reddit client into a corpus dict that can be saved to disk."""
+    posts = []
+    for post in reddit.subreddit(subreddit_name).search(query, limit=limit, time_filter=time_filter):
+        post.comments.replace_more(limit=limit_comment)
+        posts.append({
+            "id": post.id,
+            "title": post.title,
+            "selftext": post.selftext,
+            "url": post.url,
+            "created_utc": post.created_utc,
+            "comments": [{"id": comment.id, "body": comment.body, "created_utc": comment.created_utc}
+                         for comment in post.comments.list()],
+        })
+    return {subreddit_name: posts}
@@ -0,0 +1,186 @@
+import heapq
+import queue
+import threading
+
+_DONE = object()
+_SKIPPED = object()
+
+
+class Marker:
+    """
+    Source item that skips every stage and reaches the sink in order, e.g. to tell the sink a search page ended.
+    Its keyword arguments become attributes.
+    """
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class Stage:
+    """One step of a Pipeline: `func` is applied to every item by `workers` threads."""
+
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers or 1)
+
+
+class Pipeline:
+    """
+    Runs source → stages → sink with each step in its own threads, connected by bounded queues.
+
+    - `source` is an iterable (typically a generator paging the Reddit search) consumed by one producer thread.
+    - each Stage maps an item to a result with its own worker threads; full queues block the step before them,
+      so a slow classifier holds back the fetchers instead of letting pages pile up in memory.
+    - `sink` is called by a single writer thread with the results in source order, whatever the worker
+      interleaving was. It returns True once it has enough, which stops the pipeline.
+
+    `stream()` runs the same pipeline without a sink and yields the ordered results to the caller instead.
+    """
+
+    def __init__(self, source, stages, sink=None, queue_size=16):
+        self.source = source
+        self.stages = list(stages)
+        self.sink = sink
+        self.queue_size = queue_size
+        self.error = None
+        self._stop = threading.Event()
+        self._error_lock = threading.Lock()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def stop(self):
+        """Asks every step to stop; items still queued are drained without being processed or written."""
+        self._stop.set()
+
+    def _fail(self, exc):
+        with self._error_lock:
+            if self.error is None:
+                self.error = exc
+        self.stop()
+
+    def run(self):
+        """Runs the pipeline until the source is exhausted or the sink asks to stop. Re-raises the first error."""
+        threads, out_queue = self._start()
+        writer = threading.Thread(target=self._write, args=(out_queue,), name="pipeline-sink", daemon=True)
+        writer.start()
+        for thread in threads + [writer]:
+            thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def stream(self):
+        """
+        Runs the pipeline and yields its results in source order, the caller taking the place of the sink.
+        The queues bound how far the stages run ahead of the caller. Closing the generator early stops the
+        pipeline; once the results are exhausted, the first error is re-raised.
+        """
+        threads, out_queue = self._start()
+        finished = False
+        try:
+            for result in self._ordered(out_queue):
+                yield result
+            finished = True
+        finally:
+            if not finished:
+                self.stop()
+                while out_queue.get()[1] is not _DONE:
+                    pass  # Unblocks the stage threads still putting results
+            for thread in threads:
+                thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def _start(self):
+        """Starts the source and stage threads; returns them and the queue of their results."""
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        threads = [threading.Thread(target=self._produce, args=(queues[0],), name="pipeline-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            lock = threading.Lock()
+            for n in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work, args=(stage, queues[index], queues[index + 1], remaining, lock),
+                    name=f"pipeline-{stage.name}-{n}", daemon=True
+                ))
+        for thread in threads:
+            thread.start()
+        return threads, queues[-1]
+
+    def _done_count(self, stage_index):
+        """Number of end markers the step after `stage_index` expects (one per worker, one for the sink)."""
+        return self.stages[stage_index].workers if stage_index < len(self.stages) else 1
+
+    def _produce(self, out_queue):
+        try:
+            for seq, item in enumerate(self.source):
+                if self.stopped:
+                    break
+                out_queue.put((seq, item))
+        except BaseException as exc:
+            self._fail(exc)
+        finally:
+            for _ in range(self._done_count(0)):
+                out_queue.put((None, _DONE))
+
+    def _work(self, stage, in_queue, out_queue, remaining, lock):
+        while True:
+            seq, item = in_queue.get()
+            if item is _DONE:
+                # The last worker of the stage to finish passes the end markers on
+                with lock:
+                    remaining[0] -= 1
+                    last = remaining[0] == 0
+                if last:
+                    for _ in range(self._done_count(self.stages.index(stage) + 1)):
+                        out_queue.put((None, _DONE))
+                return
+
+            result = _SKIPPED
+            if isinstance(item, Marker):
+                result = item
+            elif not self.stopped:
+                try:
+                    result = stage.func(item)
+                except BaseException as exc:  # KeyboardInterrupt/SystemExit too, so no step waits forever
+                    self._fail(exc)
+            out_queue.put((seq, result))
+
+    def _write(self, in_queue):
+        failed = False
+        for result in self._ordered(in_queue):
+            if failed:
+                continue
+            try:
+                if self.sink(result):
+                    self.stop()
+            except BaseException as exc:
+                self._fail(exc)
+                failed = True
+
+    def _ordered(self, in_queue):
+        """Yields the results in source order until the end marker arrives (later ones are drained once stopped)."""
+        pending = []
+        next_seq = 0
+        draining = False
+        while True:
+            seq, result = in_queue.get()
+            if result is _DONE:
+                return
+            heapq.heappush(pending, (seq, result))  # seq is unique, results are never compared
+            # Hand results to the sink strictly in source order
+            while pending and pending[0][0] == next_seq:
+                _, ready = heapq.heappop(pending)
+                next_seq += 1
+                if draining:
+                    continue
+                # After a failure, results completed before it still reach the sink, up to the first item
+                # that wasn't processed; after a regular stop nothing more does
+                if ready is _SKIPPED or (self.stopped and self.error is None):
+                    draining = True
+                    continue
+                yield ready
@@ -0,0 +1,203 @@
+"""
+Text preprocessing run before the regex and model stages: strips bot and boilerplate blocks, then drops texts
+that are exact or near copies of a text already seen in the run.
+
+Near duplicates are found with MinHash signatures over word shingles and locality-sensitive hashing (LSH):
+texts sharing a band of their signature become candidates, and a candidate is a duplicate when the estimated
+Jaccard similarity of the two shingle sets reaches `threshold`.
+Both indexes remember the last `max_texts` texts, so a long run's memory stays bounded.
+
+Pipeline workers only `prepare` texts (cleaning, hash and signature), and the ordered consumer of the pipeline
+`decide`s which copies to keep, so the first copy in search order is kept whatever the thread timing.
+"""
+import hashlib
+import re
+import threading
+import zlib
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from cache import normalize_text
+from rules import AUTOMATED_RESPONSE_PREFIX
+
+# Known bot and boilerplate blocks, removed wherever they appear in a text
+BOILERPLATE_BLOCKS = [
+    # r/ptsd automated response appended to every post, from its header to the bot footer
+    re.compile(r"\*?" + re.escape(AUTOMATED_RESPONSE_PREFIX) + r"\*?.*?"
+               r"(?:if you have any questions or concerns\.\*?|\Z)", re.IGNORECASE | re.DOTALL),
+    # AutoModerator footer
+    re.compile(r"\*?I am a bot, and this action was performed automatically\..*?"
+               r"(?:if you have any questions or concerns\.\*?|$)", re.IGNORECASE | re.MULTILINE),
+    # Placeholders of deleted and removed texts
+    re.compile(r"^\s*\[(?:deleted|removed)\]\s*$", re.IGNORECASE | re.MULTILINE),
+]
+
+_BLANK_LINES = re.compile(r"\n\s*\n\s*\n+")
+_TOKEN = re.compile(r"\w+")
+
+
+def strip_boilerplate(text):
+    """Returns the text without its boilerplate blocks (possibly empty), and the number of blocks removed."""
+    removed = 0
+    for block in BOILERPLATE_BLOCKS:
+        text, n = block.subn("", text)
+        removed += n
+    if removed:
+        text = _BLANK_LINES.sub("\n\n", text)
+    return text.strip(), removed
+
+
+class NearDuplicateIndex:
+    """
+    MinHash/LSH index of the last `max_texts` texts added (all of them with None).
+    `num_perm` hash functions are split into `bands` bands; with the defaults (128 permutations, 32 bands of 4),
+    pairs above ~0.4 Jaccard similarity become candidates, then `threshold` decides.
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, bands=32, shingle_size=5, seed=1, max_texts=50_000):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_texts = max_texts
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hash family on 64-bit words: h(x) = (a * x + b) >> 32, a odd
+        self._a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+        self._signatures = {}  # Index -> signature, oldest first
+        self._order = deque()
+        self._next = 0
+        self._buckets = {}
+
+    def signature(self, text):
+        tokens = _TOKEN.findall(text.lower())
+        size = min(self.shingle_size, len(tokens)) or 1
+        shingles = {" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))}
+        hashes = np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype=np.uint64,
+                             count=len(shingles))
+        with np.errstate(over="ignore"):
+            permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) >> np.uint64(32)
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [(band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def find(self, signature):
+        """Returns the index of an added text similar to the signature, or None."""
+        candidates = set()
+        for key in self._band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        for candidate in sorted(candidates):
+            if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return candidate
+        return None
+
+    def add(self, signature):
+        index = self._next
+        self._next += 1
+        self._signatures[index] = signature
+        self._order.append(index)
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, []).append(index)
+        if self.max_texts is not None and len(self._order) > self.max_texts:
+            self._evict(self._order.popleft())
+        return index
+
+    def _evict(self, index):
+        for key in self._band_keys(self._signatures.pop(index)):
+            bucket = self._buckets[key]
+            bucket.remove(index)  # Buckets are in insertion order: it is their first index
+            if not bucket:
+                del self._buckets[key]
+
+    def __len__(self):
+        return len(self._signatures)
+
+
+class Preprocessor:
+    """
+    Cleans texts and suppresses repeats. `process(text)` returns (clean_text, drop_reason) where drop_reason is
+    None for a text to keep, or "boilerplate", "exact_duplicate" or "near_duplicate".
+    It is `prepare` then `decide`, which parallel stages call separately: `prepare` from any thread, `decide` in the
+    order the texts should be kept in.
+    Near-duplicate detection only applies to texts of at least `min_words` words, so that short replies
+    ("Thank you so much!") are compared exactly. Only the last `max_texts` texts are remembered.
+    """
+
+    def __init__(self, dedup=True, near_duplicates=True, threshold=0.85, min_words=10, metrics=None,
+                 max_texts=50_000):
+        self.dedup = dedup
+        self.min_words = min_words
+        self.max_texts = max_texts
+        self.near_duplicates = (NearDuplicateIndex(threshold, max_texts=max_texts) if dedup and near_duplicates
+                                else None)
+        self.metrics = metrics
+        self._hashes = OrderedDict()  # Digests of the texts seen, oldest first
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        if self.metrics is not None:
+            self.metrics.count(name)
+
+    def process(self, text):
+        clean, drop_reason, key = self.prepare(text)
+        return clean, drop_reason or self.decide(key)
+
+    def prepare(self, text):
+        """
+        Cleans a text and computes what `decide` needs, without touching the shared indexes. Returns
+        (clean_text, drop_reason, key): drop_reason is "boilerplate" or None, and key is None when there is
+        nothing to decide (boilerplate, or no `dedup`).
+        """
+        clean, removed = strip_boilerplate(text or "")
+        if removed:
+            self._count("boilerplate_stripped")
+        if not clean:
+            self._count("boilerplate_dropped")
+            return clean, "boilerplate", None
+        if not self.dedup:
+            return clean, None, None
+
+        digest = hashlib.sha1(normalize_text(clean).lower().encode("utf-8")).digest()
+        signature = None
+        if self.near_duplicates is not None and len(_TOKEN.findall(clean)) >= self.min_words:
+            signature = self.near_duplicates.signature(clean)
+        return clean, None, (digest, signature)
+
+    def decide(self, key):
+        """
+        Returns "exact_duplicate" or "near_duplicate" for the prepared text of `key` if it repeats one decided
+        before, None to keep it, and remembers it.
+        """
+        if key is None:
+            return None
+        digest, signature = key
+        with self._lock:
+            if digest in self._hashes:
+                reason = "exact_duplicate"
+            elif signature is not None and self.near_duplicates.find(signature) is not None:
+                reason = "near_duplicate"
+            else:
+                reason = None
+            # A near duplicate is remembered too, so that copies of it are caught exactly
+            self._hashes[digest] = None
+            self._hashes.move_to_end(digest)
+            if self.max_texts is not None and len(self._hashes) > self.max_texts:
+                self._hashes.popitem(last=False)
+            if signature is not None and reason is None:
+                self.near_duplicates.add(signature)
+        if reason:
+            self._count(reason + "s")
+        return reason
+
+    def keep(self, texts):
+        """Processes texts in order; returns the (index, clean_text) of the ones to keep."""
+        kept = []
+        for i, text in enumerate(texts):
+            clean, reason = self.process(text)
+            if reason is None:
+                kept.append((i, clean))
+        return kept
@@ -0,0 +1,196 @@
+import random
+import threading
+import time
+
+import praw
+import prawcore
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests per second on average, with bursts of up to `capacity`.
+    One bucket is shared by every worker talking to the Reddit API so they all draw from the same budget.
+    """
+
+    def __init__(self, rate=1.0, capacity=10):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _wait_time(self, now, tokens):
+        """Seconds to wait at `now` before `tokens` are available. Called with the lock held."""
+        return max(0.0, (tokens - self._tokens) / self.rate)
+
+    def acquire(self, tokens=1):
+        """Blocks until `tokens` are available and takes them. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait_time(now, tokens)
+                if wait <= 0:
+                    self._tokens -= tokens
+                    return waited
+            time.sleep(wait)
+            waited += wait
+
+    @property
+    def current_wait(self):
+        """Seconds a request made now would wait for its token."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return self._wait_time(now, 1)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    Token bucket that paces requests from the rate-limit headers Reddit returns with every response:
+    the requests remaining in the current window are spread evenly over the seconds left before it resets.
+    On a 429 it stops handing out tokens for an exponentially growing, jittered delay (or the server's
+    Retry-After), and goes back to normal after the next successful response.
+    """
+
+    def __init__(self, rate=100 / 60, capacity=10, min_rate=0.05, base_backoff=2.0, max_backoff=300.0):
+        super().__init__(rate=rate, capacity=capacity)
+        self.min_rate = min_rate
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.remaining = None  # Requests left in the current window, as last reported by Reddit
+        self.reset_at = None  # monotonic() time at which the window resets
+        self.backoffs = 0  # 429 responses seen
+        self._consecutive_429 = 0
+        self._blocked_until = 0.0
+
+    def _wait_time(self, now, tokens):
+        return max(self._blocked_until - now, super()._wait_time(now, tokens))
+
+    def update_from_headers(self, headers):
+        """Adjusts the rate to the X-Ratelimit-Remaining / X-Ratelimit-Reset headers of a response."""
+        try:
+            remaining = float(headers["x-ratelimit-remaining"])
+            reset = float(headers["x-ratelimit-reset"])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.remaining = remaining
+            self.reset_at = now + reset
+            if remaining < 1:
+                # Quota used up: nothing until the window resets
+                self._tokens = 0
+                self._blocked_until = max(self._blocked_until, self.reset_at)
+            elif reset > 0:
+                self.rate = max(self.min_rate, remaining / reset)
+            # Never hold more tokens than requests the server still accepts
+            self._tokens = min(self._tokens, remaining)
+
+    def record_success(self):
+        """Ends the backoff after a request went through."""
+        with self._lock:
+            self._consecutive_429 = 0
+
+    def backoff(self, retry_after=None):
+        """
+        Blocks every caller after a 429: for `retry_after` seconds when the server sent it, otherwise for
+        base_backoff * 2^(n-1) seconds (n = consecutive 429s), capped at max_backoff and jittered down
+        to half of it, so parallel workers don't retry in lockstep.
+        Returns the delay.
+        """
+        with self._lock:
+            self.backoffs += 1
+            self._consecutive_429 += 1
+            if retry_after is not None:
+                delay = float(retry_after)
+            else:
+                ceiling = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_429 - 1))
+                delay = random.uniform(ceiling / 2, ceiling)
+            self._tokens = 0
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+            return delay
+
+    def stats(self):
+        """Current limiter state, for progress logs and metrics."""
+        now = time.monotonic()
+        return {
+            "rate": self.rate,
+            "current_wait": self.current_wait,
+            "remaining": self.remaining,
+            "reset_in": max(0.0, self.reset_at - now) if self.reset_at is not None else None,
+            "backoffs": self.backoffs,
+        }
+
+
+class RateLimitedRequestor(prawcore.Requestor):
+    """
+    prawcore requestor that takes a token from a shared bucket before every HTTP request,
+    including the ones `replace_more` issues internally, and feeds the responses back to an AdaptiveRateLimiter.
+    Use it through `praw.Reddit(requestor_class=RateLimitedRequestor, requestor_kwargs={"rate_limiter": bucket})`.
+    """
+
+    def __init__(self, *args, rate_limiter=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def request(self, *args, **kwargs):
+        if self.rate_limiter is None:
+            return super().request(*args, **kwargs)
+
+        self.rate_limiter.acquire()
+        response = super().request(*args, **kwargs)
+        if hasattr(self.rate_limiter, "update_from_headers"):  # AdaptiveRateLimiter, or a proxy to one
+            self.rate_limiter.update_from_headers(response.headers)
+            if response.status_code == 429:
+                self.rate_limiter.backoff(response.headers.get("retry-after"))
+            else:
+                self.rate_limiter.record_success()
+        return response
+
+
+def reddit_client(client_id, client_secret, user_agent, rate_limiter):
+    """Creates a praw.Reddit client whose requests all go through `rate_limiter`."""
+    return praw.Reddit(
+        client_id=client_id,
+        client_secret=client_secret,
+        user_agent=user_agent,
+        requestor_class=RateLimitedRequestor,
+        requestor_kwargs={"rate_limiter": rate_limiter}
+    )
+
+
+class ThreadClients:
+    """
+    One `reddit_client` per thread, all going through the same `rate_limiter`: a praw.Reddit client and the
+    objects it returns are not thread-safe, so the pipeline's worker threads can't share one.
+    An injected `reddit` (e.g. offline_reddit.OfflineReddit) is used by every thread instead.
+    """
+
+    def __init__(self, client_id, client_secret, user_agent, rate_limiter, reddit=None):
+        self.credentials = (client_id, client_secret, user_agent)
+        self.rate_limiter = rate_limiter
+        self.shared = reddit
+        self._local = threading.local()
+
+    def get(self):
+        """The calling thread's client."""
+        if self.shared is not None:
+            return self.shared
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = reddit_client(*self.credentials, self.rate_limiter)
+        return client
+
+    def submission(self, post):
+        """`post` as seen by the calling thread's client, so that fetching its comments doesn't use another's."""
+        if self.shared is not None:
+            return post
+        # Lazy: the submission and its comments come in the one request `post.comments` would make
+        return self.get().submission(id=post.id)
@@ -0,0 +1,213 @@
+"""
+Re-evaluates a stored corpus with the current rules of rules.py and reports which decisions changed, so an edit to
+the exclusion patterns or the TextClassifier regexes can be checked without scraping again.
+
+    python refilter.py incremental_emdr_results.csv                       # RedditScrapper store (.csv or SQLite)
+    python refilter.py approved_reddit_emdr_experiences.csv --kind approved --report approved_diff.csv
+    python refilter.py denied_reddit_emdr_experiences.csv --kind denied --workers 8
+
+The corpus is read in chunks of `chunksize` rows spread over a process pool. Each rule set runs once per chunk as
+a column-wise pandas string match, instead of once per text.
+
+- kind "store": the records of a RedditScrapper result store were all included. They are checked against
+  `rules.evaluate`: a record is newly excluded by the exclusion rule that fires, or by "no_personal_experience".
+- kind "approved" / "denied": the entries of RedditExperienceScraper. Only the regex steps of TextClassifier are
+  re-run: the EMDR keyword check and the post and comment short-circuits. When none of them decides, the model's
+  stored decision stands. A row that one of these rules decided before, and that now needs the model, is reported
+  as "needs_model". Rows dropped as boilerplate or duplicates are left alone, and so are denied posts, whose row
+  only keeps the title.
+
+The report lists the rows whose decision changed: `row` (0-based data row of the input), `id`, `url`,
+`old` and `new` decision ("included", "excluded" or "needs_model") and `rule`, the rule behind the new decision.
+"""
+import argparse
+import os
+import sqlite3
+import time
+import warnings
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import rules
+from cascade import APPROVED_COLUMNS, DENIED_COLUMNS, MODEL_LABELS
+
+KINDS = ("store", "approved", "denied")
+REPORT_COLUMNS = ["row", "id", "url", "old", "new", "rule"]
+
+# Stored classifications that regex rules of TextClassifier gave, as opposed to the model
+RULE_LABELS = {"Not Related", "indirect_reference", "congratulatory_message", "generic_therapy_discussion"}
+
+# The rule patterns have groups, which is fine for str.contains
+warnings.filterwarnings("ignore", "This pattern is interpreted as a regular expression", UserWarning)
+
+
+def first_rule(rule_set, texts, lowered=None):
+    """
+    Returns, for each text, the name of the rule of `rule_set` that matches first (NaN when none does).
+    `lowered` are the texts already lowercased, used by case-folding rule sets.
+    """
+    if rule_set.fold_case:
+        texts = texts.str.lower() if lowered is None else lowered
+    groups = texts.str.extract(rule_set.pattern)
+    named = groups[[name for name, _ in rule_set.rules]]
+    matched = named.notna()
+    return matched.idxmax(axis=1).where(matched.any(axis=1))
+
+
+def matches(rule_set, texts, lowered=None):
+    """Vectorized `RuleSet.matches`."""
+    if rule_set.fold_case:
+        texts = texts.str.lower() if lowered is None else lowered
+    return texts.str.contains(rule_set.pattern)
+
+
+def evaluate_rules(texts):
+    """Vectorized `rules.evaluate`: returns a DataFrame of `included` and the deciding `rule` of each text."""
+    texts = texts.fillna("").astype(str)
+    lowered = texts.str.lower()
+    personal = first_rule(rules.PERSONAL_EXPERIENCE, texts, lowered)
+    excluded_by = first_rule(rules.EXCLUSION, texts, lowered)
+    never_excluded = (texts.str.lstrip().str.startswith(rules.AUTOMATED_RESPONSE_PREFIX)
+                      | matches(rules.EXCLUSION_OVERRIDE, texts, lowered))
+    excluded_by = excluded_by.mask(never_excluded)
+
+    included = personal.notna() & excluded_by.isna()
+    rule = personal.where(included, excluded_by.where(personal.notna(), "no_personal_experience"))
+    return pd.DataFrame({"included": included, "rule": rule})
+
+
+def evaluate_classifier_rules(texts, is_post):
+    """
+    Vectorized regex steps of TextClassifier, in their evaluation order. Returns a DataFrame of the `rule` that
+    decides each text (NaN when the model does) and whether it makes the text `included`.
+    """
+    texts = texts.fillna("").astype(str)
+    rule = pd.Series(pd.NA, index=texts.index, dtype=object)
+    included = pd.Series(False, index=texts.index)
+
+    def decide(mask, name, include):
+        mask = mask & rule.isna()
+        rule[mask] = name
+        included[mask] = include
+
+    lowered = texts.str.lower()
+    decide(is_post & ~(lowered.str.contains("emdr", regex=False)
+                       | lowered.str.contains("eye movement desensitization", regex=False)), "not_related", False)
+    decide(is_post & texts.str.contains(rules.UNDECIDED_POST), "indirect_reference", False)
+    decide(is_post & texts.str.contains(rules.FIRST_HAND_POST), "first_hand_post", True)
+
+    is_comment = ~is_post
+    decide(is_comment & lowered.str.contains(rules.UNDECIDED_COMMENT), "indirect_reference", False)
+    decide(is_comment & lowered.str.contains(rules.CONGRATULATORY), "congratulatory_message", False)
+    # After the model, a first-hand comment is approved whatever its label, other therapies are then rejected
+    decide(is_comment & lowered.str.contains(rules.FIRST_HAND_COMMENT), "first_hand_comment", True)
+    decide(is_comment & lowered.str.contains(rules.OTHER_THERAPY), "generic_therapy_discussion", False)
+    return pd.DataFrame({"included": included, "rule": rule})
+
+
+def diff_chunk(chunk, kind):
+    """Worker task: re-evaluates a chunk of the corpus (indexed by data row) and returns its changed rows."""
+    if kind == "store":
+        new = evaluate_rules(chunk["content"])
+        changed = ~new["included"]
+        return pd.DataFrame({"row": chunk.index[changed], "id": chunk["id"][changed].values, "url": None,
+                             "old": "included", "new": "excluded", "rule": new["rule"][changed].values},
+                            columns=REPORT_COLUMNS)
+
+    if kind == "approved":
+        is_post = chunk["Comments"].eq("(No Comments)")
+        texts = (chunk["Title"].fillna("") + " " + chunk["Body"].fillna("")).where(is_post, chunk["Comments"])
+        old = "included"
+    else:
+        is_post = chunk["Type"].eq("Post")
+        texts = chunk["Text"]
+        old = "excluded"
+    new = evaluate_classifier_rules(texts, is_post)
+
+    decided = new["rule"].notna()
+    new_decision = new["included"].map({True: "included", False: "excluded"}).where(decided)
+    # Undecided by the rules: the model's stored decision stands, unless a rule made it
+    needs_model = ~decided & chunk["Classification"].isin(RULE_LABELS)
+    new_decision = new_decision.mask(needs_model, "needs_model").fillna(old)
+    # Rows the preprocessor dropped never reached the rules
+    evaluated = chunk["Classification"].isin(RULE_LABELS | set(MODEL_LABELS) | {"uncertain testimony"})
+    if kind == "denied":
+        evaluated &= ~is_post  # Only their title is stored
+
+    changed = evaluated & new_decision.ne(old)
+    return pd.DataFrame({"row": chunk.index[changed], "id": None, "url": chunk["URL"][changed].values,
+                         "old": old, "new": new_decision[changed].values,
+                         "rule": new["rule"].where(decided, "model")[changed].values}, columns=REPORT_COLUMNS)
+
+
+def read_chunks(path, kind, chunksize):
+    """Yields the corpus in DataFrame chunks indexed by data row."""
+    if kind == "store" and not path.lower().endswith(".csv"):
+        conn = sqlite3.connect(path)
+        try:
+            first = 0
+            for chunk in pd.read_sql_query("SELECT id, content FROM results ORDER BY rowid", conn,
+                                           chunksize=chunksize):
+                chunk.index = range(first, first + len(chunk))
+                first += len(chunk)
+                yield chunk
+        finally:
+            conn.close()
+        return
+
+    options = {"dtype": str}
+    if kind != "store":
+        # The scraper's approved and denied files have no header row
+        options.update(header=None, names=APPROVED_COLUMNS if kind == "approved" else DENIED_COLUMNS,
+                       keep_default_na=False)
+    yield from pd.read_csv(path, chunksize=chunksize, **options)
+
+
+def refilter(path, kind="store", report_file=None, workers=None, chunksize=50_000):
+    """
+    Re-evaluates the corpus at `path` (see the module docstring) and returns the report of its changed rows,
+    also written to `report_file` when set.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown corpus kind {kind!r}, expected one of {KINDS}")
+    workers = workers or os.cpu_count()
+    start = time.perf_counter()
+    rows = 0
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for chunk in read_chunks(path, kind, chunksize):
+            rows += len(chunk)
+            in_flight.append(executor.submit(diff_chunk, chunk, kind))
+            if len(in_flight) >= 2 * workers:
+                reports.append(in_flight.popleft().result())
+        reports.extend(future.result() for future in in_flight)
+
+    report = pd.concat(reports, ignore_index=True) if reports else pd.DataFrame(columns=REPORT_COLUMNS)
+    seconds = time.perf_counter() - start
+    print(f"🔁 {rows:,} rows re-evaluated in {seconds:.1f}s ({rows / seconds if seconds else 0:,.0f} rows/s) "
+          f"with rules v{rules.RULE_VERSION}")
+    for new, changed in report.groupby("new"):
+        print(f"  → {new}: {len(changed):,} rows, {changed['rule'].value_counts().to_dict()}")
+    if report_file:
+        report.to_csv(report_file, index=False)
+        print(f"✅ Diff report written to {report_file}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", help="Stored corpus")
+    parser.add_argument("--kind", choices=KINDS, default="store")
+    parser.add_argument("--report", default="refilter_diff.csv")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=50_000)
+    args = parser.parse_args()
+
+    refilter(args.path, kind=args.kind, report_file=args.report, workers=args.workers, chunksize=args.chunksize)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import re
+
+# Bump whenever a pattern below changes, so anything keyed on the rules (caches, stored decisions) is invalidated.
+RULE_VERSION = 2
+
+
+def _has_top_level_alternation(pattern):
+    """Checks whether a `|` of the pattern is outside any group or character class, e.g. in r"\\b(a)|b"."""
+    depth = 0
+    in_class = False
+    escaped = False
+    for char in pattern:
+        if escaped:
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+    return False
+
+
+class RuleSet:
+    """
+    A named list of regex rules compiled once into a single alternation.
+
+    Each rule becomes a named group of the combined pattern, so one `search` scans the text once
+    and `lastgroup` tells which rule fired. Rules starting with a word boundary share a single leading `\\b`
+    (unless a top-level `|` of the rule would leave its other branches without it),
+    and case-insensitive sets are matched against the lowercased text instead of using re.IGNORECASE,
+    which is what makes the single pass cheaper than one search per rule.
+    """
+
+    def __init__(self, name, rules, flags=re.IGNORECASE):
+        self.name = name
+        self.rules = list(rules)
+        # Lowercasing the pattern is only safe when it has no upper-case escapes such as \B, \S or \W
+        self.fold_case = bool(flags & re.IGNORECASE) and not any(
+            re.search(r"\\[A-Z]", pattern) for _, pattern in self.rules
+        )
+        if self.fold_case:
+            flags &= ~re.IGNORECASE
+        self.flags = flags
+
+        bounded, unbounded = [], []
+        for rule_name, pattern in self.rules:
+            if self.fold_case:
+                pattern = pattern.lower()
+            if pattern.startswith(r"\b") and not _has_top_level_alternation(pattern):
+                bounded.append(f"(?P<{rule_name}>{pattern[2:]})")
+            else:
+                unbounded.append(f"(?P<{rule_name}>{pattern})")
+        alternatives = ([r"\b(?:" + "|".join(bounded) + ")"] if bounded else []) + unbounded
+        self.pattern = re.compile("|".join(alternatives), flags)
+
+    def search(self, text):
+        """Returns the name of the rule that matched first in the text, or None."""
+        match = self.pattern.search(text.lower() if self.fold_case else text)
+        return match.lastgroup if match else None
+
+    def matches(self, text):
+        """Checks whether any rule of the set matches the text."""
+        return self.pattern.search(text.lower() if self.fold_case else text) is not None
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# functions.py (RedditScrapper) rules
+# ---------------------------------------------------------------------------------------------------------------
+
+AUTOMATED_RESPONSE_PREFIX = "r/ptsd has generated this automated response that is appended to every post"
+
+PERSONAL_EXPERIENCE = RuleSet("personal_experience", [
+    ("first_person", r"\b(I|me|my|mine|we|our|us)\b"),
+    ("experience_verb", r"\b(felt|tried|experienced|found|helped|worked|changed|improved|saved my life)\b"),
+    ("time_marker", r"\b(during|while|after|when I did|it was|it felt like)\b"),
+    ("therapy_effect", r"\b(life changing|breakthrough|trauma processing|emotional release|triggered|ground myself|unlock memory)\b"),
+    ("symptom", r"\b(separate the past from the present|panic attack|PTSD|C-PTSD|reliving moments|healing journey|symptomatic|remission)\b"),
+    ("outcome", r"\b(it didn’t help|it helped immensely|it worked for me|it made things worse|it was worth it|recommend it)\b"),
+])
+
+EXCLUSION = RuleSet("exclusion", [
+    # Comments where the author hasn't tried EMDR and is considering it
+    ("considering_emdr", r"\b(debating (on whether|whether|if) (I'?d try|to try)|If I (do|start) EMDR|I'm about to start EMDR|Should I try EMDR|Has (anybody|anyone)( here)? tried EMDR( therapy)?|wanted some advice|haven’t tried it|not sure if I'm ready)\b"),
+
+    # Comments where the author is expressing uncertainty or fear about starting EMDR
+    ("fear_of_starting", r"\b(I'm (apprehensive|unsure|scared of reliving)|I (can't|could) handle it|I should (hold off|wait) on EMDR|I'm scared (of trying|to try) it|too scared)\b"),
+
+    # Extended to catch uncertainty or lack of understanding while still being willing to try EMDR
+    ("willing_to_try", r"\b((want|willing) to try it|I don't understand how eye movement moves a memory|I'm curious about how EMDR works|I might try)\b"),
+
+    # Comments about therapy advice without having tried EMDR yet (indicating uncertainty or hesitation)
+    ("not_tried_yet", r"\b(not stable enough|I (haven't|have not) tried it yet|I dissociate a lot|I (wasn't|am not) ready for EMDR|I (don't|cannot) know if I want to try|I was supposed to begin EMDR|I'm still considering)\b"),
+
+    # Exclude specific concerns about readiness for EMDR, especially involving BPD or dissociation
+    ("not_ready", r"\b(I (was supposed to|should have|was going to) (begin|start) EMDR (but|however) I (have BPD|dissociate(a lot| frequently)|(am|was) not stable enough|cannot handle it|don’t feel ready))\b"),
+
+    # Comments where someone is asking about EMDR without having tried it yet
+    ("asking_about_emdr", r"\b(Should clarify that I have not had any trauma therapy yet|How was (online EMDR|it)?|Should I try it|Do you think I should do it|Is EMDR safe for someone like me|I don’t know if I’m in the right place for EMDR|I’m concerned about whether EMDR is right for me|I know addressing trauma would help, but I’m not sure if I should start EMDR)\b"),
+
+    # New patterns to exclude comments where the user agreed to try EMDR but backed out or was too scared
+    ("backed_out", r"\b(agreed to try (EMDR|it) but (was too scared|didn't follow through|backed out|couldn't handle it|changed my mind))\b"),
+    ("too_scared", r"\b((I was|I’m) too scared (to start|to follow through with|to try) (EMDR|it)|backed out of (trying|doing) (EMDR|it)|changed my mind about (trying|doing) (EMDR|it))\b"),
+
+    # Exclude comments about certification or professional advice from certified therapists
+    # (historically concatenated with the generic-advice pattern below, kept as-is so decisions don't change)
+    ("professional_advice", r"\b(EMDR certified therapist|board certified psychiatrist|certified EMDR practitioner|certified as an EMDR practitioner|accredited EMDR teacher|clinical psychologist|licensed social worker|ongoing consultation)\b"
+     # Exclude specific generic comments that are not personal experiences but just offering general advice or information
+     r"\b(People have all sorts of experiences with EMDR|EMDR is not the only type of neurotherapy)\b"),
+
+    # Catch negative or concern-based comments about EMDR's effectiveness or its drawbacks
+    ("effectiveness_concern", r"\b(concerns around|controversy about|ethical concerns|effectiveness of EMDR|not sure if EMDR is effective|not working for me|considering other forms of therapy)\b"),
+
+    # Exclude automated responses from bots or rules-based content
+    ("automated_response", r"(Welcome to r/ptsd|We are a supportive & respectful community|Your safety always comes first!|Do NOT exchange DMs or personal info|Please contact your GP/doctor|If you or someone you know is in immediate danger|suicide and support hotlines|Gatekeeping is not allowed here|I am a bot|this action was performed automatically|contact the moderators)"),
+])
+
+# An excluded text is still kept when it says EMDR was already done
+EXCLUSION_OVERRIDE = RuleSet("exclusion_override", [
+    ("already_tried", r"\b(already tried|have done|completed)\s*EMDR"),
+])
+
+
+def is_personal_experience(text):
+    """Returns the name of the personal-experience rule matching the text, or None."""
+    return PERSONAL_EXPERIENCE.search(text)
+
+
+def exclusion_rule(text):
+    """
+    Returns the name of the exclusion rule that excludes the text, or None if it is not excluded.
+    Automated responses and texts that mention having already done EMDR are never excluded.
+    """
+    if text.lstrip().startswith(AUTOMATED_RESPONSE_PREFIX):
+        return None
+    rule = EXCLUSION.search(text)
+    if rule is None or EXCLUSION_OVERRIDE.matches(text):
+        return None
+    return rule
+
+
+def evaluate(text):
+    """
+    Runs the RedditScrapper inclusion rules over a text.
+    Returns (included, rule) where `rule` is the rule that decided: the exclusion rule that fired for an excluded
+    text, the personal-experience rule for an included one, or None when nothing matched.
+    """
+    personal_rule = PERSONAL_EXPERIENCE.search(text)
+    if personal_rule is None:
+        return False, None
+    excluded_by = exclusion_rule(text)
+    if excluded_by is not None:
+        return False, excluded_by
+    return True, personal_rule
+
+
+# ---------------------------------------------------------------------------------------------------------------
+# functions_alternative1.py (TextClassifier) rules
+# ---------------------------------------------------------------------------------------------------------------
+
+FIRST_HAND_POST = re.compile(
+    r"\b(I (tried|started|completed|did|went through|had) EMDR|"
+    r"after (\d+ sessions|doing|my) EMDR|"
+    r"during my (EMDR|it) (session|therapy)|"
+    r"my (EMDR )?(therapist|session|experience|treatment)|"
+    r"(EMDR|it) (was (life changing|a waste of time|intense|helpful|too much for me|worth it|tough)|"
+    r"helped|changed|made me feel|worked for) me|"
+    r"EMDR was (amazing|horrible|really hard|so intense|so worth it|difficult at first))\b",
+    re.IGNORECASE
+)
+
+# Regex to reject indirect mentions in posts
+UNDECIDED_POST = re.compile(
+    r"\b(thinking about EMDR|considering EMDR|scared to try EMDR|not sure if I will do EMDR|"
+    r"haven’t started EMDR|was recommended EMDR|was supposed to do EMDR but|"
+    r"was told EMDR wouldn’t work for me|my therapist denied me EMDR|"
+    r"never actually started EMDR|my friend did EMDR|someone I know did EMDR|"
+    r"I plan to do EMDR|I'm waiting to try EMDR|I might do EMDR in the future|"
+    r"I'm preparing for EMDR|I decided not to do EMDR)\b"
+    r"\b(too unwell for EMDR|not ready for EMDR|therapist refused EMDR|"
+    r"not stable enough for EMDR|my therapist denied me EMDR)\b"
+    r"\b(denied EMDR|refused EMDR|not allowed to do EMDR|was not approved for EMDR|"
+    r"not stable enough for EMDR|told I can't do EMDR|not a candidate for EMDR)\b"
+    r"\b(planning to do EMDR|thinking about trying EMDR|considering EMDR|scared to try EMDR|"
+    r"haven’t started EMDR yet|waiting to start EMDR|preparing for EMDR)\b"
+    r"couldn't start EMDR|my therapist stopped EMDR before it started|"
+    r"\b(EMDR was not an option for me)\b"
+    r"\b(scared to try EMDR|not sure about EMDR|not everyone is a candidate for EMDR|"
+    r"thinking about doing EMDR|wondering if EMDR is right for me|"
+    r"glad I was refused EMDR|I may try EMDR one day)\b",
+    re.IGNORECASE
+)
+
+# Regex to reject indirect mentions in comments
+UNDECIDED_COMMENT = re.compile(
+    r"\b(thinking about EMDR|considering EMDR|scared to try EMDR|not sure if I will do EMDR|"
+    r"haven’t started EMDR|was recommended EMDR|was supposed to do EMDR but|"
+    r"was told EMDR wouldn’t work for me|my therapist denied me EMDR|"
+    r"never actually started EMDR|my friend did EMDR|someone I know did EMDR|"
+    r"I plan to do EMDR|I'm waiting to try EMDR|I might do EMDR in the future|"
+    r"I'm preparing for EMDR|I decided not to do EMDR)\b"
+    r"\b(too unwell for EMDR|not ready for EMDR|therapist refused EMDR|"
+    r"not stable enough for EMDR|my therapist denied me EMDR)\b"
+    r"\b(denied EMDR|refused EMDR|not allowed to do EMDR|was not approved for EMDR|"
+    r"not stable enough for EMDR|told I can't do EMDR|not a candidate for EMDR)\b"
+    r"\b(planning to do EMDR|thinking about trying EMDR|considering EMDR|scared to try EMDR|"
+    r"haven’t started EMDR yet|waiting to start EMDR|preparing for EMDR"
+    r"couldn't start EMDR|my therapist stopped EMDR before it started|"
+    r"EMDR was not an option for me)\b"
+    r"\b(scared to try EMDR|not sure about EMDR|not everyone is a candidate for EMDR|"
+    r"thinking about doing EMDR|wondering if EMDR is right for me|"
+    r"glad I was refused EMDR|I may try EMDR one day)\b",
+    re.IGNORECASE
+)
+
+CONGRATULATORY = re.compile(
+    r"\b(congratulations|so happy for you|proud of you|great job|you’re amazing|well done|"
+    r"thank you for sharing|that’s inspiring|sending good vibes|wishing you well|"
+    r"happy to hear this|that’s wonderful news|good to know|best of luck)\b"
+    r"best of luck|gives me hope|brilliant! enjoy your freedom|"
+    r"glad to hear this|cheers to your recovery|"
+    r"\b(best wishes on your journey|you're strong)\b",
+    re.IGNORECASE
+)
+
+OTHER_THERAPY = re.compile(
+    r"\b(DBT|CBT|ART|IFS|somatic therapy|talk therapy|exposure therapy)\b",
+    re.IGNORECASE
+)
+
+FIRST_HAND_COMMENT = re.compile(
+    r"\b(I|my|me).*?(tried|started|completed|did|went through|had).*?EMDR\b",
+    re.IGNORECASE
+)
+
+# Comment short-circuits that decide a label before the model runs, in evaluation order
+COMMENT_PRE_MODEL = RuleSet("comment_pre_model", [
+    ("indirect_reference", UNDECIDED_COMMENT.pattern),
+    ("congratulatory_message", CONGRATULATORY.pattern),
+])
+
+
+def comment_short_circuit(text):
+    """
+    Returns the label a comment gets without running the model ("indirect_reference" or "congratulatory_message"),
+    or None when the model is needed.
+    """
+    # Both rules can match the same text, in which case indirect_reference wins like it did in classify_comment
+    rule = COMMENT_PRE_MODEL.search(text)
+    if rule == "congratulatory_message" and UNDECIDED_COMMENT.search(text):
+        return "indirect_reference"
+    return rule
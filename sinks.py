@@ -0,0 +1,171 @@
+"""
+Sinks consuming the record streams of the scrapers (`RedditScrapper.iter_records`,
+`RedditExperienceScraper.iter_entries`), so that a run's memory doesn't grow with its number of records.
+
+    records = scrapper.iter_records("PTSD", "emdr", limit=10_000, output_file="results.sqlite")
+    consume(records, CsvSink("results.csv", ["id", "content"]), CallbackSink(print))
+
+Records are dicts. Each sink buffers up to `batch_size` of them before writing, keeps only the `columns` it is
+given and, with `where`, only the records that predicate accepts (e.g. the approved entries).
+"""
+import contextlib
+import os
+import time
+import uuid
+
+import pandas as pd
+
+
+class Sink:
+    """Buffers records and writes them a batch at a time; `_write_batch` does the writing."""
+
+    def __init__(self, columns=None, batch_size=500, where=None, metrics=None, counter=None):
+        self.columns = columns
+        self.batch_size = batch_size
+        self.where = where
+        self.metrics = metrics
+        self.counter = counter  # Name of the metrics counter of written records
+        self.written = 0
+        self._batch = []
+
+    def accepts(self, record):
+        return self.where is None or self.where(record)
+
+    def write(self, record):
+        self._batch.append(record)
+        if len(self._batch) >= self.batch_size:
+            self._write_buffered()
+
+    def flush(self):
+        """Writes the buffered records."""
+        self._write_buffered()
+
+    def _write_buffered(self):
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        with self._timer(len(batch)):
+            self._write_batch(batch)
+        self.written += len(batch)
+        if self.metrics and self.counter:
+            self.metrics.count(self.counter, len(batch))
+
+    def _timer(self, items):
+        return self.metrics.timer("write", items=items) if self.metrics else contextlib.nullcontext()
+
+    def _write_batch(self, batch):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSink(Sink):
+    """
+    Appends the records to a CSV file, with a header row when `header` is set and the file is new.
+    With a `writer` (see writer.py), the records are handed to its background thread instead, which does the
+    batching; `flush` then waits until they are in the file.
+    """
+
+    def __init__(self, path, columns, header=True, writer=None, **options):
+        if writer is not None:
+            options.setdefault("batch_size", 1)
+            writer.register(path, columns, header)
+        super().__init__(columns, **options)
+        self.path = path
+        self.header = header
+        self.writer = writer
+
+    def flush(self):
+        super().flush()
+        if self.writer is not None:
+            self.writer.flush()
+
+    def _timer(self, items):
+        # The writer times its own writes
+        return contextlib.nullcontext() if self.writer is not None else super()._timer(items)
+
+    def _write_batch(self, batch):
+        if self.writer is not None:
+            for record in batch:
+                self.writer.write(self.path, record)
+            return
+        header = self.header and (not os.path.exists(self.path) or os.path.getsize(self.path) == 0)
+        pd.DataFrame(batch, columns=self.columns).to_csv(self.path, mode="a", header=header, index=False,
+                                                         encoding="utf-8")
+
+
+class ParquetSink(Sink):
+    """
+    Writes the records to a Parquet dataset: `path` is a directory, and every batch written adds a part file to it
+    (`part-<run>-<n>.parquet`), so a resumed run adds to the rows of the earlier runs instead of replacing them.
+    Read it whole with `pd.read_parquet(path)`.
+    A part is written under a hidden temporary name, then renamed: a crash never leaves a truncated part behind,
+    and `flush` (called when a scraper checkpoints) puts the buffered records on disk as one more part.
+    The parts of a run share the schema of its first batch.
+    """
+
+    def __init__(self, path, columns=None, batch_size=10_000, **options):
+        super().__init__(columns, batch_size=batch_size, **options)
+        if os.path.isfile(path):
+            raise ValueError(f"{path} is a file: ParquetSink writes a directory of part files, give it another path")
+        self.path = path
+        self.run = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        self.parts = 0
+        self._schema = None
+
+    def _write_batch(self, batch):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("ParquetSink needs pyarrow: pip install pyarrow") from e
+        table = pa.Table.from_pandas(pd.DataFrame(batch, columns=self.columns), schema=self._schema,
+                                     preserve_index=False)
+        self._schema = table.schema
+        os.makedirs(self.path, exist_ok=True)
+        name = f"part-{self.run}-{self.parts:05d}.parquet"
+        # Readers skip files starting with "."
+        tmp_path = os.path.join(self.path, f".{name}.tmp")
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, os.path.join(self.path, name))
+        self.parts += 1
+
+
+class CallbackSink(Sink):
+    """Calls `callback(record)` for every record (or `callback(batch)` with `batches`)."""
+
+    def __init__(self, callback, batch_size=1, batches=False, **options):
+        super().__init__(batch_size=batch_size, **options)
+        self.callback = callback
+        self.batches = batches
+
+    def _write_batch(self, batch):
+        if self.columns:
+            batch = [{column: record.get(column) for column in self.columns} for record in batch]
+        if self.batches:
+            self.callback(batch)
+        else:
+            for record in batch:
+                self.callback(record)
+
+
+def consume(records, *sinks):
+    """Writes every record of the stream to the sinks accepting it, then closes them. Returns the record count."""
+    count = 0
+    try:
+        for record in records:
+            for sink in sinks:
+                if sink.accepts(record):
+                    sink.write(record)
+            count += 1
+    finally:
+        for sink in sinks:
+            sink.close()
+    return count
@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+COLUMNS = ["id", "content"]
+
+
+class ResultStore:
+    """
+    Where `RedditScrapper.iter_records` keeps its {"id", "content"} records.
+    Backends only have to answer `id in store` cheaply; contents are never needed to resume a run.
+    """
+
+    def __contains__(self, record_id):
+        raise NotImplementedError
+
+    def add_many(self, records):
+        """Stores new records and returns how many were added (records whose id is already stored are skipped)."""
+        raise NotImplementedError
+
+    def count(self):
+        raise NotImplementedError
+
+    def to_dataframe(self, limit=None):
+        """Returns up to `limit` stored records as a DataFrame, in insertion order."""
+        raise NotImplementedError
+
+    def export_csv(self, file_path, chunksize=10_000):
+        """Writes every stored record to a CSV file."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class CsvResultStore(ResultStore):
+    """
+    Plain CSV file, as written before the store existed.
+    Only the `id` column is read on open, so resuming doesn't load the contents into memory.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._ids = set()
+        if os.path.exists(file_path):
+            self._ids = set(pd.read_csv(file_path, usecols=["id"], dtype=str, keep_default_na=False)["id"])
+
+    def __contains__(self, record_id):
+        return record_id in self._ids
+
+    def add_many(self, records):
+        new_records = []
+        for record in records:
+            if record["id"] not in self._ids:
+                self._ids.add(record["id"])
+                new_records.append(record)
+        if new_records:
+            self._append(new_records)
+        return len(new_records)
+
+    def _append(self, new_records, retries=5):
+        """Append new data to the CSV without overwriting, retrying a locked file `retries` times."""
+        for attempt in range(retries + 1):
+            try:
+                if not os.path.exists(self.file_path):
+                    pd.DataFrame(new_records, columns=COLUMNS).to_csv(self.file_path, index=False)
+                else:
+                    pd.DataFrame(new_records, columns=COLUMNS).to_csv(self.file_path, mode='a', header=False,
+                                                                      index=False)
+                return
+            except PermissionError as e:
+                if attempt == retries:
+                    raise
+                print(f"Permission error while writing to {self.file_path}: {e}")
+                print("Retrying in 5 seconds...")
+                time.sleep(5)
+
+    def count(self):
+        return len(self._ids)
+
+    def to_dataframe(self, limit=None):
+        if not os.path.exists(self.file_path):
+            return pd.DataFrame(columns=COLUMNS)
+        return pd.read_csv(self.file_path, nrows=limit)
+
+    def export_csv(self, file_path, chunksize=10_000):
+        if os.path.abspath(file_path) != os.path.abspath(self.file_path):
+            self.to_dataframe().to_csv(file_path, index=False)
+
+
+class SQLiteResultStore(ResultStore):
+    """SQLite table with `id` as its primary key: lookups and de-duplication go through the index."""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(file_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS results (id TEXT PRIMARY KEY, content TEXT)")
+        self._conn.commit()
+
+    def __contains__(self, record_id):
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM results WHERE id = ?", (record_id,)).fetchone() is not None
+
+    def add_many(self, records):
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany("INSERT OR IGNORE INTO results (id, content) VALUES (?, ?)",
+                                   [(record["id"], record["content"]) for record in records])
+            self._conn.commit()
+            return self._conn.total_changes - before
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def to_dataframe(self, limit=None):
+        query = "SELECT id, content FROM results ORDER BY rowid"
+        with self._lock:
+            if limit is None:
+                return pd.read_sql_query(query, self._conn)
+            return pd.read_sql_query(query + " LIMIT ?", self._conn, params=(int(limit),))
+
+    def export_csv(self, file_path, chunksize=10_000):
+        with self._lock:
+            chunks = pd.read_sql_query("SELECT id, content FROM results ORDER BY rowid", self._conn,
+                                       chunksize=chunksize)
+            header = True
+            for chunk in chunks:
+                chunk.to_csv(file_path, mode='w' if header else 'a', header=header, index=False)
+                header = False
+            if header:
+                pd.DataFrame(columns=COLUMNS).to_csv(file_path, index=False)
+        print(f"Exported {self.count()} records to {file_path}")
+
+    def import_csv(self, file_path, chunksize=10_000):
+        """Loads the records of a CSV written by an earlier run; ids already stored are skipped."""
+        added = 0
+        for chunk in pd.read_csv(file_path, chunksize=chunksize, dtype=str, keep_default_na=False):
+            added += self.add_many(chunk[COLUMNS].to_dict("records"))
+        return added
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_store(file_path):
+    """Opens the result store backend matching the file extension: `.csv` for CSV, SQLite otherwise."""
+    if file_path.lower().endswith(".csv"):
+        return CsvResultStore(file_path)
+    return SQLiteResultStore(file_path)
@@ -0,0 +1,72 @@
+"""Training data of the cascade: only the labels the zero-shot model gave."""
+import csv
+
+import pandas as pd
+
+from cascade import APPROVED_COLUMNS, DENIED_COLUMNS, MODEL_LABEL_COLUMNS, load_training_data
+from functions_alternative1 import TextClassifier
+from test_checkpoint import reddit, scrape  # noqa: F401 (fixture)
+
+
+class OpinionZeroShot:
+    """Stand-in for the zero-shot pipeline that tops every text with 'opinion'."""
+
+    def __call__(self, texts, candidate_labels, batch_size=None):
+        return [{"labels": ["opinion"] + [label for label in candidate_labels if label != "opinion"],
+                 "scores": [0.6] + [0.1] * (len(candidate_labels) - 1)} for text in texts]
+
+
+class QuestionCascade:
+    """Stand-in for cascade.Cascade, confident that texts ending with '?' are questions."""
+
+    def decide(self, texts):
+        return ["question" if text.endswith("?") else None for text in texts]
+
+
+def write_rows(path, rows):
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(rows)
+
+
+def test_model_labels_are_only_recorded_for_model_decisions(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # For the false positive log
+    classifier = TextClassifier(cache_path=None, classifier=OpinionZeroShot(), writer=None)
+    classifier.cascade = QuestionCascade()
+    texts = ["you're strong, EMDR takes time", "does EMDR work?", "EMDR is overrated",
+             "I tried EMDR last year and it helped"]
+    assert classifier.classify_with_model_labels(texts) == [
+        ("congratulatory_message", None),  # Regex short-circuit
+        ("question", None),  # Cascade
+        ("opinion", "opinion"),
+        ("personal experience", "opinion"),  # Regex over the model's label
+    ]
+
+
+def test_training_data_skips_texts_the_model_did_not_label(tmp_path):
+    model_labels, log = tmp_path / "model_labels.csv", tmp_path / "false_positives.txt"
+    write_rows(model_labels, [
+        MODEL_LABEL_COLUMNS,
+        ["testimony", "model comment", "url", "0"],
+        ["opinion", "denied comment", "url", "0"],
+    ])
+    log.write_text("Classified as: opinion | Text: denied comment | URL: url\n"
+                   "Classified as: opinion (cascade) | Text: cascade comment | URL: url\n"
+                   "Classified as: testimony | Text: logged comment | URL: url\n", encoding="utf-8")
+
+    texts, labels = load_training_data(str(model_labels), str(log))
+    assert sorted(zip(texts, labels)) == [("denied comment", "opinion"), ("logged comment", "testimony"),
+                                          ("model comment", "testimony")]
+
+
+def test_model_labels_go_to_their_own_file(reddit, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scrape(reddit, "EMDR", limit=10)
+
+    # The approved and denied files keep their layout
+    for path, columns in [("approved_reddit_emdr_experiences.csv", APPROVED_COLUMNS),
+                          ("denied_reddit_emdr_experiences.csv", DENIED_COLUMNS)]:
+        with open(path, encoding="utf-8", newline="") as f:
+            assert {len(row) for row in csv.reader(f)} == {len(columns)}
+    model_labels = pd.read_csv("model_labels.csv")
+    assert list(model_labels.columns) == MODEL_LABEL_COLUMNS
+    assert set(model_labels["Model Label"]) <= {"testimony", "opinion"}
@@ -0,0 +1,121 @@
+"""Resuming searches that share their output files, against the offline Reddit backend."""
+import os
+
+import pandas as pd
+import pytest
+
+from cascade import APPROVED_COLUMNS
+from checkpoint import CheckpointStore, file_sizes
+from functions import RedditScrapper
+from functions_alternative1 import RedditExperienceScraper, TextClassifier
+from offline_reddit import OfflineReddit, synthetic_corpus
+
+TEXTS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "incremental_emdr_results.csv")
+
+
+class KeywordZeroShot:
+    """Stand-in for the zero-shot pipeline: 'testimony' for first-person EMDR texts, 'opinion' otherwise."""
+
+    def __call__(self, texts, candidate_labels, batch_size=None):
+        single = isinstance(texts, str)
+        results = []
+        for text in [texts] if single else texts:
+            lowered = f" {text.lower()} "
+            top = "testimony" if " i " in lowered and "emdr" in lowered else "opinion"
+            results.append({"labels": [top] + [label for label in candidate_labels if label != top],
+                            "scores": [0.6] + [0.1] * (len(candidate_labels) - 1)})
+        return results[0] if single else results
+
+
+@pytest.fixture
+def reddit():
+    corpus = synthetic_corpus(60, comments_per_post=4, texts_file=TEXTS_FILE)
+    posts = corpus["PTSD"]
+    # A second therapy whose threads are written to the same output files
+    posts += [dict(post, id=f"cpt{i}", title=f"CPT thread {i}") for i, post in enumerate(posts[:30])]
+    return OfflineReddit(corpus)
+
+
+def scrape(reddit, term, limit=5):
+    scraper = RedditExperienceScraper(None, None, None, reddit=reddit, save_every=1,
+                                      text_classifier=TextClassifier(cache_path=None, classifier=KeywordZeroShot()))
+    scraper.scrape_and_filter_posts(search_term=term, limit=limit)
+
+
+def read(path):
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_resuming_a_search_keeps_the_rows_of_searches_run_since(reddit, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scrape(reddit, "EMDR")
+    scrape(reddit, "CPT")
+    approved = read("approved_reddit_emdr_experiences.csv")
+    denied = read("denied_reddit_emdr_experiences.csv")
+
+    scrape(reddit, "EMDR")
+    assert read("approved_reddit_emdr_experiences.csv").startswith(approved)
+    assert read("denied_reddit_emdr_experiences.csv").startswith(denied)
+
+
+def test_resuming_drops_rows_appended_after_the_latest_commit(reddit, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scrape(reddit, "EMDR")
+    scrape(reddit, "CPT")
+    approved = read("approved_reddit_emdr_experiences.csv")
+    # A crashed run's rows, written after the last checkpoint
+    with open("approved_reddit_emdr_experiences.csv", "a", encoding="utf-8") as f:
+        f.write("uncommitted,row,testimony,x,url,0\n")
+
+    scrape(reddit, "EMDR")
+    approved_after = read("approved_reddit_emdr_experiences.csv")
+    assert approved_after.startswith(approved)
+    assert "uncommitted,row" not in approved_after
+
+
+def test_rows_written_by_get_comments_are_committed(reddit, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scrape(reddit, "EMDR")
+    scraper = RedditExperienceScraper(None, None, None, reddit=reddit, text_classifier=TextClassifier(
+        cache_path=None, classifier=KeywordZeroShot()))
+    before = file_sizes(*scraper.output_files())
+    post = list(reddit.subreddit("PTSD").search("EMDR", limit=100))[0]
+    scraper.get_comments(post, post_is_emdr_experience=True, post_is_question=False)
+
+    # The next search's rollback only drops what was appended after these sizes
+    sizes = file_sizes(*scraper.output_files())
+    assert sizes != before
+    assert all(scraper.checkpoints.committed_size(path) == size for path, size in sizes.items())
+
+
+def test_limited_incremental_runs_do_not_write_rows_twice(reddit, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for _ in range(3):
+        scraper = RedditExperienceScraper(None, None, None, reddit=reddit, save_every=1, text_classifier=TextClassifier(
+            cache_path=None, classifier=KeywordZeroShot()))
+        scraper.scrape_and_filter_posts(search_term="EMDR", limit=10, incremental=True)
+
+    approved = pd.read_csv("approved_reddit_emdr_experiences.csv", header=None, names=APPROVED_COLUMNS)
+    posts = approved[approved["Comments"] == "(No Comments)"]
+    assert len(posts) > 10  # The later runs went on where the earlier ones stopped
+    assert not posts["URL"].duplicated().any()
+
+
+def test_limited_incremental_runs_of_the_rule_scrapper_resume_after_their_cursor(reddit, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    scrapper = RedditScrapper(None, None, None, reddit=reddit)
+    checkpoints = CheckpointStore("checkpoints")
+    served = []
+    for limit in (25, 25, 10 ** 9):
+        before = reddit.served["posts"]
+        scrapper.scrape_and_filter("PTSD", "EMDR", limit=limit, output_file="results.sqlite", save_every=100,
+                                   limit_comment=None, incremental=True)
+        served.append(reddit.served["posts"] - before)
+        if len(served) == 2:
+            assert checkpoints.load("PTSD", "EMDR", "incremental")["after"]
+
+    matching = [post for post in reddit.corpus["ptsd"] if "emdr" in f"{post['title']} {post['selftext']}".lower()]
+    assert served[2] < len(matching)  # The last run went on from the second one's cursor
+    assert checkpoints.load("PTSD", "EMDR", "incremental")["after"] is None
+    assert checkpoints.load_watermark("PTSD", "EMDR")["created_utc"]
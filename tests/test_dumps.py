@@ -0,0 +1,26 @@
+"""Checkpoints of dump ingestions."""
+import json
+
+import dumps
+
+
+def write_archive(path, n=20):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n):
+            f.write(json.dumps({"id": f"c{i}", "subreddit": "PTSD" if i % 2 else "CPTSD",
+                                "body": "I tried EMDR and it helped me so much"}) + "\n")
+
+
+def test_ingestions_of_other_subreddits_or_archives_have_their_own_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "old").mkdir()
+    write_archive("RC.ndjson")
+    write_archive("old/RC.ndjson")
+
+    assert dumps.ingest(["RC.ndjson"], "emdr", subreddits=["PTSD"], output_file="a.sqlite", workers=1)["kept"] == 10
+    assert dumps.ingest(["RC.ndjson"], "emdr", subreddits=["CPTSD"], output_file="b.sqlite", workers=1)["kept"] == 10
+    # Same name, other directory
+    assert dumps.ingest(["old/RC.ndjson"], "emdr", subreddits=["PTSD"], output_file="a.sqlite",
+                        workers=1)["records"] == 20
+    # Same ingestion again: everything is done
+    assert dumps.ingest(["RC.ndjson"], "emdr", subreddits=["PTSD"], output_file="a.sqlite", workers=1)["records"] == 0
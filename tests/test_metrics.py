@@ -0,0 +1,17 @@
+"""Interval exports of the run metrics."""
+import json
+
+from metrics import Metrics
+
+
+def test_gauge_sources_are_read_on_every_export(tmp_path):
+    metrics = Metrics()
+    limiter = {"current_wait": 0.0, "state": "open"}
+    metrics.gauge_source("rate_limiter", lambda: dict(limiter))
+    path = tmp_path / "metrics.json"
+
+    metrics.export(str(path))
+    limiter["current_wait"] = 12.5
+    assert json.loads(path.read_text())["gauges"] == {"rate_limiter_current_wait": 0.0}
+    metrics.export(str(path))
+    assert json.loads(path.read_text())["gauges"] == {"rate_limiter_current_wait": 12.5}
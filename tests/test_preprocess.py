@@ -0,0 +1,26 @@
+"""Duplicate suppression of preprocess.py."""
+from preprocess import NearDuplicateIndex, Preprocessor
+
+TEXT = "EMDR helped me process the accident and I can drive again without panic attacks after ten sessions"
+
+
+def test_the_copy_decided_first_is_kept_whatever_order_it_was_prepared_in():
+    preprocessor = Preprocessor()
+    later = preprocessor.prepare(TEXT + ".")
+    first = preprocessor.prepare(TEXT)
+
+    assert preprocessor.decide(first[2]) is None
+    assert preprocessor.decide(later[2]) == "near_duplicate"
+
+
+def test_indexes_only_remember_the_last_max_texts():
+    preprocessor = Preprocessor(near_duplicates=False, max_texts=2)
+    for text in ("Thank you!", "Same here", "Good luck"):
+        preprocessor.process(text)
+    assert preprocessor.process("Good luck")[1] == "exact_duplicate"
+    assert preprocessor.process("Thank you!")[1] is None
+
+    index = NearDuplicateIndex(max_texts=1)
+    index.add(index.signature(TEXT))
+    index.add(index.signature("another text altogether about something unrelated to therapy at all"))
+    assert len(index) == 1 and index.find(index.signature(TEXT)) is None
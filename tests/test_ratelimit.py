@@ -0,0 +1,24 @@
+"""PRAW clients of the scrapers' worker threads."""
+import threading
+
+from ratelimit import AdaptiveRateLimiter, ThreadClients
+
+
+def test_each_thread_gets_its_own_client():
+    clients = ThreadClients("id", "secret", "agent", AdaptiveRateLimiter())
+    seen = []
+    threads = [threading.Thread(target=lambda: seen.append(clients.get())) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert clients.get() is clients.get()
+    assert len({id(client) for client in seen + [clients.get()]}) == 4
+
+
+def test_an_injected_client_is_shared():
+    reddit = object()
+    clients = ThreadClients(None, None, None, AdaptiveRateLimiter(), reddit=reddit)
+    post = object()
+    assert clients.get() is reddit and clients.submission(post) is post
@@ -0,0 +1,24 @@
+"""The combined rule sets of rules.py decide like the separate patterns they replace."""
+import pytest
+
+import rules
+from benchmark_rules import legacy_comment_short_circuit
+
+
+@pytest.mark.parametrize("text", [
+    "he forgives me hope you are well",
+    "glad to hear this worked",
+    "cheers to your recovery!",
+    "congratulations on finishing emdr",
+    "you're strong, emdr takes time",
+    "i was thinking about emdr, congratulations",
+    "emdr helped me a lot",
+])
+def test_comment_short_circuit_matches_the_separate_searches(text):
+    assert rules.comment_short_circuit(text) == legacy_comment_short_circuit(text)
+
+
+def test_word_boundary_is_only_shared_without_top_level_alternation():
+    rule_set = rules.RuleSet("test", [("bounded", r"\b(cat)\b"), ("branches", r"\bdog|fish")])
+    assert rule_set.search("catfish") == "branches"
+    assert rule_set.search("hotdog") is None
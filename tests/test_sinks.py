@@ -0,0 +1,22 @@
+"""Parquet output across resumed runs."""
+import pandas as pd
+import pytest
+
+from sinks import ParquetSink, consume
+
+pytest.importorskip("pyarrow")
+
+
+def test_parquet_runs_add_parts_instead_of_replacing_the_output(tmp_path):
+    path = str(tmp_path / "entries.parquet")
+    consume(({"id": str(i)} for i in range(3)), ParquetSink(path, batch_size=2))
+    consume(({"id": str(i)} for i in range(3, 5)), ParquetSink(path))
+
+    assert sorted(pd.read_parquet(path)["id"]) == [str(i) for i in range(5)]
+
+
+def test_parquet_sink_refuses_a_single_file_output(tmp_path):
+    path = tmp_path / "entries.parquet"
+    path.write_bytes(b"")
+    with pytest.raises(ValueError):
+        ParquetSink(str(path))
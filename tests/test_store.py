@@ -0,0 +1,9 @@
+"""Ids of a CSV result store written by an earlier run."""
+from store import CsvResultStore
+
+
+def test_csv_store_reads_ids_as_written(tmp_path):
+    path = tmp_path / "results.csv"
+    path.write_text("id,content\n00123,a\n1e5,b\nNA,c\n", encoding="utf-8")
+    store = CsvResultStore(str(path))
+    assert all(record_id in store for record_id in ["00123", "1e5", "NA"])
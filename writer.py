@@ -0,0 +1,188 @@
+"""
+One background thread doing every file append of a run, so writes never block the classification loop.
+
+    writer = BackgroundWriter(batch_size=500, flush_interval=2.0)
+    writer.register("approved.csv", APPROVED_COLUMNS)   # CSV rows
+    writer.register("false_positive_log.txt")           # plain text lines
+    writer.write("approved.csv", entry)                 # returns at once
+    writer.flush()                                      # blocks until every queued row is in its file
+    writer.close()                                      # flushes, fsyncs the files and stops the thread
+
+The schema of a CSV output is checked once, when `write` queues the row: a row missing a column raises there,
+in the caller's thread. The thread writes the rows of a file once `batch_size` rows are pending or `flush_interval`
+seconds after the first of them, each batch in a single write. Files stay open until `close`, which fsyncs them.
+A writer can be used again after `close`: its thread is started on the next write.
+"""
+import csv
+import io
+import os
+import queue
+import threading
+import time
+
+FALSE_POSITIVE_LOG = "false_positive_log.txt"
+
+_FLUSH = "flush"
+_ROW = "row"
+
+
+class BackgroundWriter:
+    def __init__(self, batch_size=500, flush_interval=2.0, queue_size=10_000, metrics=None, retries=5,
+                 retry_delay=1.0):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.metrics = metrics
+        # A file locked by another program (e.g. a spreadsheet on Windows) is retried that many times, then fails
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.error = None
+        self._outputs = {}  # Path -> (columns or None for text lines, header)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        # Writer thread state
+        self._pending = {}
+        self._pending_rows = 0
+        self._files = {}
+
+    def register(self, path, columns=None, header=False):
+        """
+        Declares an output file: a CSV file with `columns` (and a header row when the file is new, with `header`),
+        or a file of text lines without.
+        """
+        self._outputs[path] = (list(columns) if columns else None, header)
+
+    def write(self, path, row):
+        """Queues a row for `path`: a dict with every column of its schema, or a line of text."""
+        self._raise_error()
+        if path not in self._outputs:
+            raise ValueError(f"{path} isn't a registered output")
+        columns, _ = self._outputs[path]
+        if columns is None:
+            values = row
+        else:
+            missing = [column for column in columns if column not in row]
+            if missing:
+                raise ValueError(f"Row for {path} is missing the columns {missing}")
+            values = [row[column] for column in columns]
+        self._start()
+        self._queue.put((_ROW, path, values))
+
+    def flush(self, sync=False):
+        """Blocks until every queued row is written (and, with `sync`, fsynced to disk)."""
+        if self._thread is None:
+            self._raise_error()
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done, sync))
+        done.wait()
+        self._raise_error()
+
+    def close(self):
+        """Writes the queued rows, fsyncs and closes the files and stops the thread."""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+            if thread is not None:
+                done = threading.Event()
+                self._queue.put((_FLUSH, done, None))  # None: sync, then stop
+                thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            error, self.error = self.error, None
+            raise error
+
+    def _start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="background-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, *item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                self._write_pending()
+                deadline = None
+                continue
+
+            if kind == _ROW:
+                path, values = item
+                self._pending.setdefault(path, []).append(values)
+                self._pending_rows += 1
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if self._pending_rows >= self.batch_size:
+                    self._write_pending()
+                    deadline = None
+                continue
+
+            done, sync = item
+            self._write_pending()
+            deadline = None
+            if sync is not False:
+                self._sync_files()
+            if sync is None:
+                self._close_files()
+                done.set()
+                return
+            done.set()
+
+    def _write_pending(self):
+        """Appends the pending rows of each file in one write. After an error, rows are dropped until `close`."""
+        pending, self._pending = self._pending, {}
+        rows, self._pending_rows = self._pending_rows, 0
+        if not pending or self.error is not None:
+            return
+        start = time.perf_counter()
+        try:
+            for path, batch in pending.items():
+                self._append(path, batch)
+        except BaseException as exc:
+            self.error = exc
+            return
+        if self.metrics:
+            self.metrics.observe("write", time.perf_counter() - start, rows)
+
+    def _append(self, path, batch):
+        columns, header = self._outputs[path]
+        buffer = io.StringIO()
+        if columns is None:
+            buffer.writelines(line if line.endswith("\n") else line + "\n" for line in batch)
+        else:
+            rows = csv.writer(buffer, lineterminator="\n")
+            if header and (not os.path.exists(path) or os.path.getsize(path) == 0):
+                rows.writerow(columns)
+            rows.writerows(batch)
+        data = buffer.getvalue()
+
+        for attempt in range(self.retries + 1):
+            try:
+                f = self._files.get(path)
+                if f is None:
+                    f = self._files[path] = open(path, "a", encoding="utf-8", newline="")
+                f.write(data)
+                f.flush()
+                return
+            except PermissionError as e:
+                self._files.pop(path, None)
+                if attempt == self.retries:
+                    raise
+                print(f"Permission error while writing to {path}: {e}. Retrying in {self.retry_delay:.0f} seconds...")
+                time.sleep(self.retry_delay)
+
+    def _sync_files(self):
+        try:
+            for f in self._files.values():
+                os.fsync(f.fileno())
+        except OSError as exc:
+            self.error = self.error or exc
+
+    def _close_files(self):
+        for f in self._files.values():
+            f.close()
+        self._files = {}
@@ -0,0 +1,60 @@
+"""
+Builds the zero-shot classification pipeline for one of the CPU inference backends:
+
+- "fp32": the model as published
+- "int8": dynamic int8 quantization of the Linear layers (weights stored as int8, activations quantized on the fly)
+- "onnx": the model exported to ONNX and run by onnxruntime, through optimum (`pip install optimum[onnxruntime]`)
+
+`num_threads` caps the threads torch (or onnxruntime) uses for each forward pass; by default they use every core.
+Check the labels of a reduced-precision backend against fp32 with benchmark_inference.py before switching to it.
+"""
+import os
+
+DEFAULT_MODEL = "facebook/bart-large-mnli"
+BACKENDS = ("fp32", "int8", "onnx")
+
+
+def load_zero_shot(model_name=DEFAULT_MODEL, backend="fp32", num_threads=None, onnx_dir="onnx_models"):
+    """Returns a zero-shot-classification pipeline running `model_name` on `backend`."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer, pipeline
+
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    if backend == "onnx":
+        model = _load_onnx(model_name, num_threads, onnx_dir)
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        model.eval()
+        if backend == "int8":
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    return pipeline('zero-shot-classification', model=model, tokenizer=tokenizer, device=-1)
+
+
+def _load_onnx(model_name, num_threads, onnx_dir):
+    """Loads the ONNX export of `model_name` from `onnx_dir`, exporting it there the first time."""
+    try:
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+    except ImportError as e:
+        raise ImportError("The onnx backend needs optimum and onnxruntime: pip install optimum[onnxruntime]") from e
+
+    session_options = onnxruntime.SessionOptions()
+    if num_threads:
+        session_options.intra_op_num_threads = num_threads
+
+    export_path = os.path.join(onnx_dir, model_name.replace("/", "--"))
+    if os.path.isdir(export_path):
+        return ORTModelForSequenceClassification.from_pretrained(export_path, session_options=session_options)
+
+    print(f"📦 Exporting {model_name} to ONNX in {export_path} (once)...")
+    model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True,
+                                                              session_options=session_options)
+    model.save_pretrained(export_path)
+    return model